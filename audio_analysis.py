@@ -0,0 +1,447 @@
+import itertools
+import math
+import os
+import shutil
+import sqlite3
+import subprocess
+import threading
+import time
+from importlib.util import find_spec
+from queue import PriorityQueue
+
+from metrics import metrics
+from processes import hidden_window
+
+# 分析方法改变时加一，旧的结果会被重新分析
+ANALYSIS_VERSION = 1
+# 响度归一化的目标（LUFS），与 ReplayGain 2.0 的参考电平相同
+TARGET_LOUDNESS = -18.0
+# 增益范围（dB）
+MIN_GAIN_DB = -20.0
+MAX_GAIN_DB = 12.0
+# 波形进度条的点数，每个点一个字节
+WAVEFORM_POINTS = 600
+# 解码后的采样率，与混音器相同
+SAMPLE_RATE = 44100
+
+
+def _biquad_power(b, a, n, rate):
+    """二阶滤波器在 n 点实数FFT各频点上的功率响应"""
+    import numpy as np
+
+    z = np.exp(-2j * np.pi * np.fft.rfftfreq(n, 1.0 / rate) / rate)
+    h = (b[0] + b[1] * z + b[2] * z * z) / (a[0] + a[1] * z + a[2] * z * z)
+    return np.abs(h) ** 2
+
+
+def _k_weighting(n, rate):
+    """ITU-R BS.1770 的K加权（高架滤波 + 高通滤波）在各频点上的功率响应
+
+    系数按采样率由滤波器的原型参数计算，不局限于48kHz。
+    返回值已包含实数FFT的帕塞瓦尔系数：频谱功率乘以它再求和即为该段的均方值。
+    """
+    import numpy as np
+
+    # 高架滤波：约+4dB，中心频率约1.68kHz
+    k = math.tan(math.pi * 1681.974450955533 / rate)
+    q = 0.7071752369554196
+    vh = 10 ** (3.999843853973347 / 20)
+    vb = vh ** 0.4996667741545416
+    shelf_b = (vh + vb * k / q + k * k, 2 * (k * k - vh), vh - vb * k / q + k * k)
+    shelf_a = (1 + k / q + k * k, 2 * (k * k - 1), 1 - k / q + k * k)
+    # 高通滤波：截止频率约38Hz
+    k = math.tan(math.pi * 38.13547087602444 / rate)
+    q = 0.5003270373238773
+    high_b = (1, -2, 1)
+    high_a = (1 + k / q + k * k, 2 * (k * k - 1), 1 - k / q + k * k)
+    # 与标准在48kHz下给出的系数一致：高通滤波的分子未归一化
+    high_a = tuple(value / high_a[0] for value in high_a)
+
+    power = _biquad_power(shelf_b, shelf_a, n, rate) * _biquad_power(high_b, high_a, n, rate)
+    # 除直流和奈奎斯特频点外，其他频点在实数FFT中只出现一次，功率要乘2
+    scale = np.full(len(power), 2.0)
+    scale[0] = 1.0
+    if n % 2 == 0:
+        scale[-1] = 1.0
+    return power * scale / (n * n)
+
+
+def _decode(path, ffmpeg, chunk_frames):
+    """把音频解码为立体声浮点采样，逐块返回 (帧数, 2) 的数组
+
+    有FFmpeg时解码任何格式（单声道复制到两个声道），否则只支持16位WAV。
+    """
+    import numpy as np
+
+    if ffmpeg:
+        process = subprocess.Popen(
+            [ffmpeg, '-nostdin', '-loglevel', 'error', '-i', path, '-vn',
+             '-ac', '2', '-ar', str(SAMPLE_RATE), '-f', 'f32le', '-'],
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE, **hidden_window())
+        try:
+            while True:
+                data = process.stdout.read(chunk_frames * 8)
+                if not data:
+                    break
+                yield np.frombuffer(data[:len(data) // 8 * 8], '<f4').reshape(-1, 2)
+        finally:
+            process.stdout.close()
+            error = process.stderr.read()
+            process.stderr.close()
+            if process.wait() != 0:
+                message = error.decode('utf-8', 'replace').strip()
+                raise RuntimeError(f"FFmpeg解码失败: {message or process.returncode}")
+        return
+
+    import wave
+    with wave.open(path, 'rb') as f:
+        if f.getsampwidth() != 2 or f.getframerate() != SAMPLE_RATE:
+            raise RuntimeError("没有FFmpeg时只能分析44.1kHz的16位WAV文件")
+        channels = f.getnchannels()
+        while True:
+            data = f.readframes(chunk_frames)
+            if not data:
+                break
+            samples = np.frombuffer(data, '<i2').reshape(-1, channels)[:, :2]
+            samples = samples.astype(np.float32) / 32768
+            if channels == 1:
+                samples = np.repeat(samples, 2, axis=1)
+            yield samples
+
+
+def analyze_file(path, ffmpeg=None):
+    """分析一首歌曲的响度、峰值和波形，在分析进程中执行
+
+    整首歌曲只解码一次，按100毫秒分段：每段用实数FFT在频域做K加权求均方值，
+    并记录每段的最大采样值。按 BS.1770 把相邻4段组成400毫秒、重叠75%的测量块，
+    经过 -70 LUFS 的绝对门限和 -10 LU 的相对门限得到整体响度。
+    分段都是整块的矩阵运算，不需要逐个采样循环。
+
+    返回字典：loudness（LUFS，几乎无声时为None）、peak（最大采样值，0到1）、
+    duration（秒）、peaks（WAVEFORM_POINTS 个字节的波形）、seconds（分析耗时）。
+    """
+    import numpy as np
+
+    started = time.perf_counter()
+    segment = SAMPLE_RATE // 10
+    weights = _k_weighting(segment, SAMPLE_RATE)
+    energies = []
+    maxima = []
+    frames = 0
+    rest = np.zeros((0, 2), np.float32)
+    for chunk in _decode(path, ffmpeg, segment * 100):
+        frames += len(chunk)
+        if len(rest):
+            chunk = np.concatenate([rest, chunk])
+        count = len(chunk) // segment
+        rest = chunk[count * segment:]
+        if not count:
+            continue
+        blocks = chunk[:count * segment].reshape(count, segment, 2)
+        spectrum = np.fft.rfft(blocks, axis=1)
+        # 两个声道的权重都是1，均方值直接相加
+        power = spectrum.real ** 2 + spectrum.imag ** 2
+        energies.append(np.einsum('ijc,j->i', power, weights))
+        maxima.append(np.abs(blocks).max(axis=(1, 2)))
+    # 最后不足一段的部分只计入峰值和波形
+    if len(rest):
+        maxima.append(np.abs(rest).max(keepdims=True).reshape(1))
+
+    energies = np.concatenate(energies) if energies else np.zeros(0)
+    maxima = np.concatenate(maxima) if maxima else np.zeros(0)
+
+    loudness = None
+    if len(energies) >= 4:
+        blocks = np.convolve(energies, np.full(4, 0.25), mode='valid')
+        with np.errstate(divide='ignore'):
+            block_loudness = -0.691 + 10 * np.log10(blocks)
+        gated = blocks[block_loudness > -70]
+        if len(gated):
+            relative = -0.691 + 10 * np.log10(gated.mean()) - 10
+            gated = blocks[block_loudness > max(-70, relative)]
+            loudness = float(-0.691 + 10 * np.log10(gated.mean()))
+
+    if len(maxima) > WAVEFORM_POINTS:
+        starts = np.linspace(0, len(maxima), WAVEFORM_POINTS, endpoint=False).astype(int)
+        envelope = np.maximum.reduceat(maxima, starts)
+    else:
+        envelope = maxima
+    peak = float(maxima.max()) if len(maxima) else 0.0
+    peaks = np.round(np.clip(envelope, 0, 1) * 255).astype(np.uint8).tobytes()
+    return {'loudness': loudness, 'peak': peak, 'duration': frames / SAMPLE_RATE,
+            'peaks': peaks, 'seconds': time.perf_counter() - started}
+
+
+def gain_for(loudness, peak):
+    """把响度调整到 TARGET_LOUDNESS 的线性增益，提高音量时不超过峰值允许的范围"""
+    if loudness is None:
+        return 1.0
+    gain_db = max(MIN_GAIN_DB, min(MAX_GAIN_DB, TARGET_LOUDNESS - loudness))
+    gain = 10 ** (gain_db / 20)
+    if gain > 1.0 and peak > 0:
+        gain = max(1.0, min(gain, 1.0 / peak))
+    return gain
+
+
+def _lower_priority():
+    """分析进程的初始化函数：降低优先级，不影响播放和界面"""
+    if hasattr(os, 'nice'):
+        try:
+            os.nice(10)
+        except OSError:
+            pass
+
+
+class AnalysisResult:
+    """一首歌曲的分析结果"""
+
+    __slots__ = ('loudness', 'peak', 'duration', 'peaks')
+
+    def __init__(self, loudness, peak, duration, peaks):
+        self.loudness = loudness
+        self.peak = peak
+        self.duration = duration
+        self.peaks = peaks
+
+    @property
+    def gain(self):
+        return gain_for(self.loudness, self.peak)
+
+
+class AnalysisStore:
+    """持久化的分析结果，文件的大小或修改时间变化后结果失效
+
+    波形以字节串保存，每首歌曲只占几百字节，播放时按文件路径直接读出。
+    """
+
+    def __init__(self, db_path="cache/analysis.db"):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir and not os.path.exists(db_dir):
+            os.makedirs(db_dir)
+
+        # 分析结果在后台线程中写入，由锁保证串行访问
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS analysis (
+                file TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime REAL NOT NULL,
+                version INTEGER NOT NULL,
+                loudness REAL,
+                peak REAL NOT NULL,
+                duration REAL NOT NULL,
+                peaks BLOB NOT NULL
+            )
+        """)
+        self._conn.commit()
+
+    @staticmethod
+    def _signature(file):
+        try:
+            st = os.stat(file)
+        except OSError:
+            return None
+        return st.st_size, st.st_mtime
+
+    def get(self, file):
+        """返回文件的分析结果，没有或已失效时返回None"""
+        signature = self._signature(file)
+        if signature is None:
+            return None
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT size, mtime, version, loudness, peak, duration, peaks "
+                "FROM analysis WHERE file = ?", (file,)).fetchone()
+        if row is None or (row[0], row[1]) != signature or row[2] != ANALYSIS_VERSION:
+            return None
+        return AnalysisResult(row[3], row[4], row[5], row[6])
+
+    def missing(self, files):
+        """返回没有有效分析结果的文件，保持原来的顺序"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT file, size, mtime FROM analysis WHERE version = ?",
+                (ANALYSIS_VERSION,)).fetchall()
+        known = {file: (size, mtime) for file, size, mtime in rows}
+        return [file for file in files
+                if file not in known or known[file] != self._signature(file)]
+
+    def put(self, file, signature, result):
+        size, mtime = signature
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO analysis "
+                "(file, size, mtime, version, loudness, peak, duration, peaks) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (file, size, mtime, ANALYSIS_VERSION, result['loudness'], result['peak'],
+                 result['duration'], result['peaks']))
+            self._conn.commit()
+
+    def remove_many(self, files):
+        with self._lock:
+            self._conn.executemany("DELETE FROM analysis WHERE file = ?",
+                                   [(file,) for file in files])
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class AudioAnalyzer:
+    """在后台进程池中分析歌曲的响度和波形
+
+    分析是CPU密集的工作，放在独立的进程中，不受GIL影响，也不拖慢界面和播放。
+    任务按优先级排队：正在播放的歌曲最先，其次是新下载的歌曲，最后是音乐库中的其他歌曲；
+    同时交给进程池的任务不超过进程数的两倍，其余留在队列中，随时可以插队。
+    需要NumPy，非WAV文件还需要FFmpeg；缺少时 available 为False，提交的任务被忽略。
+    on_done(file, result) 在分析完成后于后台线程中调用。
+    """
+
+    PLAYING = 0
+    DOWNLOADED = 1
+    LIBRARY = 2
+    # 进程池连续这么多次没有完成任何分析就崩溃时，停止分析
+    MAX_POOL_RESTARTS = 3
+
+    def __init__(self, store=None, workers=None, ffmpeg=None, on_done=None):
+        self.store = store if store is not None else AnalysisStore()
+        self.workers = workers or max(1, (os.cpu_count() or 2) // 2)
+        self.ffmpeg = ffmpeg or shutil.which('ffmpeg')
+        self.on_done = on_done
+        self.numpy = find_spec('numpy') is not None
+        self._queue = PriorityQueue()
+        self._order = itertools.count()
+        self._queued = set()
+        self._lock = threading.Lock()
+        self._slots = threading.Semaphore(self.workers * 2)
+        self._pool = None
+        self._thread = None
+        self._restarts = 0
+        self.disabled = False
+        self.done = 0
+        self.failed = 0
+
+    @property
+    def available(self):
+        return self.numpy and not self.disabled
+
+    def can_analyze(self, file):
+        return self.numpy and (self.ffmpeg is not None or file.lower().endswith('.wav'))
+
+    def get(self, file):
+        """已保存的分析结果，播放时调用，只读数据库不做分析"""
+        return self.store.get(file)
+
+    def submit(self, files, priority=LIBRARY):
+        """把文件加入分析队列，已有有效结果的文件在分析前跳过"""
+        if not self.available:
+            return
+        queued = []
+        with self._lock:
+            for file in files:
+                if file not in self._queued and self.can_analyze(file):
+                    self._queued.add(file)
+                    queued.append(file)
+        for file in queued:
+            self._queue.put((priority, next(self._order), file))
+        if queued:
+            self._start()
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def _start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._pool = self._new_pool()
+            self._thread = threading.Thread(target=self._schedule, name='audio-analysis',
+                                            daemon=True)
+            self._thread.start()
+
+    def _new_pool(self):
+        # 进程池模块在第一次分析时才导入，不拖慢启动；
+        # 用spawn启动分析进程，不复制界面进程中的线程和Tk状态
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+        return ProcessPoolExecutor(max_workers=self.workers,
+                                   mp_context=multiprocessing.get_context('spawn'),
+                                   initializer=_lower_priority)
+
+    def _schedule(self):
+        while True:
+            priority, _, file = self._queue.get()
+            if file is None:
+                return
+            signature = AnalysisStore._signature(file)
+            if signature is None or self.store.get(file) is not None:
+                with self._lock:
+                    self._queued.discard(file)
+                continue
+            self._slots.acquire()
+            future = self._submit(file)
+            if future is None:
+                self._slots.release()
+                with self._lock:
+                    self._queued.discard(file)
+                return
+            future.add_done_callback(
+                lambda f, file=file, signature=signature: self._finished(file, signature, f))
+
+    def _submit(self, file):
+        """把文件交给进程池，进程池损坏时换一个新的重试；无法再分析时返回None"""
+        from concurrent.futures.process import BrokenProcessPool
+
+        while True:
+            try:
+                return self._pool.submit(analyze_file, file, self.ffmpeg)
+            except BrokenProcessPool:
+                # 分析进程意外退出（例如解码器崩溃），换一个新的进程池；
+                # 反复崩溃说明进程根本无法启动，不再继续创建进程
+                self._restarts += 1
+                if self._restarts > self.MAX_POOL_RESTARTS:
+                    self.disabled = True
+                    print("分析进程反复退出，停止响度和波形分析")
+                    self._pool.shutdown(wait=False, cancel_futures=True)
+                    return None
+                self._pool = self._new_pool()
+            except RuntimeError:
+                # 进程池已关闭
+                return None
+
+    def _finished(self, file, signature, future):
+        self._slots.release()
+        with self._lock:
+            self._queued.discard(file)
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is not None:
+            self.failed += 1
+            metrics.inc('analysis_errors')
+            print(f"分析音频失败: {os.path.basename(file)}: {error}")
+            return
+        result = future.result()
+        self._restarts = 0
+        self.done += 1
+        metrics.observe('analysis_seconds', result['seconds'])
+        try:
+            self.store.put(file, signature, result)
+        except sqlite3.Error as e:
+            print(f"保存分析结果失败: {e}")
+        if self.on_done is not None:
+            self.on_done(file, AnalysisResult(result['loudness'], result['peak'],
+                                              result['duration'], result['peaks']))
+
+    def shutdown(self):
+        """停止分析，已经开始的文件不等待完成"""
+        if self._thread is not None:
+            self._queue.put((-1, -1, None))
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
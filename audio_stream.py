@@ -0,0 +1,432 @@
+import io
+import shutil
+import subprocess
+import sys
+import threading
+import time
+
+import pygame
+
+from mp3_index import SeekIndexCache
+from playback_clock import PlaybackClock
+from processes import hidden_window
+
+# pygame.mixer.music 每播放完一首（包括切换到排队的歌曲）发出的事件
+END_EVENT = pygame.USEREVENT + 1
+
+
+def _init_end_events():
+    """初始化接收歌曲结束事件的pygame事件队列，失败时返回False
+
+    pygame的事件队列依赖视频子系统，这里只初始化子系统，不创建窗口，
+    并屏蔽除结束事件以外的所有事件。必须在主线程中调用。
+    macOS上视频子系统会与Tk争用主线程的应用对象，因此不启用。
+    """
+    if sys.platform == 'darwin':
+        return False
+    try:
+        if not pygame.display.get_init():
+            pygame.display.init()
+        pygame.event.set_blocked(None)
+        pygame.event.set_allowed(END_EVENT)
+    except pygame.error:
+        return False
+    return True
+
+
+class _OffsetFile(io.RawIOBase):
+    """从某个字节偏移开始的只读文件视图
+
+    偏移之前的内容对读取方不可见，交给pygame时就像一个从该帧开始的MP3文件。
+    """
+
+    def __init__(self, path, offset):
+        super().__init__()
+        self._file = open(path, 'rb')
+        self._offset = offset
+        self._file.seek(offset)
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, buffer):
+        return self._file.readinto(buffer)
+
+    def seek(self, pos, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            pos = max(pos, 0) + self._offset
+        return self._file.seek(pos, whence) - self._offset
+
+    def tell(self):
+        return self._file.tell() - self._offset
+
+    def close(self):
+        self._file.close()
+        super().close()
+
+
+class MixerMusicBackend:
+    """基于 pygame.mixer.music 的播放后端，用于MP3/WAV
+
+    下一首通过 pygame.mixer.music.queue 预先加载，当前歌曲结束时由SDL直接切换，没有间隙。
+    歌曲结束由 set_endevent 的事件通知，播放位置由单调时钟推算。
+    MP3跳转时按跳转索引直接定位到目标帧，从该帧开始加载，
+    不需要SDL从文件开头逐帧解码到目标位置。
+    """
+
+    def __init__(self):
+        self.clock = PlaybackClock()
+        self.seek_index = SeekIndexCache()
+        self._queued = None
+        self._last_pos = 0
+        self._file = None
+        self._events = _init_end_events()
+
+    def _discard_events(self):
+        # 停止播放也会发出结束事件，丢弃这些过期事件；不处理其他线程的事件泵
+        if self._events:
+            pygame.event.clear(END_EVENT, pump=False)
+
+    def _open(self, path, start):
+        """MP3从中间开始播放时，返回从目标帧开始的文件视图和实际的开始位置"""
+        if start <= 0 or not path.lower().endswith('.mp3'):
+            return None, start
+        try:
+            located = self.seek_index.locate(path, start)
+        except (OSError, ValueError) as e:
+            print(f"读取跳转索引失败: {e}")
+            located = None
+        if located is None:
+            return None, start
+        offset, start = located
+        return _OffsetFile(path, offset), start
+
+    def play(self, path, start=0.0, paused=False):
+        """播放文件，paused 为True时加载后保持暂停（暂停状态下跳转）"""
+        source, start = self._open(path, start)
+        if source is None:
+            pygame.mixer.music.load(path)
+        else:
+            pygame.mixer.music.load(source, 'mp3')
+        if self._events:
+            pygame.mixer.music.set_endevent(END_EVENT)
+        pygame.mixer.music.play(start=start if source is None else 0.0)
+        self._discard_events()
+        self.clock.start(start)
+        if paused:
+            pygame.mixer.music.pause()
+            self.clock.pause()
+        self._queued = None
+        self._last_pos = 0
+        # 新的音乐加载后，上一次跳转打开的文件不再被使用
+        if self._file is not None:
+            self._file.close()
+        self._file = source
+
+    def queue(self, path):
+        """预加载下一首，当前歌曲结束后无缝播放"""
+        pygame.mixer.music.queue(path)
+        self._queued = path
+
+    def check_event(self):
+        """在主线程中调用
+
+        返回 'advanced' 表示已切换到排队的歌曲，'ended' 表示播放结束，其他情况返回None。
+        """
+        if self._events:
+            ended = bool(pygame.event.get(END_EVENT))
+        else:
+            ended = self._poll_ended()
+        if not ended:
+            return None
+        if self._queued is not None:
+            self._queued = None
+            self.clock.start(0.0)
+            return 'advanced'
+        self.clock.stop()
+        return 'ended'
+
+    def _poll_ended(self):
+        """没有事件队列时的后备检测
+
+        pygame切换到排队的歌曲时会把 get_pos 的计数清零，据此判断是否已经切换。
+        """
+        pos = pygame.mixer.music.get_pos()
+        restarted = 0 <= pos < self._last_pos
+        self._last_pos = pos
+        if self._queued is not None and restarted:
+            return True
+        return not pygame.mixer.music.get_busy()
+
+    def pause(self):
+        pygame.mixer.music.pause()
+        self.clock.pause()
+
+    def unpause(self):
+        pygame.mixer.music.unpause()
+        self.clock.resume()
+
+    def stop(self):
+        pygame.mixer.music.stop()
+        self._discard_events()
+        self.clock.stop()
+        self._queued = None
+
+    def set_volume(self, volume):
+        pygame.mixer.music.set_volume(volume)
+
+    def get_busy(self):
+        return pygame.mixer.music.get_busy()
+
+    def get_pos(self):
+        """当前播放位置（秒）"""
+        return self.clock.position()
+
+
+class _DecoderSource:
+    """一个FFmpeg解码进程，输出与mixer格式相同的PCM
+
+    指定 stream 时从该数据流读取输入（边下边播），由后台线程写入FFmpeg的标准输入，
+    path 只用于标识歌曲。
+    """
+
+    def __init__(self, ffmpeg, path, start, frequency, channels, stream=None):
+        self.path = path
+        self.offset = start
+        self.stream = stream
+        if stream is None:
+            input_args = ['-nostdin', '-loglevel', 'error', '-ss', str(start), '-i', path]
+        else:
+            input_args = ['-loglevel', 'error', '-i', 'pipe:0']
+        self.process = subprocess.Popen(
+            [ffmpeg] + input_args +
+            ['-vn', '-f', 's16le', '-acodec', 'pcm_s16le',
+             '-ac', str(channels), '-ar', str(frequency), '-'],
+            stdin=subprocess.PIPE if stream is not None else None,
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, **hidden_window())
+        if stream is not None:
+            threading.Thread(target=self._pump, daemon=True).start()
+
+    def _pump(self):
+        """把数据流写入FFmpeg，数据流结束后关闭标准输入让FFmpeg解码完剩余部分"""
+        try:
+            while True:
+                data = self.stream.read(64 * 1024)
+                if not data:
+                    break
+                self.process.stdin.write(data)
+        except (BrokenPipeError, OSError, ValueError):
+            pass
+        finally:
+            # 数据流读完即可释放，下载的临时文件随之删除
+            self.stream.close()
+            try:
+                self.process.stdin.close()
+            except OSError:
+                pass
+
+    def kill(self):
+        if self.process.poll() is None:
+            self.process.kill()
+        if self.stream is not None:
+            # 唤醒等待下载数据的写入线程
+            self.stream.close()
+
+    def close(self):
+        self.kill()
+        self.process.wait()
+        self.process.stdout.close()
+
+
+class PCMStreamBackend:
+    """通过FFmpeg管道实时解码的播放后端
+
+    FFmpeg把文件解码为与mixer相同格式的PCM，后台线程按块读取，
+    包装成 pygame.mixer.Sound 后排入专用声道，不需要先转码成MP3。
+    预加载的下一首会提前启动解码进程，当前歌曲的数据读完后，
+    下一首的第一块紧接着排入同一个声道，实现无缝切换。
+    """
+
+    def __init__(self, chunk_seconds=0.5, ffmpeg=None):
+        self.chunk_seconds = chunk_seconds
+        self.ffmpeg = ffmpeg or shutil.which('ffmpeg')
+        self._lock = threading.Lock()
+        self._source = None
+        self._next_source = None
+        self._thread = None
+        self._channel = None
+        self._stop_event = threading.Event()
+        self._volume = 1.0
+        # 由暂停、恢复和送数据线程在锁内读写，保证第一块开始播放时能保持暂停
+        self._paused = False
+        self._advanced = False
+        self._playing_path = None
+        # 每个数据块开始播放时校准到该块在歌曲中的位置
+        self.clock = PlaybackClock()
+        # 第一个数据块开始播放的时间，用于统计首个音频的延迟
+        self.first_chunk_at = None
+
+    @property
+    def available(self):
+        return self.ffmpeg is not None
+
+    def _get_channel(self):
+        if self._channel is None:
+            # 保留0号声道专门用于流式播放，避免被其他音效占用
+            pygame.mixer.set_reserved(1)
+            self._channel = pygame.mixer.Channel(0)
+        return self._channel
+
+    def _open(self, path, start=0.0, stream=None):
+        if not self.available:
+            raise RuntimeError("未找到FFmpeg，无法播放该格式")
+        frequency, size, channels = pygame.mixer.get_init()
+        self._frame_bytes = channels * abs(size) // 8
+        self._bytes_per_chunk = int(frequency * self.chunk_seconds) * self._frame_bytes
+        self._bytes_per_second = frequency * self._frame_bytes
+        return _DecoderSource(self.ffmpeg, path, start, frequency, channels, stream)
+
+    def play(self, path, start=0.0, stream=None, paused=False):
+        """播放文件，指定 stream 时从该数据流读取（边下边播）
+
+        paused 为True时保持暂停（暂停状态下跳转）：由送数据线程在第一块开始播放后
+        立即暂停声道，因为开始播放声道会清除声道的暂停状态。
+        """
+        self.stop()
+        source = self._open(path, start, stream)
+        with self._lock:
+            self._source = source
+            self._advanced = False
+            self._paused = paused
+        self.first_chunk_at = None
+        self.clock.start(start)
+        if paused:
+            self.clock.pause()
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._feed, args=(self._stop_event,), daemon=True)
+        self._thread.start()
+
+    def queue(self, path):
+        """提前启动下一首的解码进程，当前歌曲读完后无缝衔接"""
+        source = self._open(path)
+        with self._lock:
+            old, self._next_source = self._next_source, source
+        if old:
+            old.close()
+
+    def check_event(self):
+        """返回 'advanced' 表示已切换到排队的歌曲，'ended' 表示播放结束，其他情况返回None"""
+        with self._lock:
+            advanced, self._advanced = self._advanced, False
+        if advanced:
+            return 'advanced'
+        if not self.get_busy():
+            self.clock.stop()
+            return 'ended'
+        return None
+
+    def _chunk_started_playing(self, meta):
+        """某个数据块开始从声道播放，更新播放位置"""
+        path, offset = meta
+        with self._lock:
+            if path != self._playing_path:
+                self._playing_path = path
+                self._advanced = True
+        self.clock.seek(offset)
+
+    def _feed(self, stop_event):
+        """读取PCM数据块并排入声道，声道队列只能放一个块，空出来时再补充"""
+        channel = self._get_channel()
+        channel.set_volume(self._volume)
+        source = self._source
+        self._playing_path = source.path
+        playing = None
+        queued = None
+        while not stop_event.is_set():
+            # 排队的块已经开始播放
+            if queued is not None and channel.get_queue() is None:
+                playing, queued = queued, None
+                self._chunk_started_playing(playing)
+
+            if queued is not None:
+                time.sleep(0.01)
+                continue
+
+            data = source.process.stdout.read(self._bytes_per_chunk) if source else b''
+            if not data:
+                with self._lock:
+                    next_source, self._next_source = self._next_source, None
+                    if next_source:
+                        self._source = next_source
+                if next_source:
+                    source.close()
+                    source = next_source
+                    continue
+                if not channel.get_busy():
+                    break
+                time.sleep(0.01)
+                continue
+
+            # 数据长度必须是完整采样帧的整数倍
+            data = data[:len(data) - len(data) % self._frame_bytes]
+            meta = (source.path, source.offset)
+            source.offset += len(data) / self._bytes_per_second
+            sound = pygame.mixer.Sound(buffer=data)
+            if playing is None:
+                with self._lock:
+                    channel.play(sound)
+                    if self._paused:
+                        channel.pause()
+                playing = meta
+                self.first_chunk_at = time.monotonic()
+                self._chunk_started_playing(meta)
+            else:
+                channel.queue(sound)
+                queued = meta
+
+    def pause(self):
+        with self._lock:
+            self._paused = True
+            if self._channel:
+                self._channel.pause()
+        self.clock.pause()
+
+    def unpause(self):
+        with self._lock:
+            self._paused = False
+            if self._channel:
+                self._channel.unpause()
+        self.clock.resume()
+
+    def stop(self):
+        self._stop_event.set()
+        with self._lock:
+            sources = [source for source in (self._source, self._next_source) if source]
+            self._source = self._next_source = None
+        # 先结束解码进程，让阻塞在读取上的线程退出
+        for source in sources:
+            source.kill()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        for source in sources:
+            source.close()
+        if self._channel:
+            self._channel.stop()
+        self.clock.stop()
+
+    def set_volume(self, volume):
+        self._volume = volume
+        if self._channel:
+            self._channel.set_volume(volume)
+
+    def get_busy(self):
+        feeding = self._thread is not None and self._thread.is_alive()
+        return feeding or (self._channel is not None and self._channel.get_busy())
+
+    def get_pos(self):
+        """当前播放位置（秒），按正在播放的数据块计算"""
+        return self.clock.position()
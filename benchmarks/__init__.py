@@ -0,0 +1 @@
+"""离线基准测试，见 benchmarks/run.py"""
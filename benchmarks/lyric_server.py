@@ -0,0 +1,128 @@
+"""本地HTTP服务器，模拟 lyrics.ovh 和 geci.me 的歌词接口，并提供合成音频流
+
+每个请求先等待 latency 秒，再按 failure_rate 返回500错误、按 miss_rate 返回找不到歌词，
+随机数由seed决定，同样的参数和请求顺序得到同样的结果。
+"""
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import quote, unquote
+
+from benchmarks.synthetic import silent_mp3
+
+
+def _lrc(title):
+    lines = [f"[ti:{title}]"]
+    lines += [f"[{i // 60:02d}:{i % 60:02d}.00]{title} 第{i // 5 + 1}句" for i in range(0, 180, 5)]
+    return "\n".join(lines) + "\n"
+
+
+class LyricServer:
+    def __init__(self, latency=0.05, failure_rate=0.0, miss_rate=0.2, seed=0,
+                 audio_seconds=180, audio_rate=None):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.miss_rate = miss_rate
+        self.audio = silent_mp3(audio_seconds)
+        # 音频流每秒发送的字节数，None表示不限速
+        self.audio_rate = audio_rate
+        self.requests = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _roll(self):
+        """返回 'fail'、'miss' 或 'hit'"""
+        with self._lock:
+            self.requests += 1
+            value = self._rng.random()
+        if value < self.failure_rate:
+            return 'fail'
+        if value < self.failure_rate + self.miss_rate:
+            return 'miss'
+        return 'hit'
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, status, body, content_type='application/json'):
+                if not isinstance(body, bytes):
+                    body = (json.dumps(body, ensure_ascii=False)
+                            if content_type == 'application/json' else body).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                parts = [unquote(part) for part in self.path.split('?')[0].split('/')[1:]]
+                if parts[:1] == ['audio']:
+                    self._audio()
+                    return
+
+                time.sleep(server.latency)
+                outcome = server._roll()
+                if outcome == 'fail':
+                    self._send(500, {'error': 'Internal Server Error'})
+                elif parts[:1] == ['v1'] and len(parts) == 3:
+                    # lyrics.ovh: /v1/<artist>/<title>
+                    if outcome == 'miss':
+                        self._send(404, {'error': 'No lyrics found'})
+                    else:
+                        self._send(200, {'lyrics': _lrc(parts[2])})
+                elif parts[:2] == ['api', 'lyric'] and len(parts) == 3:
+                    # geci.me: /api/lyric/<title>，歌词文件地址在结果中
+                    if outcome == 'miss':
+                        self._send(200, {'count': 0, 'result': []})
+                    else:
+                        lrc_url = f"{server.url}/lrc/{quote(parts[2])}.lrc"
+                        self._send(200, {'count': 1, 'result': [{'lrc': lrc_url}]})
+                elif parts[:1] == ['lrc'] and len(parts) == 2:
+                    self._send(200, _lrc(parts[1][:-4]), 'text/plain; charset=utf-8')
+                else:
+                    self._send(404, {'error': 'Not Found'})
+
+            def _audio(self):
+                data = server.audio
+                self.send_response(200)
+                self.send_header('Content-Type', 'audio/mpeg')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                chunk = 64 * 1024
+                for start in range(0, len(data), chunk):
+                    self.wfile.write(data[start:start + chunk])
+                    if server.audio_rate:
+                        time.sleep(chunk / server.audio_rate)
+
+        return Handler
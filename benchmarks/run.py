@@ -0,0 +1,357 @@
+"""离线基准测试
+
+不访问网络：歌词接口由本地模拟服务器代替，yt-dlp由生成静音MP3的假模块代替，
+音乐库是临时目录中生成的空文件。所有数据写入临时目录，不影响 cache/ 和 downloads/。
+
+用法（在项目根目录运行）：
+    python -m benchmarks.run --out results.json
+    python -m benchmarks.run --quick --compare results.json
+
+结果为JSON，--compare 与上一次的结果比较，列出变化超过阈值的耗时。
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks import fake_ytdlp
+from benchmarks.lyric_server import LyricServer
+from benchmarks.synthetic import make_library, song_titles
+
+
+def _percentiles(samples):
+    """返回耗时样本的统计值（毫秒）"""
+    if not samples:
+        return {'count': 0}
+    ordered = sorted(samples)
+
+    def pick(fraction):
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] * 1000
+
+    return {'count': len(samples), 'mean_ms': statistics.fmean(samples) * 1000,
+            'p50_ms': pick(0.5), 'p95_ms': pick(0.95), 'max_ms': ordered[-1] * 1000}
+
+
+def _timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+def bench_clean_song_name(count):
+    from lyric_fetcher import LyricFetcher
+
+    fetcher = LyricFetcher()
+    titles = song_titles(count, seed=1)
+    elapsed, _ = _timed(lambda: [fetcher.clean_song_name(title) for title in titles])
+    return {'titles': count, 'total_ms': elapsed * 1000, 'per_title_us': elapsed / count * 1e6}
+
+
+def bench_lyric_lookup(tmp, lookups, latency, failure_rate, miss_rate, seed):
+    """对本地模拟服务器获取歌词：逐个请求和并发请求两种模式，以及缓存命中"""
+    from lyric_cache import LyricCache
+    from lyric_fetcher import LyricFetcher
+
+    results = {'latency_ms': latency * 1000, 'failure_rate': failure_rate, 'miss_rate': miss_rate}
+    titles = song_titles(lookups, seed=seed)
+    with LyricServer(latency, failure_rate, miss_rate, seed) as server:
+        endpoints = {'lyrics_ovh': server.url, 'geci': server.url}
+        for mode, concurrent in (('sequential', False), ('concurrent', True)):
+            cache = LyricCache(os.path.join(tmp, f"lyrics-{mode}.db"))
+            fetcher = LyricFetcher(cache=cache, concurrent=concurrent, endpoints=endpoints)
+            cold = []
+            network_hits = 0
+            for title in titles:
+                elapsed, lyrics = _timed(fetcher.get_lyrics, title)
+                cold.append(elapsed)
+                # 模拟服务器返回的歌词，不算本地的示例歌词和备用歌词
+                network_hits += '第1句' in lyrics
+            warm = [_timed(fetcher.get_lyrics, title)[0] for title in titles]
+            results[mode] = {'cold': _percentiles(cold), 'cached': _percentiles(warm),
+                             'network_hits': network_hits}
+            cache.close()
+
+        # 多个线程共用一个获取器，模拟后台预取与前台同时查询
+        cache = LyricCache(os.path.join(tmp, "lyrics-parallel.db"))
+        fetcher = LyricFetcher(cache=cache, concurrent=True, endpoints=endpoints)
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            elapsed, _ = _timed(lambda: list(pool.map(fetcher.get_lyrics, titles)))
+        results['parallel_4_threads'] = {'total_ms': elapsed * 1000,
+                                         'lookups_per_second': len(titles) / elapsed}
+        results['server_requests'] = server.requests
+        cache.close()
+    return results
+
+
+def bench_library(tmp, size, seed):
+    """扫描、索引和播放列表的耗时"""
+    from library import LibraryScanner
+    from library_db import LibraryDB
+    from track_store import TrackStore
+
+    root = os.path.join(tmp, f"library-{size}")
+    generate, _ = _timed(make_library, root, size, 100, seed)
+    scanner = LibraryScanner(root)
+    cold, (added, _) = _timed(scanner.scan)
+    warm, _ = _timed(scanner.scan)
+    # 向一个合集加入新文件，只有这一个目录需要重新列出
+    folder = sorted(os.listdir(root))[0]
+    open(os.path.join(root, folder, "新增歌曲.mp3"), 'wb').close()
+    incremental, (new, _) = _timed(scanner.scan)
+
+    db = LibraryDB(os.path.join(tmp, f"library-{size}.db"))
+    write, _ = _timed(db.add_many, added)
+    load, tracks = _timed(db.load)
+    db.close()
+
+    store = TrackStore()
+    append, _ = _timed(lambda: [store.append(track) for track in tracks])
+    # 按位置取1000首歌曲，相当于渲染播放列表时读取标签
+    step = max(1, len(store) // 1000)
+    labels, _ = _timed(lambda: [store[i].title for i in range(0, len(store), step)])
+
+    return {'files': len(added), 'generate_ms': generate * 1000, 'scan_cold_ms': cold * 1000,
+            'scan_unchanged_ms': warm * 1000, 'scan_one_dir_changed_ms': incremental * 1000,
+            'scan_incremental_added': len(new), 'index_write_ms': write * 1000,
+            'index_load_ms': load * 1000, 'playlist_append_ms': append * 1000,
+            'playlist_random_access_us': labels / min(1000, max(1, len(store))) * 1e6}
+
+
+def bench_playlist_render(sizes):
+    """虚拟化播放列表的渲染耗时，需要图形界面，没有显示器时跳过"""
+    try:
+        import tkinter as tk
+        root = tk.Tk()
+    except Exception as e:
+        return {'skipped': f"无法创建Tk窗口: {e}"}
+
+    from playlist_view import VirtualPlaylistView
+    from track_store import Track, TrackStore
+
+    results = {}
+    try:
+        root.geometry("300x600")
+        for size in sizes:
+            store = TrackStore()
+            for i, title in enumerate(song_titles(size)):
+                store.append(Track(title, f"/music/{i}.mp3"))
+            view = VirtualPlaylistView(root, count=lambda: len(store),
+                                       label=lambda i: f"{i + 1}. {store[i].title}")
+            view.pack(fill=tk.BOTH, expand=True)
+            root.update()
+            reset = [_timed(view.reset)[0] for _ in range(20)]
+            scroll = []
+            for step in range(50):
+                scroll.append(_timed(view.yview, 'moveto', step / 50)[0])
+            insert = [_timed(view.inserted, 0)[0] for _ in range(20)]
+            results[str(size)] = {'reset': _percentiles(reset), 'scroll': _percentiles(scroll),
+                                  'insert_visible': _percentiles(insert)}
+            view.destroy()
+    finally:
+        root.destroy()
+    return results
+
+
+def bench_search(sizes, seed):
+    """搜索索引的建立和逐字输入时的查询耗时"""
+    import random
+
+    from search_index import SearchIndex
+    from track_store import Track
+
+    rng = random.Random(seed)
+    results = {}
+    for size in sizes:
+        titles = song_titles(size, seed)
+        tracks = [Track(title, f"/music/合集{i // 100}/{i}.mp3", id=i)
+                  for i, title in enumerate(titles)]
+        index = SearchIndex()
+        build, _ = _timed(index.add_many, tracks)
+        # 模拟逐字输入：取标题的前缀，以及标题中间的片段
+        typing = []
+        for title in rng.sample(titles, min(50, size)):
+            for end in range(1, min(len(title), 6) + 1):
+                typing.append(_timed(index.search, title[:end])[0])
+            middle = len(title) // 2
+            typing.append(_timed(index.search, title[middle:middle + 2])[0])
+        results[str(size)] = {'build_ms': build * 1000, 'query': _percentiles(typing)}
+    return results
+
+
+def bench_analysis(tmp, seconds, seed):
+    """一首歌曲的响度和波形分析耗时（在当前进程中，不经过进程池）"""
+    try:
+        import numpy as np
+    except ImportError:
+        return {'skipped': "未安装NumPy"}
+    import wave
+
+    from audio_analysis import SAMPLE_RATE, analyze_file
+
+    # 合成的噪声WAV，没有FFmpeg时也能分析
+    path = os.path.join(tmp, "analysis.wav")
+    rng = np.random.default_rng(seed)
+    samples = rng.normal(0, 0.1, (seconds * SAMPLE_RATE, 2)).clip(-1, 1)
+    with wave.open(path, 'wb') as f:
+        f.setnchannels(2)
+        f.setsampwidth(2)
+        f.setframerate(SAMPLE_RATE)
+        f.writeframes((samples * 32767).astype('<i2').tobytes())
+    runs = [analyze_file(path)['seconds'] for _ in range(3)]
+    return {'audio_seconds': seconds, 'analysis': _percentiles(runs),
+            'realtime_factor': seconds / min(runs)}
+
+
+def bench_downloads(tmp, entries, audio_seconds):
+    """用假的yt-dlp下载合集（不转码），以及重新同步时全部跳过的耗时"""
+    from download_archive import DownloadArchive
+    from downloader import Downloader
+    from library_db import LibraryDB
+
+    fake_ytdlp.install(audio_seconds=audio_seconds)
+    downloader = Downloader(os.path.join(tmp, "downloads"),
+                            library_db=LibraryDB(os.path.join(tmp, "downloads.db")),
+                            archive=DownloadArchive(os.path.join(tmp, "archive.db")))
+    url = f"https://www.bilibili.com/video/BV1benchmk00?playlist={entries}"
+    first, counts = _timed(downloader.batch_download, url, 'native', 4)
+    resync, resync_counts = _timed(downloader.batch_download, url, 'native', 4)
+    return {'entries': entries, 'audio_seconds': audio_seconds,
+            'batch_ms': first * 1000, 'downloaded': counts[0],
+            'resync_ms': resync * 1000, 'resync_skipped': resync_counts[1]}
+
+
+def bench_stream(tmp, audio_seconds, rate):
+    """边下边播：从本地服务器下载音频流，读取第一块数据和全部数据的耗时"""
+    from progressive import ProgressiveDownload
+
+    with LyricServer(latency=0, audio_seconds=audio_seconds, audio_rate=rate) as server:
+        download = ProgressiveDownload(f"{server.url}/audio/BV1stream000.mp3",
+                                       os.path.join(tmp, "stream.mp3"),
+                                       temp_dir=os.path.join(tmp, "stream"))
+        reader = download.open_reader()
+        start = time.perf_counter()
+        download.start()
+        first = None
+        size = 0
+        while True:
+            data = reader.read(64 * 1024)
+            if not data:
+                break
+            if first is None:
+                first = time.perf_counter() - start
+            size += len(data)
+        reader.close()
+        download.wait()
+        total = time.perf_counter() - start
+    return {'bytes': size, 'first_chunk_ms': (first or 0) * 1000, 'total_ms': total * 1000}
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _flatten(value, prefix=''):
+    if isinstance(value, dict):
+        for key, item in value.items():
+            yield from _flatten(item, f"{prefix}.{key}" if prefix else key)
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        yield prefix, value
+
+
+def compare(previous, current, threshold):
+    """列出耗时（_ms、_us结尾的字段）变化超过threshold比例的条目"""
+    before = dict(_flatten(previous['results']))
+    lines = []
+    for key, value in _flatten(current['results']):
+        if not key.endswith(('_ms', '_us')) or key not in before or not before[key]:
+            continue
+        change = value / before[key] - 1
+        if abs(change) >= threshold:
+            mark = "变慢" if change > 0 else "变快"
+            lines.append(f"{mark} {change:+.0%}  {key}: {before[key]:.2f} -> {value:.2f}")
+    return lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="离线基准测试，结果输出为JSON")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000],
+                        help="合成音乐库的歌曲数（默认 1000 10000 100000）")
+    parser.add_argument('--quick', action='store_true', help="只测试1000首的音乐库和少量歌词请求")
+    parser.add_argument('--lookups', type=int, default=50, help="歌词请求次数（默认 50）")
+    parser.add_argument('--latency', type=float, default=0.05, help="模拟歌词接口的延迟秒数")
+    parser.add_argument('--failure-rate', type=float, default=0.1, help="模拟歌词接口的错误率")
+    parser.add_argument('--miss-rate', type=float, default=0.2, help="模拟找不到歌词的比例")
+    parser.add_argument('--entries', type=int, default=20, help="合集下载测试的条目数")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', help="结果写入的JSON文件，默认输出到标准输出")
+    parser.add_argument('--compare', metavar='PREVIOUS', help="与之前的结果文件比较")
+    parser.add_argument('--threshold', type=float, default=0.2, help="比较时报告的变化比例（默认 0.2）")
+    args = parser.parse_args(argv)
+    if args.quick:
+        args.sizes = [1000]
+        args.lookups = min(args.lookups, 20)
+        args.entries = min(args.entries, 5)
+
+    # 各模块的诊断输出（例如歌词源失败）写到标准错误，标准输出只保留结果
+    stdout = sys.stdout
+    sys.stdout = sys.stderr
+
+    from metrics import metrics
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="bmp-bench-") as tmp:
+        def run(name, func, *func_args):
+            print(f"运行 {name} ...", file=sys.stderr)
+            start = time.perf_counter()
+            results[name] = func(*func_args)
+            print(f"  完成，用时 {time.perf_counter() - start:.1f} 秒", file=sys.stderr)
+
+        run('clean_song_name', bench_clean_song_name, 10000)
+        run('lyric_lookup', bench_lyric_lookup, tmp, args.lookups, args.latency,
+            args.failure_rate, args.miss_rate, args.seed)
+        results['library'] = {}
+        for size in args.sizes:
+            run(f'library_{size}', bench_library, tmp, size, args.seed)
+            results['library'][str(size)] = results.pop(f'library_{size}')
+        run('playlist_render', bench_playlist_render, args.sizes)
+        run('search', bench_search, args.sizes, args.seed)
+        run('analysis', bench_analysis, tmp, 180, args.seed)
+        run('downloads', bench_downloads, tmp, args.entries, 30)
+        run('stream', bench_stream, tmp, 180, None)
+
+    report = {
+        'meta': {'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'commit': _git_commit(),
+                 'python': platform.python_version(), 'platform': platform.platform(),
+                 'args': vars(args)},
+        'results': results,
+        'metrics': metrics.snapshot(),
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            f.write(text + "\n")
+    else:
+        stdout.write(text + "\n")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            previous = json.load(f)
+        lines = compare(previous, report, args.threshold)
+        print(f"与 {args.compare} 相比：" + ("无明显变化" if not lines else ""), file=sys.stderr)
+        for line in lines:
+            print("  " + line, file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
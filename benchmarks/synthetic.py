@@ -0,0 +1,54 @@
+"""生成基准测试用的合成数据：B站风格的歌曲标题、静音MP3和音乐库目录树"""
+import os
+import random
+
+# MPEG-1 Layer III、128kbps、44.1kHz、立体声、无CRC的帧头，
+# 帧内其余字节全为0，解码结果是静音，每帧 1152 个采样
+_FRAME_HEADER = bytes([0xFF, 0xFB, 0x90, 0x00])
+FRAME_SIZE = 144 * 128000 // 44100
+FRAME_SECONDS = 1152 / 44100
+
+_WORDS = ["孤勇者", "晴天", "稻香", "起风了", "夜曲", "青花瓷", "海阔天空", "光年之外",
+          "平凡之路", "演员", "告白气球", "说好不哭", "Lemon", "Counting Stars",
+          "See You Again", "夜に駆ける", "千本桜", "少年", "漠河舞厅", "错位时空"]
+_DECORATIONS = ["【{}】", "[{}]", "({})", "（{}）", " | {}", " - {}", "_{}"]
+_TAGS = ["高清", "官方MV", "Hi-Res", "完整版", "无损音质", "Bilibili", "live", "翻唱",
+         "动态歌词", "4K"]
+
+
+def silent_mp3(seconds):
+    """返回时长约为seconds的静音MP3数据"""
+    frames = max(1, int(seconds / FRAME_SECONDS))
+    frame = _FRAME_HEADER + bytes(FRAME_SIZE - len(_FRAME_HEADER))
+    return frame * frames
+
+
+def song_titles(count, seed=0):
+    """生成count个带有B站视频标题常见修饰的歌曲标题，同一seed结果相同"""
+    rng = random.Random(seed)
+    titles = []
+    for i in range(count):
+        title = f"{rng.choice(_WORDS)}{i}"
+        for _ in range(rng.randint(0, 3)):
+            decoration = rng.choice(_DECORATIONS).format(rng.choice(_TAGS))
+            title = decoration + title if rng.random() < 0.4 else title + decoration
+        titles.append(title)
+    return titles
+
+
+def make_library(root, count, per_folder=100, seed=0, extensions=('.mp3', '.m4a')):
+    """在root下生成count个空的音频文件，按合集分到若干子目录，返回文件路径列表
+
+    扫描只关心目录结构和扩展名，文件内容为空即可。
+    """
+    rng = random.Random(seed)
+    paths = []
+    for i, title in enumerate(song_titles(count, seed)):
+        folder = os.path.join(root, f"合集{i // per_folder:05d}")
+        if i % per_folder == 0:
+            os.makedirs(folder, exist_ok=True)
+        safe = "".join('_' if c in '\\/:*?"<>|' else c for c in title)
+        path = os.path.join(folder, f"{i:06d} {safe}{rng.choice(extensions)}")
+        open(path, 'wb').close()
+        paths.append(path)
+    return paths
@@ -0,0 +1,186 @@
+"""命令行批量下载，不启动图形界面，也不初始化音频设备
+
+用法示例：
+    python cli.py https://www.bilibili.com/video/BV... -q native
+    python cli.py -f urls.txt -j 8 --lyrics > progress.jsonl
+
+标准输出每行是一个JSON对象，event 字段表示事件类型：
+start、entries、progress、track、skipped、lyrics、error、done。
+其他诊断信息输出到标准错误。全部成功时退出码为0，有失败的条目时为1。
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import redirect_stdout
+
+from download_archive import DownloadArchive
+from downloader import Downloader, QUALITY_CHOICES, unconverted
+from library_db import LibraryDB
+from metrics import metrics
+
+
+class JsonReporter:
+    """把事件以JSON Lines格式写到输出流，多个线程共用"""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self._lock = threading.Lock()
+
+    def emit(self, event, **fields):
+        record = {'event': event, 'time': round(time.time(), 3)}
+        record.update(fields)
+        line = json.dumps(record, ensure_ascii=False)
+        with self._lock:
+            self.stream.write(line + '\n')
+            self.stream.flush()
+
+
+def read_urls(urls, url_file):
+    """合并命令行参数和文件中的链接，文件中的空行和 # 开头的行会被忽略"""
+    result = list(urls)
+    if url_file:
+        with open(url_file, encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith('#'):
+                    result.append(line)
+    return result
+
+
+def track_fields(track):
+    return {'title': track.title, 'file': track.file, 'duration': track.duration, 'url': track.url}
+
+
+def watch_progress(progress, reporter, interval, stop_event):
+    """按固定间隔输出进度，没有变化时不输出"""
+    version = -1
+    while not stop_event.wait(interval):
+        if progress.version != version:
+            version = progress.version
+            reporter.emit('progress', **progress.state())
+
+
+def save_lyrics(fetcher, track, reporter):
+    """获取带时间标签的歌词，保存为与音频同名的 .lrc 文件"""
+    from lrc_parser import parse_lrc
+
+    try:
+        lyrics = fetcher.get_lyrics(track.title)
+        if not lyrics or not parse_lrc(lyrics).has_timestamps:
+            reporter.emit('lyrics', title=track.title, found=False)
+            return
+        path = os.path.splitext(track.file)[0] + '.lrc'
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(lyrics)
+        reporter.emit('lyrics', title=track.title, found=True, file=path)
+    except Exception as e:
+        reporter.emit('error', title=track.title, stage='lyrics', error=str(e))
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="B站音乐批量下载（命令行模式，输出JSON Lines进度）")
+    parser.add_argument('urls', nargs='*', help="视频或合集链接")
+    parser.add_argument('-f', '--file', help="链接列表文件，每行一个链接")
+    parser.add_argument('-q', '--quality', choices=QUALITY_CHOICES, default='high',
+                        help="high: 320k MP3，standard: 192k MP3，native: 原始音频不转码（默认 high）")
+    parser.add_argument('-j', '--concurrency', type=int, default=4, help="每个合集的并发下载数（默认 4）")
+    parser.add_argument('-o', '--output', default='downloads', help="下载目录（默认 downloads）")
+    parser.add_argument('--cache-dir',
+                        help="下载记录、音乐库索引和歌词缓存的目录（默认为下载目录旁边的 cache，"
+                             "与图形界面共用）")
+    parser.add_argument('--no-hash-dedupe', dest='hash_dedupe', action='store_false',
+                        help="不按内容哈希去重（默认会先为下载目录中的已有文件建立哈希索引）")
+    parser.add_argument('--lyrics', action='store_true', help="同时获取歌词并保存为 .lrc 文件")
+    parser.add_argument('--interval', type=float, default=1.0, help="进度输出间隔秒数（默认 1）")
+    parser.add_argument('--metrics', metavar='PATH',
+                        help="结束时把耗时统计写入文件，.prom 为Prometheus textfile格式，其他为JSON")
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    urls = read_urls(args.urls, args.file)
+    if not urls:
+        parser.error("没有要下载的链接")
+
+    # 事件写到真正的标准输出；运行期间各模块用print输出的诊断信息改写到标准错误，标准输出只保留JSON
+    reporter = JsonReporter(sys.stdout)
+    with redirect_stdout(sys.stderr):
+        return run(args, urls, reporter)
+
+
+def run(args, urls, reporter):
+    # 缓存目录跟随下载目录，而不是启动命令时所在的目录
+    cache_dir = args.cache_dir or os.path.join(os.path.dirname(os.path.abspath(args.output)), 'cache')
+    downloader = Downloader(args.output,
+                            library_db=LibraryDB(os.path.join(cache_dir, 'library.db')),
+                            archive=DownloadArchive(os.path.join(cache_dir, 'download_archive.db'),
+                                                    hash_dedupe=args.hash_dedupe))
+    progress = downloader.progress
+    stop_event = threading.Event()
+    watcher = threading.Thread(target=watch_progress,
+                               args=(progress, reporter, args.interval, stop_event), daemon=True)
+    watcher.start()
+
+    lyric_pool = None
+    if args.lyrics:
+        from lyric_cache import LyricCache
+        from lyric_fetcher import LyricFetcher
+        from source_stats import SourceStats
+        fetcher = LyricFetcher(cache=LyricCache(os.path.join(cache_dir, 'lyrics.db')),
+                               concurrent=True,
+                               stats=SourceStats(os.path.join(cache_dir, 'lyric_sources.json')))
+        lyric_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix='lyrics')
+
+    def on_track(track):
+        reporter.emit('track', converted=not unconverted(track, args.quality), **track_fields(track))
+        if lyric_pool:
+            lyric_pool.submit(save_lyrics, fetcher, track, reporter)
+
+    def on_skip(track):
+        reporter.emit('skipped', **track_fields(track))
+
+    def on_error(entry_url, error):
+        reporter.emit('error', url=entry_url, error=str(error))
+
+    started = time.monotonic()
+    if args.hash_dedupe:
+        # 下载目录中已有的文件也参与去重，只有新增或修改过的文件需要读取
+        print(f"已为{downloader.index_library(scan=True)}个文件建立内容哈希索引")
+    downloaded = skipped = failed = 0
+    for url in urls:
+        reporter.emit('start', url=url)
+        progress.begin()
+        try:
+            counts = downloader.batch_download(
+                url, args.quality, max(1, args.concurrency),
+                on_track=on_track, on_skip=on_skip, on_error=on_error,
+                on_start=lambda total, done: reporter.emit('entries', url=url, pending=total,
+                                                           skipped=done))
+            downloaded += counts[0]
+            skipped += counts[1]
+            failed += counts[2]
+        except Exception as e:
+            failed += 1
+            reporter.emit('error', url=url, error=str(e))
+        finally:
+            progress.end()
+
+    if lyric_pool:
+        lyric_pool.shutdown(wait=True)
+    stop_event.set()
+    watcher.join()
+    reporter.emit('done', downloaded=downloaded, skipped=skipped, failed=failed,
+                  elapsed=round(time.monotonic() - started, 3))
+    if args.metrics:
+        metrics.export(args.metrics)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
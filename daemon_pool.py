@@ -0,0 +1,64 @@
+import queue
+import threading
+from concurrent.futures import Future
+
+
+class DaemonThreadPool:
+    """工作线程为守护线程的线程池，submit 与 ThreadPoolExecutor 相同，返回Future
+
+    ThreadPoolExecutor 的工作线程在解释器退出时会被等待，即使已经调用了
+    shutdown(wait=False)，一个正在等网络响应的任务（最长十几秒）就会让关闭窗口后进程迟迟不退出。
+    网络请求这类可以随时放弃的任务放在这里执行，退出时不等待。
+    """
+
+    def __init__(self, max_workers, thread_name_prefix='daemon'):
+        self.max_workers = max_workers
+        self.thread_name_prefix = thread_name_prefix
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._threads = []
+        self._closed = False
+
+    def submit(self, fn, *args, **kwargs):
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("线程池已关闭")
+            future = Future()
+            self._queue.put((future, fn, args, kwargs))
+            if len(self._threads) < self.max_workers:
+                thread = threading.Thread(target=self._worker, daemon=True,
+                                          name=f"{self.thread_name_prefix}-{len(self._threads)}")
+                thread.start()
+                self._threads.append(thread)
+        return future
+
+    def _worker(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            future, fn, args, kwargs = item
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                result = fn(*args, **kwargs)
+            except BaseException as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+
+    def shutdown(self, cancel_futures=True):
+        """不再接受新任务，取消排队中的任务，正在执行的任务不等待"""
+        with self._lock:
+            self._closed = True
+            threads = len(self._threads)
+        if cancel_futures:
+            while True:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is not None:
+                    item[0].cancel()
+        for _ in range(threads):
+            self._queue.put(None)
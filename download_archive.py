@@ -0,0 +1,177 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from metrics import metrics
+from track_store import Track
+
+_BV_ID = re.compile(r'(BV[0-9A-Za-z]{10})')
+_AV_ID = re.compile(r'(?:^|[/_?&=])av(\d+)', re.IGNORECASE)
+# 分P可以写在链接参数里（?p=2），也可以是yt-dlp的id后缀（BV..._p2）
+_PART = re.compile(r'(?:[?&]p=|_p)(\d+)')
+
+
+def video_key(text):
+    """从链接或yt-dlp的视频id中提取 "BV号:p分P" 形式的标识，无法识别时返回None"""
+    if not text:
+        return None
+    match = _BV_ID.search(text)
+    if match:
+        video_id = match.group(1)
+    else:
+        match = _AV_ID.search(text)
+        if not match:
+            return None
+        video_id = 'av' + match.group(1)
+    part = _PART.search(text)
+    return f"{video_id}:p{int(part.group(1)) if part else 1}"
+
+
+def file_digest(path, chunk_size=1024 * 1024):
+    """计算文件内容的哈希"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class DownloadArchive:
+    """下载记录
+
+    按B站视频号和分P记录已经下载到音乐库的文件，重新同步合集时跳过已下载的条目。
+    可选的内容哈希索引记录每个下载的原始音频和音乐库中已有文件的哈希，
+    不同链接下载到完全相同的音频时只保留已有的文件。
+    音乐库文件的哈希按文件大小和修改时间缓存，再次建立索引时未变化的文件不再读取。
+    """
+
+    def __init__(self, db_path="cache/download_archive.db", hash_dedupe=True):
+        self.db_path = db_path
+        self.hash_dedupe = hash_dedupe
+        self._lock = threading.Lock()
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir and not os.path.exists(db_dir):
+            os.makedirs(db_dir)
+
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS archive (
+                video_key TEXT PRIMARY KEY,
+                file TEXT NOT NULL,
+                title TEXT NOT NULL,
+                duration REAL NOT NULL DEFAULT 0,
+                url TEXT,
+                added_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS content_hashes (
+                digest TEXT PRIMARY KEY,
+                file TEXT NOT NULL,
+                title TEXT NOT NULL,
+                duration REAL NOT NULL DEFAULT 0,
+                url TEXT
+            )
+        """)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS file_hashes (
+                file TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                digest TEXT NOT NULL
+            )
+        """)
+        self._conn.commit()
+
+    def find(self, url):
+        """返回链接对应的已下载歌曲，未下载或文件已被删除时返回None"""
+        key = video_key(url)
+        if key is None:
+            return None
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT file, title, duration, url FROM archive WHERE video_key = ?", (key,)
+            ).fetchone()
+        return self._existing(row)
+
+    def find_content(self, digest):
+        """返回内容哈希相同的已下载歌曲，文件已被删除时返回None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT file, title, duration, url FROM content_hashes WHERE digest = ?", (digest,)
+            ).fetchone()
+        return self._existing(row)
+
+    def _existing(self, row):
+        if row is None:
+            return None
+        file, title, duration, url = row
+        if not os.path.exists(file):
+            return None
+        return Track(title, file, duration, url)
+
+    def add(self, urls, track, digests=()):
+        """记录下载完成的歌曲，urls 中能识别出视频号的链接或id都会记录
+
+        digests 为指向这首歌曲的内容哈希，例如原始音频和转码后的MP3。
+        """
+        keys = {key for key in map(video_key, urls) if key}
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO archive (video_key, file, title, duration, url, added_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(key, track.file, track.title, track.duration, track.url, now) for key in keys])
+            if self.hash_dedupe:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO content_hashes (digest, file, title, duration, url) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    [(digest, track.file, track.title, track.duration, track.url)
+                     for digest in digests if digest])
+            self._conn.commit()
+
+    def index_files(self, tracks):
+        """为音乐库中已有的文件建立内容哈希索引，返回重新计算哈希的文件数
+
+        大小和修改时间与上次相同的文件直接跳过。需要读取整个文件，应在后台线程中调用。
+        """
+        with self._lock:
+            known = {file: (size, mtime_ns) for file, size, mtime_ns in
+                     self._conn.execute("SELECT file, size, mtime_ns FROM file_hashes")}
+        hashed = 0
+        for track in tracks:
+            if not self.hash_dedupe:
+                break
+            try:
+                stat = os.stat(track.file)
+                if known.get(track.file) == (stat.st_size, stat.st_mtime_ns):
+                    continue
+                digest = file_digest(track.file)
+            except OSError:
+                continue
+            with self._lock:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO file_hashes (file, size, mtime_ns, digest) "
+                    "VALUES (?, ?, ?, ?)",
+                    (track.file, stat.st_size, stat.st_mtime_ns, digest))
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO content_hashes (digest, file, title, duration, url) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (digest, track.file, track.title, track.duration, track.url))
+                self._conn.commit()
+            hashed += 1
+        metrics.inc('library_files_hashed', hashed)
+        return hashed
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
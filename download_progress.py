@@ -0,0 +1,215 @@
+import threading
+
+
+def format_bytes(size):
+    """把字节数格式化为便于阅读的文本"""
+    for unit in ('B', 'KB', 'MB'):
+        if size < 1024:
+            return f"{size:.0f}{unit}" if unit == 'B' else f"{size:.1f}{unit}"
+        size /= 1024
+    return f"{size:.1f}GB"
+
+
+def format_eta(seconds):
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+    return f"{seconds // 60:02d}:{seconds % 60:02d}"
+
+
+class _Task:
+    """一个下载条目的最新状态"""
+
+    __slots__ = ('title', 'phase', 'downloaded', 'total', 'speed', 'eta')
+
+    def __init__(self, title):
+        self.title = title
+        self.phase = '准备中'
+        self.downloaded = 0
+        self.total = None
+        self.speed = None
+        self.eta = None
+
+    @property
+    def fraction(self):
+        if self.phase != '下载中':
+            # 下载之后的阶段（合并、转码）都视为下载部分已完成
+            return 0.0 if self.phase == '准备中' else 1.0
+        if not self.total:
+            return 0.0
+        return min(self.downloaded / self.total, 1.0)
+
+
+class DownloadProgress:
+    """下载进度汇总
+
+    yt-dlp的 progress_hooks 在下载线程中每收到一块数据就会调用一次，
+    这里只把最新状态写入按条目索引的表，同一条目的多次更新互相覆盖，
+    界面线程按固定间隔调用 snapshot 取一次汇总后的状态刷新控件，
+    回调再频繁也不会向Tk事件循环堆积事件，下载线程也不直接操作控件。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tasks = {}
+        self._version = 0
+        self._drawn_version = -1
+        self._message = None
+        self._batch_total = 0
+        self._batch_done = 0
+        self._jobs = 0
+
+    # ---- 下载线程调用 ----
+
+    def begin(self, message=None):
+        """开始一个下载任务（单曲或合集）"""
+        with self._lock:
+            if self._jobs == 0:
+                self._tasks.clear()
+                self._batch_total = 0
+                self._batch_done = 0
+            self._jobs += 1
+            self._message = message
+            self._version += 1
+
+    def end(self, message=None):
+        """下载任务结束，message 为最终显示的文本"""
+        with self._lock:
+            self._jobs = max(self._jobs - 1, 0)
+            if message is not None:
+                self._message = message
+            self._version += 1
+
+    def message(self, text):
+        """显示一条状态文本，直到有新的进度"""
+        with self._lock:
+            self._message = text
+            self._version += 1
+
+    def add_entries(self, count):
+        """合集中增加了count个待下载的条目"""
+        with self._lock:
+            self._batch_total += count
+            self._version += 1
+
+    def hooks(self, task_id, title=None):
+        """返回加入yt-dlp配置的回调"""
+        with self._lock:
+            self._tasks.setdefault(task_id, _Task(title or task_id))
+        return {
+            'progress_hooks': [lambda d: self._on_progress(task_id, d)],
+            'postprocessor_hooks': [lambda d: self._on_postprocess(task_id, d)],
+        }
+
+    def _on_progress(self, task_id, d):
+        status = d.get('status')
+        with self._lock:
+            task = self._tasks.get(task_id)
+            if task is None:
+                return
+            title = (d.get('info_dict') or {}).get('title')
+            if title:
+                task.title = title
+            if status == 'downloading':
+                task.phase = '下载中'
+                task.downloaded = d.get('downloaded_bytes') or 0
+                task.total = d.get('total_bytes') or d.get('total_bytes_estimate')
+                task.speed = d.get('speed')
+                task.eta = d.get('eta')
+            elif status == 'finished':
+                task.phase = '下载完成'
+                task.speed = task.eta = None
+            elif status == 'error':
+                task.phase = '下载出错'
+            self._message = None
+            self._version += 1
+
+    def _on_postprocess(self, task_id, d):
+        with self._lock:
+            task = self._tasks.get(task_id)
+            if task is None:
+                return
+            if d.get('status') == 'started':
+                task.phase = f"处理中 ({d.get('postprocessor')})"
+            elif d.get('status') == 'finished':
+                task.phase = '下载完成'
+            self._message = None
+            self._version += 1
+
+    def set_phase(self, task_id, phase):
+        with self._lock:
+            task = self._tasks.get(task_id)
+            if task is not None:
+                task.phase = phase
+                self._message = None
+                self._version += 1
+
+    def finish_task(self, task_id):
+        """条目完成（成功或失败），计入合集进度"""
+        with self._lock:
+            if self._tasks.pop(task_id, None) is not None:
+                self._batch_done += 1
+                self._version += 1
+
+    # ---- 界面线程调用 ----
+
+    @property
+    def active(self):
+        return self._jobs > 0
+
+    @property
+    def version(self):
+        """进度每变化一次加一，用于判断是否需要重新输出"""
+        return self._version
+
+    def state(self):
+        """返回当前进度的结构化快照，供命令行输出JSON"""
+        with self._lock:
+            return {
+                'batch_total': self._batch_total,
+                'batch_done': self._batch_done,
+                'tasks': [{'id': task_id, 'title': task.title, 'phase': task.phase,
+                           'downloaded_bytes': task.downloaded, 'total_bytes': task.total,
+                           'speed': task.speed, 'eta': task.eta}
+                          for task_id, task in self._tasks.items()],
+            }
+
+    def snapshot(self):
+        """返回 (状态文本, 进度百分比)，与上次相比没有变化时返回None"""
+        with self._lock:
+            if self._version == self._drawn_version:
+                return None
+            self._drawn_version = self._version
+            tasks = list(self._tasks.values())
+            message = self._message
+            batch_total = self._batch_total
+            batch_done = self._batch_done
+
+        if batch_total:
+            done = batch_done + sum(task.fraction for task in tasks)
+            percent = done / batch_total * 100
+        elif tasks:
+            percent = tasks[0].fraction * 100
+        else:
+            percent = 100.0 if message and not self.active else 0.0
+        if message:
+            return message, percent
+
+        parts = []
+        if batch_total:
+            parts.append(f"合集 {batch_done}/{batch_total}")
+        downloading = [task for task in tasks if task.phase == '下载中']
+        if len(tasks) == 1:
+            task = tasks[0]
+            parts.append(f"{task.phase}: {task.title}")
+            if task.phase == '下载中' and task.total:
+                parts.append(f"{format_bytes(task.downloaded)}/{format_bytes(task.total)}")
+        elif tasks:
+            parts.append(f"下载中 {len(downloading)} · 其他阶段 {len(tasks) - len(downloading)}")
+        speed = sum(task.speed or 0 for task in downloading)
+        if speed:
+            parts.append(f"{format_bytes(speed)}/s")
+        etas = [task.eta for task in downloading if task.eta is not None]
+        if etas and not batch_total:
+            parts.append(f"剩余 {format_eta(max(etas))}")
+        return "⬇️ " + " · ".join(parts), percent
@@ -0,0 +1,331 @@
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed, wait
+
+from download_archive import DownloadArchive, file_digest
+from download_progress import DownloadProgress
+from library import LibraryScanner
+from library_db import LibraryDB
+from metrics import metrics
+from track_store import Track
+from transcoder import TranscodePipeline
+
+QUALITY_CHOICES = ("high", "standard", "native")
+
+
+def record_download(d, source='ytdlp'):
+    """progress_hooks 回调，下载完成时记录字节数和耗时"""
+    if d.get('status') != 'finished':
+        return
+    size = d.get('downloaded_bytes') or d.get('total_bytes') or 0
+    metrics.inc('download_bytes', size, source=source)
+    if d.get('elapsed') is not None:
+        metrics.observe('download_seconds', d['elapsed'], source=source)
+
+
+def quality_info(quality):
+    """音质选项的显示文本"""
+    return {
+        "high": "高音质MP3 (320k)",
+        "standard": "标准音质MP3 (192k)",
+        "native": "原始音质 (不转码)",
+    }.get(quality, quality)
+
+
+def unconverted(track, quality):
+    """按音质应该转码为MP3，但转码失败而保留了原始格式的文件"""
+    return quality != "native" and not track.file.lower().endswith('.mp3')
+
+
+class Downloader:
+    """与界面无关的下载核心
+
+    负责解析链接、下载原始音频、提交转码、写入音乐库索引和下载记录，
+    进度记录到 DownloadProgress 中。图形界面和命令行共用这一套流程，
+    不依赖Tk和pygame。完成的歌曲通过 on_track 回调通知，回调在后台线程中执行。
+    yt-dlp导入时会加载数百个网站解析模块，因此在第一次下载时才导入。
+    """
+
+    def __init__(self, root="downloads", library=None, library_db=None, archive=None,
+                 transcoder=None, progress=None):
+        self.root = root
+        self.library = library or LibraryScanner(root)
+        self.library_db = library_db or LibraryDB()
+        self.archive = archive or DownloadArchive()
+        self.transcoder = transcoder or TranscodePipeline()
+        self.progress = progress or DownloadProgress()
+        self._indexing = threading.Lock()
+
+    def ydl_opts(self, outtmpl):
+        """生成yt-dlp配置，只下载原始音频流，不在下载线程中转码"""
+        return {
+            'format': 'bestaudio/best',
+            'outtmpl': outtmpl,
+            'quiet': True,
+            'no_warnings': True,
+        }
+
+    def _ensure_root(self):
+        if not os.path.exists(self.root):
+            os.makedirs(self.root)
+
+    def index_library(self, scan=False):
+        """为下载目录中已有的文件建立内容哈希索引，返回新计算哈希的文件数
+
+        scan 为True时先扫描下载目录，把不在音乐库索引中的文件补充进去（命令行模式没有其他扫描）。
+        在后台线程中调用；已经在建立索引时直接返回0。
+        """
+        if not self.archive.hash_dedupe or not self._indexing.acquire(blocking=False):
+            return 0
+        try:
+            if scan:
+                added, removed = self.library.scan()
+                if added:
+                    self.library_db.add_many(added)
+                if removed:
+                    self.library_db.remove_many(removed)
+            return self.archive.index_files(self.library_db.load())
+        finally:
+            self._indexing.release()
+
+    def _find_duplicate(self, path):
+        """计算文件的内容哈希，返回 (哈希, 内容完全相同的另一首已有歌曲或None)"""
+        digest = file_digest(path)
+        existing = self.archive.find_content(digest)
+        if existing is not None and os.path.normpath(existing.file) == os.path.normpath(path):
+            existing = None
+        return digest, existing
+
+    def download(self, url, quality):
+        """下载单个视频并等待转码完成，返回 (Track, 是否因已下载而跳过)"""
+        self._ensure_root()
+        existing = self.archive.find(url)
+        if existing is not None:
+            return existing, True
+        ydl_opts = self.ydl_opts(os.path.join(self.root, '%(title)s.%(ext)s'))
+        return self.download_one(url, ydl_opts, quality).result(), False
+
+    def download_one(self, url, ydl_opts, quality):
+        """下载单个视频的原始音频并提交转码
+
+        下载完成即返回，不等待转码。返回Future，结果为Track。
+        下载和转码的进度以链接为条目记录到下载进度中。
+        """
+        hooks = self.progress.hooks(url)
+        hooks['progress_hooks'].append(record_download)
+        ydl_opts = dict(ydl_opts, **hooks)
+        try:
+            result = self._fetch_one(url, ydl_opts, quality)
+        except Exception:
+            self.progress.finish_task(url)
+            raise
+        result.add_done_callback(lambda future: self.progress.finish_task(url))
+        return result
+
+    def _fetch_one(self, url, ydl_opts, quality):
+        import yt_dlp
+
+        # 包含下载时间，纯下载部分另由 record_download 统计
+        with yt_dlp.YoutubeDL(ydl_opts) as ydl, \
+                metrics.timer('ytdlp_extract_seconds', mode='download'):
+            info = ydl.extract_info(url, download=True)
+            filename = ydl.prepare_filename(info)
+
+        # 统一路径写法，与音乐库扫描的结果保持一致
+        filename = os.path.normpath(filename)
+
+        # 检查文件是否实际存在
+        if not os.path.exists(filename):
+            raise FileNotFoundError(f"下载的文件不存在: {filename}")
+
+        sources = (url, info.get('webpage_url'), info.get('id'))
+        digest = None
+        if self.archive.hash_dedupe:
+            # 不同链接下载到完全相同的音频时，保留已有的文件，不再转码
+            digest, existing = self._find_duplicate(filename)
+            if existing is not None:
+                os.remove(filename)
+                self.archive.add(sources, existing)
+                result = Future()
+                result.set_result(existing)
+                return result
+
+        track = Track(info.get('title', '未知标题'), filename,
+                      info.get('duration', 0), info.get('webpage_url') or url)
+        return self.finish_download(track, quality, sources, digest, task_id=url)
+
+    def finish_download(self, track, quality, sources=(), digest=None, task_id=None):
+        """按音质转码下载好的原始音频并记录到音乐库，返回Future，结果为Track
+
+        sources 是下载用到的链接和视频id，记录到下载记录中。
+        """
+        filename = track.file
+        result = Future()
+        digests = [digest]
+
+        def finish():
+            # 记录到音乐库索引，保留yt-dlp返回的标题和时长
+            self.library.load([track.file])
+            self.library_db.add(track)
+            self.archive.add(sources, track, digests)
+            result.set_result(track)
+
+        # 原始音质直接保留B站的m4a/AAC音频流，播放时实时解码
+        if quality == "native" or filename.lower().endswith('.mp3'):
+            finish()
+            return result
+
+        # 高音质 320k MP3，标准音质 192k MP3
+        bitrate = '320k' if quality == "high" else '192k'
+        final_file = filename.rsplit('.', 1)[0] + '.mp3'
+        # 转码期间原始文件和MP3并存，刷新音乐库时不能把原始文件当成新歌
+        self.library.hold(filename)
+        self.progress.set_phase(task_id, "等待转码")
+        # 提交只是排队，转码线程开始处理时才进入转码阶段
+        transcode = self.transcoder.submit(
+            filename, final_file, bitrate,
+            on_start=lambda: self.progress.set_phase(task_id, "转码中"))
+
+        def on_transcoded(future):
+            self.library.release(filename)
+            error = future.exception()
+            try:
+                if error is None:
+                    track.file = future.result()
+                    if self.archive.hash_dedupe:
+                        # 转码结果与音乐库中已有的MP3完全相同时保留已有的文件
+                        final_digest, existing = self._find_duplicate(track.file)
+                        if existing is not None:
+                            os.remove(track.file)
+                            self.archive.add(sources, existing, digests)
+                            result.set_result(existing)
+                            return
+                        digests.append(final_digest)
+                else:
+                    # 没有FFmpeg或转码失败时保留下载的原始文件，照常加入音乐库，
+                    # 否则它会成为扫描时来历不明的文件，下次还会被重新下载
+                    metrics.inc('transcode_fallbacks')
+                    print(f"转码失败，保留原始格式: {track.title}: {error}")
+                    self.progress.message(f"⚠️ 转码失败，保留原始格式: {track.title}")
+                finish()
+            except Exception as e:
+                result.set_exception(e)
+
+        transcode.add_done_callback(on_transcoded)
+        return result
+
+    def list_entries(self, url):
+        """枚举合集条目，不下载，返回 (标题, 条目链接列表, 是否为合集)
+
+        单个视频返回只含自身的列表。
+        """
+        import yt_dlp
+
+        with yt_dlp.YoutubeDL({'extract_flat': 'in_playlist', 'quiet': True}) as ydl, \
+                metrics.timer('ytdlp_extract_seconds', mode='playlist'):
+            info = ydl.extract_info(url, download=False)
+
+        if info.get('_type') == 'playlist':
+            entry_urls = [entry.get('url') or entry.get('webpage_url')
+                          for entry in info.get('entries') or [] if entry]
+            return info.get('title'), [entry_url for entry_url in entry_urls if entry_url], True
+        return info.get('title'), [url], False
+
+    def batch_download(self, url, quality, concurrency, on_track=None, on_skip=None,
+                       on_error=None, on_start=None):
+        """下载整个合集，返回 (新增的歌曲数, 跳过的歌曲数, 失败的条目数)
+
+        on_track(track) 在每首新歌转码完成后调用，on_skip(track) 在跳过已下载的条目时调用，
+        on_error(url, error) 在条目失败时调用，on_start(total, skipped) 在开始下载前调用。
+        """
+        import yt_dlp
+
+        self._ensure_root()
+        playlist_title, entry_urls, is_playlist = self.list_entries(url)
+
+        # 合集内的歌曲保存到以合集名命名的子文件夹，单个视频与普通下载一样直接放在下载目录
+        if is_playlist:
+            folder = yt_dlp.utils.sanitize_filename(playlist_title or '未知合集')
+            outtmpl = os.path.join(self.root, folder.replace('%', '%%'), '%(title)s.%(ext)s')
+        else:
+            outtmpl = os.path.join(self.root, '%(title)s.%(ext)s')
+        ydl_opts = self.ydl_opts(outtmpl)
+
+        # 跳过下载记录中已有的条目，重新同步合集时只下载新增的部分
+        pending_urls = []
+        skipped = 0
+        for entry_url in entry_urls:
+            existing = self.archive.find(entry_url)
+            if existing is None:
+                pending_urls.append(entry_url)
+            else:
+                skipped += 1
+                if on_skip:
+                    on_skip(existing)
+
+        self.progress.add_entries(len(pending_urls))
+        if on_start:
+            on_start(len(pending_urls), skipped)
+
+        def report_error(entry_url, error):
+            if on_error:
+                on_error(entry_url, error)
+            else:
+                print(f"合集条目下载失败: {error}")
+
+        def watch(entry_url, song_future):
+            """转码完成后通知调用方，返回的Future在通知完成后才结束，结果表示是否成功"""
+            reported = Future()
+
+            def on_song_ready(future):
+                try:
+                    track = future.result()
+                except Exception as e:
+                    report_error(entry_url, e)
+                    reported.set_result(False)
+                else:
+                    try:
+                        if on_track:
+                            on_track(track)
+                    finally:
+                        reported.set_result(True)
+
+            song_future.add_done_callback(on_song_ready)
+            return reported
+
+        # 下载线程拉取原始音频后立即提交转码并继续下一首，转码完成一首就通知一首
+        song_futures = []
+        failed = 0
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            futures = {pool.submit(self.download_one, entry_url, ydl_opts, quality): entry_url
+                       for entry_url in pending_urls}
+            for future in as_completed(futures):
+                entry_url = futures[future]
+                try:
+                    song_future = future.result()
+                except Exception as e:
+                    failed += 1
+                    report_error(entry_url, e)
+                else:
+                    song_futures.append(watch(entry_url, song_future))
+
+        # 等待剩余的转码任务完成
+        wait(song_futures)
+        downloaded = sum(1 for future in song_futures if future.result())
+        failed += len(song_futures) - downloaded
+        return downloaded, skipped, failed
+
+    def resolve_stream(self, url):
+        """解析边下边播用的音频流，返回 (yt-dlp信息, 下载完成后保存的文件路径)"""
+        import yt_dlp
+
+        self._ensure_root()
+        with yt_dlp.YoutubeDL(self.ydl_opts(os.path.join(self.root, '%(title)s.%(ext)s'))) as ydl, \
+                metrics.timer('ytdlp_extract_seconds', mode='stream'):
+            info = ydl.extract_info(url, download=False)
+            filename = os.path.normpath(ydl.prepare_filename(info))
+
+        # 只有单个HTTP音频流才能边下边播，分段（m3u8）或需要合并的格式走普通下载
+        if not info.get('url') or info.get('protocol') not in ('http', 'https'):
+            raise Exception("该视频的音频流不支持边下边播，请使用普通下载")
+        return info, filename
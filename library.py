@@ -0,0 +1,129 @@
+import os
+import threading
+import time
+
+from metrics import metrics
+from track_store import Track
+
+# pygame.mixer.music 能直接播放的格式
+MIXER_EXTENSIONS = ('.mp3', '.wav')
+# 需要通过FFmpeg实时解码的原始音频格式（B站音频流一般是m4a/AAC）
+STREAM_EXTENSIONS = ('.m4a', '.aac', '.opus', '.ogg', '.flac', '.webm')
+AUDIO_EXTENSIONS = MIXER_EXTENSIONS + STREAM_EXTENSIONS
+
+
+class LibraryScanner:
+    """递归、增量的音乐库扫描器
+
+    用 os.scandir 遍历下载目录及所有子目录（批量下载的合集保存在子目录中），
+    只记录已知的文件路径，歌曲信息由播放列表和音乐库索引保存。再次扫描时只重新列出修改时间发生变化的目录，
+    未变化的目录直接复用上次的结果，只需要一次stat。
+    正在转码的原始音频用 hold 标记，扫描时不加入音乐库，转码结束后再 release。
+    """
+
+    def __init__(self, root="downloads", extensions=AUDIO_EXTENSIONS):
+        self.root = root
+        self.extensions = extensions
+        self.files = set()
+        # 正在转码的原始音频，扫描时跳过
+        self.held = set()
+        # 目录路径 -> (修改时间, 子目录列表, 歌曲路径列表)
+        self._dirs = {}
+        self._lock = threading.Lock()
+
+    def load(self, files):
+        """用持久化索引中的文件路径预先填充，下一次扫描会和文件系统核对"""
+        with self._lock:
+            self.files.update(files)
+
+    def hold(self, file_path):
+        """标记正在转码的原始音频，转码完成后它会被删除，扫描时不应加入音乐库"""
+        with self._lock:
+            self.held.add(os.path.normpath(file_path))
+
+    def release(self, file_path):
+        """转码结束，保留下来的文件需要另外用 load 加入"""
+        with self._lock:
+            self.held.discard(os.path.normpath(file_path))
+
+    def scan(self):
+        """扫描音乐库，返回 (新增的Track列表, 删除的文件路径列表)"""
+        start = time.perf_counter()
+        added, removed = self._scan()
+        metrics.observe('library_scan_seconds', time.perf_counter() - start)
+        metrics.inc('library_files_added', len(added))
+        metrics.inc('library_files_removed', len(removed))
+        return added, removed
+
+    def _scan(self):
+        with self._lock:
+            if not os.path.exists(self.root):
+                os.makedirs(self.root)
+
+            added = []
+            removed = []
+            seen_dirs = set()
+            first_scan = not self._dirs
+            self._walk(self.root, seen_dirs, added, removed)
+
+            # 首次扫描时，预先载入但磁盘上已经不存在的歌曲视为已删除
+            if first_scan:
+                listed = set()
+                for _, _, files in self._dirs.values():
+                    listed.update(files)
+                removed.extend(self.files - listed)
+                self.files &= listed
+
+            # 不再存在的目录中的歌曲视为已删除
+            for path in list(self._dirs):
+                if path not in seen_dirs:
+                    _, _, files = self._dirs.pop(path)
+                    for file_path in files:
+                        if file_path in self.files:
+                            self.files.discard(file_path)
+                            removed.append(file_path)
+            return added, removed
+
+    def _walk(self, path, seen_dirs, added, removed):
+        """遍历目录树，未修改的目录直接复用缓存"""
+        stack = [path]
+        while stack:
+            path = stack.pop()
+            try:
+                mtime = os.stat(path).st_mtime_ns
+            except OSError:
+                continue
+            seen_dirs.add(path)
+
+            cached = self._dirs.get(path)
+            if cached is not None and cached[0] == mtime:
+                stack.extend(cached[1])
+                continue
+
+            subdirs = []
+            files = []
+            try:
+                with os.scandir(path) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            subdirs.append(entry.path)
+                        elif entry.name.lower().endswith(self.extensions):
+                            files.append(entry.path)
+            except OSError:
+                continue
+
+            # 该目录中被删除的文件
+            if cached is not None:
+                current = set(files)
+                for file_path in cached[2]:
+                    if file_path not in current and file_path in self.files:
+                        self.files.discard(file_path)
+                        removed.append(file_path)
+
+            for file_path in files:
+                if file_path not in self.files and os.path.normpath(file_path) not in self.held:
+                    self.files.add(file_path)
+                    added.append(Track(os.path.splitext(os.path.basename(file_path))[0], file_path))
+
+            self._dirs[path] = (mtime, subdirs, files)
+            stack.extend(subdirs)
@@ -0,0 +1,74 @@
+import os
+import sqlite3
+import threading
+import time
+
+from metrics import metrics
+from track_store import Track
+
+
+class LibraryDB:
+    """持久化的音乐库索引
+
+    保存下载时yt-dlp返回的标题、时长和来源链接，启动时直接读取，
+    不需要等文件系统扫描完成，也不会丢失真实的标题和时长。
+    """
+
+    def __init__(self, db_path="cache/library.db"):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir and not os.path.exists(db_dir):
+            os.makedirs(db_dir)
+
+        # 下载和扫描都在后台线程中写入，由锁保证串行访问
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS tracks (
+                file TEXT PRIMARY KEY,
+                title TEXT NOT NULL,
+                duration REAL NOT NULL DEFAULT 0,
+                url TEXT,
+                added_at REAL NOT NULL
+            )
+        """)
+        self._conn.commit()
+
+    def load(self):
+        """按加入顺序读取所有歌曲，返回Track列表"""
+        with metrics.timer('library_index_load_seconds'):
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT file, title, duration, url FROM tracks ORDER BY added_at, rowid"
+                ).fetchall()
+            return [Track(title, file, duration, url) for file, title, duration, url in rows]
+
+    def add(self, track):
+        """写入或更新一首歌曲"""
+        self.add_many([track])
+
+    def add_many(self, tracks):
+        """批量写入歌曲，已存在的歌曲只更新标题、时长和链接"""
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO tracks (file, title, duration, url, added_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(file) DO UPDATE SET title = excluded.title, "
+                "duration = excluded.duration, url = COALESCE(excluded.url, tracks.url)",
+                [(track.file, track.title, track.duration, track.url, now)
+                 for track in tracks])
+            self._conn.commit()
+
+    def remove_many(self, files):
+        """删除文件已经不存在的歌曲"""
+        with self._lock:
+            self._conn.executemany("DELETE FROM tracks WHERE file = ?",
+                                   [(file,) for file in files])
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,93 @@
+import re
+from array import array
+from bisect import bisect_right
+
+# [mm:ss]、[mm:ss.xx]、[mm:ss:xx] 三种时间标签写法都很常见
+_TIME_TAG = re.compile(r'\[(\d+):(\d{1,2})(?:[.:](\d{1,3}))?\]')
+_OFFSET_TAG = re.compile(r'^\[offset:\s*([+-]?\d+)\s*\]$', re.IGNORECASE)
+_META_TAG = re.compile(r'^\[(ar|ti|al|au|by|re|ve|length|#):.*\]$', re.IGNORECASE)
+
+
+class LrcLyrics:
+    """解析后的LRC歌词
+
+    lines 是要显示的文本行（不含时间标签），
+    times 和 line_numbers 是按时间排序的紧凑数组，
+    第i个时间点 times[i] 对应显示行 line_numbers[i]。
+    一行带多个时间标签时会生成多个时间点。
+    """
+
+    __slots__ = ('lines', 'times', 'line_numbers')
+
+    def __init__(self, lines, times, line_numbers):
+        self.lines = lines
+        self.times = times
+        self.line_numbers = line_numbers
+
+    @property
+    def has_timestamps(self):
+        return len(self.times) > 0
+
+    def text(self):
+        return '\n'.join(self.lines)
+
+    def index_at(self, position):
+        """二分查找当前播放位置（秒）对应的时间点下标，第一句之前返回-1"""
+        return bisect_right(self.times, position) - 1
+
+    def next_time(self, position):
+        """返回当前播放位置之后的下一个时间点（秒），没有时返回None"""
+        index = bisect_right(self.times, position)
+        return self.times[index] if index < len(self.times) else None
+
+    def line_at(self, position):
+        """返回当前播放位置（秒）对应的显示行号，第一句之前返回-1"""
+        index = self.index_at(position)
+        if index < 0:
+            return -1
+        return self.line_numbers[index]
+
+
+def parse_lrc(text):
+    """解析LRC格式歌词，没有时间标签的行原样保留"""
+    lines = []
+    entries = []
+    offset = 0.0
+
+    for raw_line in text.splitlines():
+        stripped = raw_line.strip()
+
+        match = _OFFSET_TAG.match(stripped)
+        if match:
+            # offset为正表示歌词提前显示，单位毫秒
+            offset = int(match.group(1)) / 1000.0
+            continue
+        if _META_TAG.match(stripped):
+            continue
+
+        pos = 0
+        stamps = []
+        while True:
+            match = _TIME_TAG.match(stripped, pos)
+            if not match:
+                break
+            minutes, seconds, fraction = match.groups()
+            timestamp = int(minutes) * 60 + int(seconds)
+            if fraction:
+                timestamp += int(fraction) / (10 ** len(fraction))
+            stamps.append(timestamp)
+            pos = match.end()
+
+        line_number = len(lines)
+        if stamps:
+            lines.append(stripped[pos:].strip())
+            for timestamp in stamps:
+                entries.append((timestamp, line_number))
+        else:
+            lines.append(raw_line.rstrip())
+
+    # 排序是稳定的，相同时间点保持歌词原有顺序
+    entries.sort(key=lambda entry: entry[0])
+    times = array('d', (max(timestamp - offset, 0.0) for timestamp, _ in entries))
+    line_numbers = array('l', (line_number for _, line_number in entries))
+    return LrcLyrics(lines, times, line_numbers)
@@ -0,0 +1,121 @@
+import os
+import sqlite3
+import threading
+import time
+
+
+class LyricCache:
+    """基于SQLite的歌词持久化缓存
+
+    以清理后的歌曲名 + 艺术家为键，支持：
+    - 条目数量上限，超出时按最近访问时间淘汰（LRU）
+    - 条目过期时间（TTL）
+    - 负缓存：记录已知找不到歌词的歌曲，避免每次都等待网络超时
+    """
+
+    def __init__(self, db_path="cache/lyrics.db", max_entries=5000,
+                 ttl=30 * 24 * 3600, negative_ttl=24 * 3600):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._lock = threading.Lock()
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir and not os.path.exists(db_dir):
+            os.makedirs(db_dir)
+
+        # 歌词在后台线程中获取，连接需要跨线程使用，由锁保证串行访问
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS lyrics (
+                key TEXT PRIMARY KEY,
+                lyrics TEXT,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_lyrics_accessed ON lyrics(accessed_at)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(song_name, artist=None):
+        """生成缓存键，忽略大小写和首尾空格"""
+        return f"{song_name.strip().lower()}\x1f{(artist or '').strip().lower()}"
+
+    def get(self, song_name, artist=None):
+        """查询缓存
+
+        返回None表示没有可用的缓存条目；
+        返回空字符串表示已知找不到歌词（负缓存命中）；
+        否则返回缓存的歌词文本。
+        """
+        key = self.make_key(song_name, artist)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT lyrics, created_at FROM lyrics WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+
+            lyrics, created_at = row
+            ttl = self.ttl if lyrics else self.negative_ttl
+            if now - created_at > ttl:
+                self._conn.execute("DELETE FROM lyrics WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+
+            self._conn.execute(
+                "UPDATE lyrics SET accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            return lyrics or ''
+
+    def get_many(self, song_names, artist=None):
+        """批量查询未过期的歌词，返回 {歌曲名: 歌词}
+
+        不包括负缓存，也不更新访问时间，用于建立搜索索引这类批量读取。
+        """
+        keys = {self.make_key(name, artist): name for name in song_names}
+        found = {}
+        now = time.time()
+        items = list(keys)
+        with self._lock:
+            for start in range(0, len(items), 500):
+                chunk = items[start:start + 500]
+                rows = self._conn.execute(
+                    "SELECT key, lyrics FROM lyrics WHERE lyrics IS NOT NULL AND created_at > ? "
+                    f"AND key IN ({','.join('?' * len(chunk))})",
+                    [now - self.ttl] + chunk).fetchall()
+                for key, lyrics in rows:
+                    found[keys[key]] = lyrics
+        return found
+
+    def put(self, song_name, artist, lyrics):
+        """写入歌词，lyrics为None时写入负缓存"""
+        key = self.make_key(song_name, artist)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO lyrics (key, lyrics, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?)",
+                (key, lyrics or None, now, now))
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        """淘汰最久未访问的条目，调用方需持有锁"""
+        count = self._conn.execute("SELECT COUNT(*) FROM lyrics").fetchone()[0]
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM lyrics WHERE key IN "
+                "(SELECT key FROM lyrics ORDER BY accessed_at ASC LIMIT ?)",
+                (overflow,))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -1,37 +1,171 @@
 import requests
+from requests.adapters import HTTPAdapter
 import re
+import time
+
+from daemon_pool import DaemonThreadPool
+from metrics import metrics
 
 class LyricFetcher:
-    def __init__(self):
+    # 网络歌词源的服务地址，基准测试中替换为本地模拟服务器
+    ENDPOINTS = {
+        'lyrics_ovh': 'https://api.lyrics.ovh',
+        'geci': 'https://geci.me',
+    }
+    
+    def __init__(self, cache=None, concurrent=False, max_workers=8, stats=None, pool_size=None,
+                 endpoints=None):
+        self.endpoints = dict(self.ENDPOINTS, **(endpoints or {}))
+        # 前台获取和后台预取共用一个会话，按并发数设置连接池大小，复用到各歌词源的连接
         self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size or max_workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
         })
-    
-    def get_lyrics(self, song_name, artist=None):
-        """从多个来源获取歌词"""
-        lyrics = None
+        # 歌词缓存（可选），见 lyric_cache.LyricCache
+        self.cache = cache
         
-        # 清理歌曲名称
-        song_name = self.clean_song_name(song_name)
+        # 歌词源统计与熔断器（可选），见 source_stats.SourceStats
+        self.stats = stats
         
-        # 尝试多个API，按优先级排序
-        sources = [
+        # 网络歌词源，按默认优先级排序，启用统计后会动态调整顺序
+        self.network_sources = [
             self._get_lyrics_api,
             self._get_geci_lyrics,
+        ]
+        # 本地歌词源，不访问网络，网络源都失败时使用
+        self.local_sources = [
             self._get_qq_lyrics_simple,
         ]
         
+        # 并发模式：同时请求所有网络源，而不是逐个等待超时
+        self.concurrent = concurrent
+        self.max_workers = max_workers
+        self._executor = None
+    
+    def get_lyrics(self, song_name, artist=None):
+        """从多个来源获取歌词"""
+        start = time.perf_counter()
+        lyrics, result = self._get_lyrics(song_name, artist)
+        metrics.observe('lyric_lookup_seconds', time.perf_counter() - start, result=result)
+        return lyrics
+    
+    def _get_lyrics(self, song_name, artist=None):
+        """返回 (歌词, 来源类型)，来源类型为 cache、network 或 fallback"""
+        # 清理歌曲名称
+        song_name = self.clean_song_name(song_name)
+        
+        # 先查缓存，负缓存命中时直接跳过网络请求
+        cached = self.cache.get(song_name, artist) if self.cache else None
+        if cached:
+            return cached, 'cache'
+        
+        if cached is None:
+            sources = self._ranked_sources()
+            if self.concurrent:
+                lyrics, not_found = self._query_sources_concurrent(sources, song_name, artist)
+            else:
+                lyrics, not_found = self._query_sources(sources, song_name, artist)
+            # 只有至少一个源明确回答没有歌词时才写入负缓存；
+            # 所有源都出错（断网、超时）或被熔断时不写入，避免把故障当成没有歌词
+            if self.cache and (lyrics or not_found):
+                self.cache.put(song_name, artist, lyrics)
+            if lyrics:
+                return lyrics, 'network'
+        
+        lyrics, _ = self._query_sources(self.local_sources, song_name, artist)
+        return lyrics or self._get_fallback_lyrics(song_name), 'fallback'
+    
+    def cached_lyrics(self, song_name, artist=None):
+        """只查缓存，不访问网络，没有缓存的歌词时返回None"""
+        if not self.cache:
+            return None
+        return self.cache.get(self.clean_song_name(song_name), artist) or None
+    
+    def cached_lyrics_many(self, song_names):
+        """批量查缓存，返回 {歌曲名: 歌词}，只包括有缓存歌词的歌曲"""
+        if not self.cache:
+            return {}
+        cleaned = {name: self.clean_song_name(name) for name in song_names}
+        found = self.cache.get_many(set(cleaned.values()))
+        return {name: found[key] for name, key in cleaned.items() if key in found}
+    
+    def _ranked_sources(self):
+        """返回按统计数据排序的网络歌词源，跳过已熔断的源"""
+        if not self.stats:
+            return list(self.network_sources)
+            
+        by_name = {source.__name__: source for source in self.network_sources}
+        names = [name for name in by_name if self.stats.available(name)]
+        return [by_name[name] for name in self.stats.rank(names)]
+    
+    def _query_sources(self, sources, song_name, artist=None):
+        """按顺序尝试歌词源，返回 (第一个有效的歌词, 是否有源明确回答没有歌词)"""
+        not_found = False
         for source in sources:
-            try:
-                lyrics = source(song_name, artist)
-                if lyrics and self._is_valid_lyric(lyrics):
-                    return lyrics
-            except Exception as e:
-                print(f"{source.__name__} 失败: {e}")
-                continue
+            lyrics, result = self._call_source(source, song_name, artist)
+            if lyrics:
+                return lyrics, True
+            not_found = not_found or result == 'empty'
+                
+        return None, not_found
+    
+    def _query_sources_concurrent(self, sources, song_name, artist=None):
+        """同时请求所有歌词源，按优先级返回第一个有效的歌词
+        
+        只有在更高优先级的源失败或返回无效歌词后，才会采用低优先级源的结果。
+        结果确定后取消尚未开始的请求，已经在进行中的请求结果直接丢弃。
+        """
+        if len(sources) <= 1:
+            return self._query_sources(sources, song_name, artist)
+            
+        if self._executor is None:
+            self._executor = DaemonThreadPool(self.max_workers, thread_name_prefix='lyric')
+            
+        futures = [self._executor.submit(self._call_source, source, song_name, artist)
+                   for source in sources]
+        try:
+            # 按优先级依次等待，最高优先级的有效结果一出现就返回
+            not_found = False
+            for future in futures:
+                lyrics, result = future.result()
+                if lyrics:
+                    return lyrics, True
+                not_found = not_found or result == 'empty'
+            return None, not_found
+        finally:
+            for future in futures:
+                future.cancel()
+    
+    def _call_source(self, source, song_name, artist=None):
+        """调用单个歌词源，返回 (歌词, 结果)
+
+        结果为 ok、empty（源正常回答但没有有效歌词）、error（请求出错）
+        或 skipped（源已熔断），不是 ok 时歌词为None。
+        """
+        name = source.__name__
+        if self.stats and not self.stats.acquire(name):
+            return None, 'skipped'
+            
+        ok = True
+        lyrics = None
+        start = time.monotonic()
+        try:
+            lyrics = source(song_name, artist)
+        except Exception as e:
+            ok = False
+            print(f"{name} 失败: {e}")
+        finally:
+            elapsed = time.monotonic() - start
+            if self.stats:
+                self.stats.record(name, ok, elapsed)
                 
-        return self._get_fallback_lyrics(song_name)
+        valid = bool(lyrics) and self._is_valid_lyric(lyrics)
+        result = 'ok' if valid else ('empty' if ok else 'error')
+        metrics.observe('lyric_source_seconds', elapsed, source=name, result=result)
+        return (lyrics if valid else None), result
     
     def clean_song_name(self, song_name):
         """清理歌曲名称，移除不必要的字符"""
@@ -65,33 +199,36 @@ class LyricFetcher:
         return cleaned if cleaned else song_name
     
     def _get_lyrics_api(self, song_name, artist=None):
-        """使用公开歌词API"""
-        try:
-            # 使用一个免费的歌词API
-            url = f"https://api.lyrics.ovh/v1/{artist or 'Various Artists'}/{song_name}"
-            response = self.session.get(url, timeout=10)
-            if response.status_code == 200:
-                data = response.json()
-                if 'lyrics' in data:
-                    return data['lyrics']
-        except:
-            pass
+        """使用公开歌词API
+        
+        网络错误直接抛出，由调用方计入歌词源的失败统计
+        """
+        # 使用一个免费的歌词API
+        url = f"{self.endpoints['lyrics_ovh']}/v1/{artist or 'Various Artists'}/{song_name}"
+        response = self.session.get(url, timeout=10)
+        # 服务器错误不是"没有歌词"，抛出后按失败处理，不写入负缓存
+        if response.status_code >= 500:
+            response.raise_for_status()
+        if response.status_code == 200:
+            data = response.json()
+            if 'lyrics' in data:
+                return data['lyrics']
         return None
     
     def _get_geci_lyrics(self, song_name, artist=None):
         """从歌词API获取歌词"""
-        try:
-            url = f"https://geci.me/api/lyric/{song_name}"
-            response = self.session.get(url, timeout=10)
-            if response.status_code == 200:
-                data = response.json()
-                if data.get('result') and len(data['result']) > 0:
-                    lyric_url = data['result'][0]['lrc']
-                    lyric_response = self.session.get(lyric_url, timeout=10)
-                    if lyric_response.status_code == 200:
-                        return lyric_response.text
-        except:
-            pass
+        url = f"{self.endpoints['geci']}/api/lyric/{song_name}"
+        response = self.session.get(url, timeout=10)
+        # 服务器错误不是"没有歌词"，抛出后按失败处理，不写入负缓存
+        if response.status_code >= 500:
+            response.raise_for_status()
+        if response.status_code == 200:
+            data = response.json()
+            if data.get('result') and len(data['result']) > 0:
+                lyric_url = data['result'][0]['lrc']
+                lyric_response = self.session.get(lyric_url, timeout=10)
+                if lyric_response.status_code == 200:
+                    return lyric_response.text
         return None
     
     def _get_qq_lyrics_simple(self, song_name, artist=None):
@@ -164,6 +301,8 @@ class LyricFetcher:
 
 # 使用示例
 if __name__ == "__main__":
-    fetcher = LyricFetcher()
+    from lyric_cache import LyricCache
+    from source_stats import SourceStats
+    fetcher = LyricFetcher(cache=LyricCache(), concurrent=True, stats=SourceStats())
     lyrics = fetcher.get_lyrics("孤勇者")
     print(lyrics)
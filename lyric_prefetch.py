@@ -0,0 +1,98 @@
+import itertools
+import threading
+from contextlib import contextmanager
+from queue import PriorityQueue
+
+
+class LyricPrefetcher:
+    """在后台预先获取歌词，结果写入歌词获取器的缓存
+
+    播放到这些歌曲时直接从缓存读取，不用再等网络请求。
+    预取是低优先级任务：少量工作线程按优先级从队列中取歌曲，
+    前台正在获取当前歌曲的歌词时暂停取新的任务，不与前台争抢歌词源。
+    后取到的即将播放的歌曲排在前面，新下载的歌曲排在即将播放的歌曲之后。
+    get_fetcher 返回共用的 LyricFetcher，第一次预取时才调用，
+    以免在启动时导入网络请求模块。
+    """
+
+    UPCOMING = 0
+    DOWNLOADED = 1
+
+    def __init__(self, get_fetcher, workers=2, on_done=None):
+        self.get_fetcher = get_fetcher
+        self.workers = workers
+        # 每首歌曲的歌词获取完成后在预取线程中调用，参数为歌曲标题
+        self.on_done = on_done
+        self._queue = PriorityQueue()
+        self._order = itertools.count()
+        # 在队列中或正在获取的歌曲，完成后移除，缓存过期后可以再次预取
+        self._pending = set()
+        self._foreground = 0
+        self._cond = threading.Condition()
+        self._threads = []
+        self.done = 0
+        self.failed = 0
+
+    def prefetch(self, titles, kind=UPCOMING):
+        """把歌曲加入预取队列，已经在队列中或正在获取的歌曲会被跳过
+
+        已经预取过的歌曲再次加入时直接命中歌词缓存，不会重复请求网络。
+
+        titles 按播放顺序排列，同一批中靠前的先获取。
+        """
+        batch = -next(self._order)
+        queued = []
+        with self._cond:
+            for title in titles:
+                if title and title not in self._pending:
+                    self._pending.add(title)
+                    queued.append(title)
+        for index, title in enumerate(queued):
+            self._queue.put((kind, batch, index, title))
+        if queued:
+            self._start()
+
+    def _start(self):
+        with self._cond:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._worker, name=f"lyric-prefetch-{i}",
+                                          daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    @contextmanager
+    def foreground(self):
+        """前台获取歌词期间暂停预取"""
+        with self._cond:
+            self._foreground += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._foreground -= 1
+                self._cond.notify_all()
+
+    def _worker(self):
+        while True:
+            item = self._queue.get()
+            with self._cond:
+                if self._foreground:
+                    # 放回队列，前台结束后重新按优先级取
+                    self._queue.put(item)
+                    while self._foreground:
+                        self._cond.wait()
+                    continue
+            title = item[-1]
+            try:
+                self.get_fetcher().get_lyrics(title)
+                self.done += 1
+                if self.on_done is not None:
+                    self.on_done(title)
+            except Exception as e:
+                self.failed += 1
+                print(f"预取歌词失败: {title}: {e}")
+            finally:
+                with self._cond:
+                    self._pending.discard(title)
@@ -0,0 +1,98 @@
+import itertools
+import threading
+from concurrent.futures import Future
+from contextlib import nullcontext
+
+from daemon_pool import DaemonThreadPool
+from metrics import metrics
+
+
+class LyricRequests:
+    """前台歌词请求：固定数量的工作线程，过期的请求不再执行或丢弃结果
+
+    每次 request 得到一个新的代号，之前的请求随之过期。
+    排队中的过期请求在开始前直接跳过；已经开始的网络请求会执行完
+    （歌词照常写入缓存），但不再回调。同一首歌曲（按清理后的名称）
+    同时只有一个网络请求，后来的请求等待它的结果。
+    快速连按下一首时只有最后一首的歌词会显示，也不会为每首歌曲都开一个线程。
+    get_fetcher 返回共用的 LyricFetcher，第一次请求时才调用；
+    foreground 为执行网络请求期间持有的上下文管理器，用于暂停预取。
+    """
+
+    def __init__(self, get_fetcher, workers=4, foreground=None):
+        self.get_fetcher = get_fetcher
+        self.foreground = foreground or nullcontext
+        # 守护线程：关闭窗口时不必等正在进行的网络请求结束
+        self._executor = DaemonThreadPool(workers, thread_name_prefix='lyric-request')
+        self._lock = threading.Lock()
+        self._tokens = itertools.count(1)
+        self.current = 0
+        # 清理后的歌曲名 -> 正在进行的网络请求
+        self._inflight = {}
+
+    def request(self, title, on_done):
+        """获取歌词，返回本次请求的代号
+
+        on_done(token, lyrics, error) 在工作线程中调用，只有请求仍是最新时才会调用；
+        回调切换到界面线程后应再用 is_current 确认一次。
+        """
+        with self._lock:
+            token = self.current = next(self._tokens)
+        self._executor.submit(self._run, token, title, on_done)
+        return token
+
+    def cancel(self):
+        """让所有已发出的请求过期，例如歌词已经从缓存中直接显示"""
+        with self._lock:
+            self.current = next(self._tokens)
+
+    def is_current(self, token):
+        return token == self.current
+
+    def shutdown(self):
+        self.cancel()
+        self._executor.shutdown(cancel_futures=True)
+
+    def _run(self, token, title, on_done):
+        if not self.is_current(token):
+            metrics.inc('lyric_requests', result='dropped')
+            return
+        try:
+            fetcher = self.get_fetcher()
+            key = fetcher.clean_song_name(title)
+        except Exception as e:
+            self._deliver(token, on_done, None, e)
+            return
+
+        with self._lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = Future()
+        if not owner:
+            # 同一首歌曲已在请求中，结果出来后一起回调，不占用工作线程
+            metrics.inc('lyric_requests', result='coalesced')
+            future.add_done_callback(lambda f: self._deliver(token, on_done, *self._outcome(f)))
+            return
+
+        try:
+            with self.foreground():
+                future.set_result(fetcher.get_lyrics(title))
+        except Exception as e:
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                del self._inflight[key]
+        self._deliver(token, on_done, *self._outcome(future))
+
+    @staticmethod
+    def _outcome(future):
+        error = future.exception()
+        return (None, error) if error is not None else (future.result(), None)
+
+    def _deliver(self, token, on_done, lyrics, error):
+        if not self.is_current(token):
+            metrics.inc('lyric_requests', result='stale')
+            return
+        metrics.inc('lyric_requests', result='error' if error is not None else 'ok')
+        on_done(token, lyrics, error)
@@ -0,0 +1,166 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+
+class _Timer:
+    """一个计时指标的累计值"""
+
+    __slots__ = ('count', 'total', 'min', 'max')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.min = seconds if self.min is None else min(self.min, seconds)
+        self.max = seconds if self.max is None else max(self.max, seconds)
+
+
+class Metrics:
+    """进程内的计数器和计时器
+
+    指标按名称和标签区分，例如 lyric_source_seconds{source="_get_lyrics_api", result="ok"}。
+    各模块在热点路径上调用 inc / observe / timer，只在锁内更新几个数字，开销可以忽略。
+    可以导出为JSON文件或Prometheus的textfile格式（node_exporter textfile collector），
+    图形界面的统计面板用 snapshot 读取。
+    """
+
+    def __init__(self, prefix="bilibili_player"):
+        self.prefix = prefix
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._timers = {}
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+    def inc(self, name, value=1, **labels):
+        """计数器加上value"""
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        """记录一次耗时（秒）"""
+        key = self._key(name, labels)
+        with self._lock:
+            timer = self._timers.get(key)
+            if timer is None:
+                timer = self._timers[key] = _Timer()
+            timer.observe(seconds)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """记录with块的耗时，块内抛出异常时加上 result="error" 标签"""
+        start = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self.observe(name, time.perf_counter() - start, result='error', **labels)
+            raise
+        self.observe(name, time.perf_counter() - start, **labels)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._timers.clear()
+
+    def snapshot(self):
+        """返回所有指标的结构化快照，按名称和标签排序"""
+        with self._lock:
+            counters = [{'name': name, 'labels': dict(labels), 'value': value}
+                        for (name, labels), value in sorted(self._counters.items())]
+            timers = [{'name': name, 'labels': dict(labels), 'count': timer.count,
+                       'sum': timer.total, 'min': timer.min, 'max': timer.max,
+                       'avg': timer.total / timer.count}
+                      for (name, labels), timer in sorted(self._timers.items())]
+        return {'started': self.started, 'time': time.time(),
+                'counters': counters, 'timers': timers}
+
+    def to_prometheus(self):
+        """Prometheus文本格式，计时器导出为summary的 _count 和 _sum，另附 _max"""
+        snapshot = self.snapshot()
+        lines = []
+        # 同一个指标的所有样本必须连续输出，快照已按名称排序
+        previous = None
+        for counter in snapshot['counters']:
+            name = f"{self.prefix}_{counter['name']}_total"
+            if name != previous:
+                lines.append(f"# TYPE {name} counter")
+                previous = name
+            lines.append(f"{name}{_labels(counter['labels'])} {counter['value']}")
+
+        by_name = {}
+        for timer in snapshot['timers']:
+            by_name.setdefault(f"{self.prefix}_{timer['name']}", []).append(timer)
+        for name, timers in by_name.items():
+            lines.append(f"# TYPE {name} summary")
+            for timer in timers:
+                labels = _labels(timer['labels'])
+                lines.append(f"{name}_count{labels} {timer['count']}")
+                lines.append(f"{name}_sum{labels} {timer['sum']:.6f}")
+            lines.append(f"# TYPE {name}_max gauge")
+            for timer in timers:
+                lines.append(f"{name}_max{_labels(timer['labels'])} {timer['max']:.6f}")
+        return "\n".join(lines) + "\n"
+
+    def export(self, path):
+        """写入指标文件，扩展名为 .prom 时使用Prometheus格式，否则为JSON
+
+        先写临时文件再替换，读取方（例如node_exporter）不会读到写了一半的文件。
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if path.endswith('.prom'):
+            content = self.to_prometheus()
+        else:
+            content = json.dumps(self.snapshot(), ensure_ascii=False, indent=2)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+
+    def summary(self):
+        """便于阅读的多行文本，供统计面板显示"""
+        snapshot = self.snapshot()
+        lines = ["计时器                                       次数      平均      最大      合计"]
+        for timer in snapshot['timers']:
+            name = timer['name'] + _labels(timer['labels'])
+            lines.append(f"{name:<44} {timer['count']:>6} {_ms(timer['avg']):>9} "
+                         f"{_ms(timer['max']):>9} {_ms(timer['sum']):>9}")
+        lines.append("")
+        lines.append("计数器                                                 数值")
+        for counter in snapshot['counters']:
+            name = counter['name'] + _labels(counter['labels'])
+            lines.append(f"{name:<52} {counter['value']:>10g}")
+        return "\n".join(lines)
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    parts = []
+    for key, value in labels.items():
+        value = value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        parts.append(f'{key}="{value}"')
+    return "{" + ",".join(parts) + "}"
+
+
+def _ms(seconds):
+    if seconds >= 10:
+        return f"{seconds:.1f}s"
+    return f"{seconds * 1000:.1f}ms"
+
+
+# 进程内共用的指标，各模块直接导入使用
+metrics = Metrics()
@@ -0,0 +1,267 @@
+import hashlib
+import mmap
+import os
+import struct
+from array import array
+
+# MPEG Layer III 比特率表（kbps），按 MPEG1 / MPEG2、2.5 区分
+_BITRATES = {
+    1: (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    2: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+_SAMPLE_RATES = (44100, 48000, 32000)
+# 帧头中的版本位：0 为 MPEG2.5，2 为 MPEG2，3 为 MPEG1，1 保留
+_VERSION_DIVISORS = {0: 4, 2: 2, 3: 1}
+
+# 逐帧扫描时每隔多少秒记录一个偏移
+SCAN_INTERVAL = 0.5
+
+_HEADER = struct.Struct('<4sHQqdd?I')
+_MAGIC = b'MSIX'
+_FORMAT_VERSION = 1
+
+
+def _parse_header(data, pos):
+    """解析pos处的MPEG Layer III帧头，返回 (帧长度, 每帧采样数, 采样率)，无效时返回None"""
+    if data[pos] != 0xFF:
+        return None
+    b1, b2 = data[pos + 1], data[pos + 2]
+    if b1 & 0xE0 != 0xE0:
+        return None
+    version = (b1 >> 3) & 3
+    # 只支持 Layer III
+    if version not in _VERSION_DIVISORS or (b1 >> 1) & 3 != 1:
+        return None
+    bitrate_index = b2 >> 4
+    sample_rate_index = (b2 >> 2) & 3
+    if bitrate_index in (0, 15) or sample_rate_index == 3:
+        return None
+    mpeg1 = version == 3
+    bitrate = _BITRATES[1 if mpeg1 else 2][bitrate_index] * 1000
+    sample_rate = _SAMPLE_RATES[sample_rate_index] // _VERSION_DIVISORS[version]
+    padding = (b2 >> 1) & 1
+    size = (144 if mpeg1 else 72) * bitrate // sample_rate + padding
+    return size, (1152 if mpeg1 else 576), sample_rate
+
+
+def _find_frame(data, pos, end=None):
+    """从pos开始查找第一个有效帧的位置，要求下一帧的帧头也有效，找不到时返回-1"""
+    end = len(data) if end is None else min(end, len(data))
+    while True:
+        pos = data.find(b'\xff', pos, end)
+        if pos < 0 or pos + 4 > len(data):
+            return -1
+        header = _parse_header(data, pos)
+        if header:
+            next_pos = pos + header[0]
+            if next_pos + 4 > len(data) or _parse_header(data, next_pos):
+                return pos
+        pos += 1
+
+
+def _skip_id3v2(data):
+    """跳过文件开头的ID3v2标签，返回音频数据的起始位置"""
+    if len(data) < 10 or data[:3] != b'ID3':
+        return 0
+    size = 0
+    for byte in data[6:10]:
+        size = (size << 7) | (byte & 0x7F)
+    # 标志位0x10表示带有10字节的页脚
+    return 10 + size + (10 if data[5] & 0x10 else 0)
+
+
+class Mp3SeekIndex:
+    """MP3文件的跳转索引
+
+    offsets 是按等间隔时间点（interval 秒）排列的字节偏移，
+    跳转时直接按下标取偏移，是常数时间的查找。
+    exact 为True时偏移来自逐帧扫描，正好落在帧头上；
+    否则来自Xing/VBRI目录，需要在两点之间插值并重新对齐到帧头。
+    """
+
+    __slots__ = ('duration', 'interval', 'offsets', 'exact')
+
+    def __init__(self, duration, interval, offsets, exact):
+        self.duration = duration
+        self.interval = interval
+        self.offsets = offsets
+        self.exact = exact
+
+    def locate(self, data, position):
+        """返回跳转到position（秒）时的 (字节偏移, 实际开始的位置)"""
+        position = max(0.0, min(position, self.duration))
+        scaled = position / self.interval if self.interval > 0 else 0.0
+        index = min(int(scaled), len(self.offsets) - 1)
+        if self.exact:
+            return self.offsets[index], index * self.interval
+
+        offset = self.offsets[index]
+        if index + 1 < len(self.offsets):
+            offset += int((self.offsets[index + 1] - offset) * (scaled - index))
+        frame = _find_frame(data, offset)
+        return (frame if frame >= 0 else self.offsets[index]), position
+
+
+def build_index(data):
+    """为MP3数据建立跳转索引，不是MP3时返回None
+
+    优先使用第一帧中的Xing/Info或VBRI目录，没有目录时逐帧扫描整个文件。
+    """
+    start = _find_frame(data, _skip_id3v2(data))
+    if start < 0:
+        return None
+    return _index_from_tag(data, start) or _scan_frames(data, start)
+
+
+def _index_from_tag(data, start):
+    """从第一帧的Xing/Info或VBRI标签读取目录"""
+    size, samples, sample_rate = _parse_header(data, start)
+    mpeg1 = samples == 1152
+    mono = data[start + 3] >> 6 == 3
+    # Xing标签位于帧头和边信息之后
+    xing = start + 4 + (17 if mono else 32) if mpeg1 else start + 4 + (9 if mono else 17)
+    tag = data[xing:xing + 4]
+    if tag in (b'Xing', b'Info'):
+        flags = struct.unpack_from('>I', data, xing + 4)[0]
+        pos = xing + 8
+        frames = total_bytes = None
+        if flags & 1:
+            frames = struct.unpack_from('>I', data, pos)[0]
+            pos += 4
+        if flags & 2:
+            total_bytes = struct.unpack_from('>I', data, pos)[0]
+            pos += 4
+        if not frames:
+            return None
+        duration = frames * samples / sample_rate
+        audio_start = start + size
+        end = min(len(data), start + total_bytes) if total_bytes else len(data)
+        if tag == b'Info' or not flags & 4 or not total_bytes:
+            # 固定码率：整个文件只需要首尾两个点，按比例插值
+            return Mp3SeekIndex(duration, duration, array('Q', [audio_start, end]), False)
+        toc = data[pos:pos + 100]
+        offsets = array('Q', (start + byte * total_bytes // 256 for byte in toc))
+        offsets[0] = audio_start
+        offsets.append(end)
+        return Mp3SeekIndex(duration, duration / 100, offsets, False)
+
+    vbri = start + 4 + 32
+    if data[vbri:vbri + 4] == b'VBRI':
+        (total_bytes, frames, entries, scale,
+         entry_size, frames_per_entry) = struct.unpack_from('>IIHHHH', data, vbri + 10)
+        if not frames or not entries or entry_size not in (1, 2, 3, 4):
+            return None
+        duration = frames * samples / sample_rate
+        offsets = array('Q', [start])
+        pos = vbri + 26
+        offset = start
+        for _ in range(entries):
+            offset += int.from_bytes(data[pos:pos + entry_size], 'big') * scale
+            offsets.append(min(offset, len(data)))
+            pos += entry_size
+        offsets[0] = start + size
+        return Mp3SeekIndex(duration, frames_per_entry * samples / sample_rate, offsets, False)
+    return None
+
+
+def _scan_frames(data, start):
+    """逐帧扫描，每隔 SCAN_INTERVAL 秒记录一个帧偏移"""
+    offsets = array('Q')
+    headers = {}
+    total = len(data)
+    pos = start
+    elapsed = 0.0
+    next_mark = 0.0
+    while pos + 4 <= total:
+        key = data[pos:pos + 3]
+        header = headers.get(key)
+        if header is None:
+            header = _parse_header(data, pos)
+            if header is None:
+                # 同步丢失（损坏的数据或结尾的标签），查找下一个有效帧
+                pos = _find_frame(data, pos + 1)
+                if pos < 0:
+                    break
+                continue
+            headers[key] = header
+        size, samples, sample_rate = header
+        if elapsed >= next_mark:
+            offsets.append(pos)
+            next_mark += SCAN_INTERVAL
+        elapsed += samples / sample_rate
+        pos += size
+    if not offsets:
+        return None
+    return Mp3SeekIndex(elapsed, SCAN_INTERVAL, offsets, True)
+
+
+class SeekIndexCache:
+    """MP3跳转索引的磁盘缓存
+
+    每个文件的索引保存在缓存目录下的一个二进制文件中，以文件路径的哈希命名，
+    记录文件大小和修改时间，文件变化后自动重建。
+    """
+
+    def __init__(self, cache_dir="cache/seek_index"):
+        self.cache_dir = cache_dir
+        self._memory = {}
+
+    def _index_path(self, path):
+        digest = hashlib.md5(os.path.abspath(path).encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, digest + '.idx')
+
+    def get(self, path, data):
+        """返回文件的跳转索引，data为文件内容（mmap），不是MP3时返回None"""
+        stat = os.stat(path)
+        signature = (stat.st_size, stat.st_mtime_ns)
+        cached = self._memory.get(path)
+        if cached and cached[0] == signature:
+            return cached[1]
+
+        index = self._load(path, signature)
+        if index is None:
+            index = build_index(data)
+            if index is None:
+                return None
+            self._save(path, signature, index)
+        self._memory[path] = (signature, index)
+        return index
+
+    def _load(self, path, signature):
+        try:
+            with open(self._index_path(path), 'rb') as f:
+                header = f.read(_HEADER.size)
+                (magic, version, size, mtime_ns, duration, interval,
+                 exact, count) = _HEADER.unpack(header)
+                if magic != _MAGIC or version != _FORMAT_VERSION or (size, mtime_ns) != signature:
+                    return None
+                offsets = array('Q')
+                offsets.fromfile(f, count)
+                return Mp3SeekIndex(duration, interval, offsets, exact)
+        except (OSError, EOFError, struct.error):
+            return None
+
+    def _save(self, path, signature, index):
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            target = self._index_path(path)
+            temp = target + '.tmp'
+            with open(temp, 'wb') as f:
+                f.write(_HEADER.pack(_MAGIC, _FORMAT_VERSION, signature[0], signature[1],
+                                     index.duration, index.interval, index.exact,
+                                     len(index.offsets)))
+                index.offsets.tofile(f)
+            os.replace(temp, target)
+        except OSError as e:
+            print(f"保存跳转索引失败: {e}")
+
+    def locate(self, path, position):
+        """返回跳转到position（秒）时的 (字节偏移, 实际开始的位置)，不是MP3时返回None"""
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return None
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                index = self.get(path, data)
+                if index is None:
+                    return None
+                return index.locate(data, position)
@@ -1,37 +1,125 @@
+import time
+# 启动计时从导入主模块开始
+_IMPORT_STARTED = time.perf_counter()
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, scrolledtext
-import yt_dlp
-import pygame
 import os
 import threading
-import requests
-import time
 import sys
-import subprocess
-import tempfile
-from lyric_fetcher import LyricFetcher
+import argparse
+# pygame、yt-dlp、requests 和歌词模块导入很慢，都在第一次用到时才导入
+from lrc_parser import parse_lrc
+from transcoder import TranscodePipeline
+from downloader import Downloader, quality_info, unconverted
+from download_archive import DownloadArchive
+from lyric_prefetch import LyricPrefetcher
+from lyric_requests import LyricRequests
+from search_index import SearchIndex
+from download_progress import DownloadProgress
+from playback import PlaybackEngine
+from library import LibraryScanner
+from library_db import LibraryDB
+from playlist_view import VirtualPlaylistView
+from waveform_view import WaveformBar
+from audio_analysis import AudioAnalyzer
+from track_store import Track, TrackStore
+from concurrent.futures import ThreadPoolExecutor
+from startup_timer import StartupTimer
+from metrics import metrics
 
 class BilibiliMusicPlayer:
-    def __init__(self, root):
+    def __init__(self, root, startup=None, metrics_path=None):
         self.root = root
         self.root.title("B站音乐播放器 v1.0")
         self.root.geometry("900x700")
         self.root.configure(bg='#1e1e1e')
+        self.startup = startup or StartupTimer()
+        # 定期把耗时统计写入该文件，见 metrics.Metrics.export
+        self.metrics_path = metrics_path
+        self.stats_window = None
         
-        # 初始化播放器
-        self.lyric_fetcher = LyricFetcher()
+        # 歌词获取器在第一次获取歌词时创建，见 lyric_fetcher 属性
+        self._lyric_fetcher = None
+        self._lyric_fetcher_lock = threading.Lock()
+        # 后台预取即将播放和新下载的歌曲的歌词，播放时直接从缓存显示
+        self.lyric_prefetcher = LyricPrefetcher(lambda: self.lyric_fetcher, workers=2,
+                                                on_done=lambda title: self._index_lyrics([title]))
+        # 当前歌曲的歌词请求，切歌后之前的请求过期
+        self.lyric_requests = LyricRequests(lambda: self.lyric_fetcher, workers=4,
+                                            foreground=self.lyric_prefetcher.foreground)
+        self.prefetch_ahead = 5
+        # 下载线程只拉取原始音频，转码交给独立的FFmpeg进程
+        self.transcoder = TranscodePipeline()
         
         # 当前状态
         self.current_song = None
         self.is_playing = False
-        self.playlist = []
-        self.current_index = 0
+        # 按id索引的播放列表，删除歌曲后id不变
+        self.playlist = TrackStore()
+        # 标题、文件夹和已缓存歌词的搜索索引，在后台线程中按顺序增量建立
+        self.search_index = SearchIndex()
+        self.index_worker = ThreadPoolExecutor(max_workers=1, thread_name_prefix='search-index')
+        # 搜索时播放列表视图只显示搜索结果（歌曲id列表），否则为None
+        self.search_results = None
+        self.result_index = {}
+        self.library = LibraryScanner("downloads")
+        self.library_db = LibraryDB()
+        # 按视频号和分P记录已下载的条目，重复下载时直接跳过
+        self.archive = DownloadArchive()
+        # 下载线程只更新进度表，由界面线程定时刷新进度条和状态文本
+        self.download_progress = DownloadProgress()
+        self.download_watch = None
+        # 下载流程与界面无关，和命令行共用
+        self.downloader = Downloader("downloads", self.library, self.library_db, self.archive,
+                                     self.transcoder, self.download_progress)
+        self.scanning = False
+        self.current_id = None
         self.song_duration = 0
         
-        # 初始化pygame mixer，增加缓冲区大小以提高兼容性
-        pygame.mixer.init(frequency=44100, size=-16, channels=2, buffer=4096)
+        # 歌词同步状态
+        self.lrc = None
+        self.lyric_line = -1
+        self.time_text = None
+        # 进度刷新只在播放时调度，暂停或停止后不再唤醒
+        self.progress_job = None
+        self.updating_progress = False
+        self.seek_job = None
+        # 边下边播开始的时间，首个音频播放后显示延迟
+        self.stream_requested_at = None
+        # 正在播放的边下边播任务，切到其他歌曲时取消，不再继续下载和保存
+        self.stream_download = None
+        
+        # 播放引擎：后台加载，预加载下一首实现无缝切换；混音器在第一次播放时才打开
+        self.engine = PlaybackEngine()
+        # 响度和波形分析在后台进程中进行，播放时只读取保存的结果
+        self.analyzer = AudioAnalyzer(
+            on_done=lambda file, result: self.root.after(0, self._on_analyzed, file, result))
+        self.queued_id = None
+        self.startup.mark("初始化播放器")
         
         self.setup_ui()
+        self.startup.mark("创建界面")
+        self.root.protocol("WM_DELETE_WINDOW", self._on_close)
+        if self.metrics_path:
+            self.root.after(10000, self._export_metrics)
+        
+    @property
+    def lyric_fetcher(self):
+        """第一次获取歌词时才导入网络请求模块并创建歌词获取器"""
+        with self._lyric_fetcher_lock:
+            if self._lyric_fetcher is None:
+                from lyric_cache import LyricCache
+                from lyric_fetcher import LyricFetcher
+                from source_stats import SourceStats
+                self._lyric_fetcher = LyricFetcher(cache=LyricCache(), concurrent=True,
+                                                   stats=SourceStats())
+            return self._lyric_fetcher
+        
+    def _open_audio(self):
+        """第一次播放前在主线程中打开音频设备"""
+        if not self.engine.ready:
+            self.engine.open()
+            self.startup.mark("打开音频设备")
         
     def setup_ui(self):
         # 主框架
@@ -48,11 +136,17 @@ class BilibiliMusicPlayer:
         title_label.pack(side=tk.LEFT)
         
         # 显示播放器状态
-        player_status = "✅ Pygame播放器 (支持MP3/WAV)"
+        if self.engine.stream_available:
+            player_status = "✅ Pygame播放器 (支持MP3/WAV/M4A/OPUS)"
+        else:
+            player_status = "✅ Pygame播放器 (支持MP3/WAV)"
         status_label = tk.Label(title_frame, text=player_status, 
                                fg='green', bg='#1e1e1e', font=('Arial', 9))
         status_label.pack(side=tk.RIGHT)
         
+        tk.Button(title_frame, text="📊 统计", command=self.show_stats,
+                 bg='#333', fg='white', font=('Arial', 9)).pack(side=tk.RIGHT, padx=10)
+        
         # 下载区域
         download_frame = tk.LabelFrame(main_frame, text=" 下载音乐 ", 
                                       font=('Arial', 10, 'bold'),
@@ -83,6 +177,21 @@ class BilibiliMusicPlayer:
                       value="high", fg='white', bg='#1e1e1e', selectcolor='#333').pack(side=tk.LEFT, padx=10)
         tk.Radiobutton(quality_frame, text="标准音质", variable=self.quality_var, 
                       value="standard", fg='white', bg='#1e1e1e', selectcolor='#333').pack(side=tk.LEFT, padx=10)
+        tk.Radiobutton(quality_frame, text="原始音质 (不转码)", variable=self.quality_var, 
+                      value="native", fg='white', bg='#1e1e1e', selectcolor='#333').pack(side=tk.LEFT, padx=10)
+        
+        # 批量下载并发数
+        self.concurrency_var = tk.IntVar(value=4)
+        tk.Spinbox(quality_frame, from_=1, to=16, width=3, textvariable=self.concurrency_var,
+                  bg='#333', fg='white', buttonbackground='#333').pack(side=tk.RIGHT)
+        tk.Label(quality_frame, text="合集并发数:", 
+                fg='white', bg='#1e1e1e', font=('Arial', 10)).pack(side=tk.RIGHT, padx=5)
+        
+        # 按内容哈希跳过音乐库中已有的相同音频
+        self.hash_dedupe_var = tk.BooleanVar(value=self.archive.hash_dedupe)
+        tk.Checkbutton(quality_frame, text="内容去重", variable=self.hash_dedupe_var,
+                      command=self._toggle_hash_dedupe, fg='white', bg='#1e1e1e',
+                      selectcolor='#333').pack(side=tk.RIGHT, padx=10)
         
         # 按钮框架
         btn_frame = tk.Frame(download_frame, bg='#1e1e1e')
@@ -91,6 +200,9 @@ class BilibiliMusicPlayer:
         tk.Button(btn_frame, text="📥 下载单个音乐", command=self.download_music,
                  bg='#4CAF50', fg='white', font=('Arial', 10), width=15).pack(side=tk.LEFT, padx=5)
         
+        tk.Button(btn_frame, text="⚡ 边下边播", command=self.stream_play,
+                 bg='#9C27B0', fg='white', font=('Arial', 10), width=12).pack(side=tk.LEFT, padx=5)
+        
         tk.Button(btn_frame, text="📚 批量下载合集", command=self.batch_download,
                  bg='#2196F3', fg='white', font=('Arial', 10), width=15).pack(side=tk.LEFT, padx=5)
         
@@ -98,7 +210,7 @@ class BilibiliMusicPlayer:
                  bg='#FF9800', fg='white', font=('Arial', 10), width=12).pack(side=tk.LEFT, padx=5)
         
         # 进度显示
-        self.progress = ttk.Progressbar(download_frame, mode='indeterminate')
+        self.progress = ttk.Progressbar(download_frame, mode='determinate', maximum=100)
         self.progress.pack(fill=tk.X, padx=10, pady=(0, 10))
         
         self.status_label = tk.Label(download_frame, text="👆 请输入B站视频链接并点击下载", 
@@ -139,9 +251,8 @@ class BilibiliMusicPlayer:
                                   fg='white', bg='#1e1e1e', font=('Arial', 9))
         self.time_label.pack(side=tk.RIGHT)
         
-        # 播放进度条
-        self.song_progress = ttk.Scale(control_frame, from_=0, to=100, 
-                                      orient=tk.HORIZONTAL, command=self.seek_music)
+        # 播放进度条，有分析结果时显示歌曲的波形
+        self.song_progress = WaveformBar(control_frame, command=self.seek_music)
         self.song_progress.pack(fill=tk.X, padx=10, pady=(0, 10))
         
         # 音量控制
@@ -171,6 +282,8 @@ class BilibiliMusicPlayer:
                                                    font=('Arial', 11), wrap=tk.WORD)
         self.lyric_text.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
         self.lyric_text.insert(tk.END, "🎵 歌词将在这里显示...\n\n下载音乐后会自动获取歌词")
+        self.lyric_text.tag_configure('current', foreground='#4CAF50',
+                                      font=('Arial', 12, 'bold'))
         
         # 播放列表区域
         playlist_frame = tk.LabelFrame(content_frame, text=" 🎶 播放列表 ", 
@@ -179,6 +292,17 @@ class BilibiliMusicPlayer:
         playlist_frame.pack(side=tk.RIGHT, fill=tk.BOTH, padx=(5, 0))
         playlist_frame.config(width=300)
         
+        # 搜索框，每输入一个字就过滤一次播放列表
+        search_frame = tk.Frame(playlist_frame, bg='#1e1e1e')
+        search_frame.pack(fill=tk.X, padx=10, pady=(5, 0))
+        tk.Label(search_frame, text="🔍", fg='white', bg='#1e1e1e').pack(side=tk.LEFT)
+        self.search_var = tk.StringVar()
+        self.search_var.trace_add('write', lambda *args: self._apply_search())
+        search_entry = tk.Entry(search_frame, textvariable=self.search_var, bg='#333', fg='white',
+                                insertbackground='white', font=('Arial', 10))
+        search_entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(5, 0))
+        search_entry.bind('<Escape>', lambda event: self.search_var.set(""))
+        
         # 播放列表控制
         playlist_control_frame = tk.Frame(playlist_frame, bg='#1e1e1e')
         playlist_control_frame.pack(fill=tk.X, padx=10, pady=5)
@@ -192,35 +316,217 @@ class BilibiliMusicPlayer:
                  font=('Arial', 8)).pack(side=tk.LEFT, padx=2)
         
         # 播放列表
-        self.playlist_box = tk.Listbox(playlist_frame, bg='#2d2d2d', fg='white',
-                                      selectbackground='#4CAF50', font=('Arial', 10))
+        # 虚拟化列表，只渲染可见的行
+        self.playlist_box = VirtualPlaylistView(playlist_frame,
+                                                count=self._view_count,
+                                                label=self._playlist_label,
+                                                bg='#2d2d2d', fg='white',
+                                                selectbackground='#4CAF50', font=('Arial', 10))
         self.playlist_box.pack(fill=tk.BOTH, expand=True, padx=10, pady=(0, 10))
         self.playlist_box.bind('<<ListboxSelect>>', self.on_playlist_select)
         self.playlist_box.bind('<Double-Button-1>', self.on_double_click)
         
         # 初始化
         self.set_volume(70)
-        self.scan_downloads_folder()
-        self.update_progress()
-        
-    def scan_downloads_folder(self):
-        """扫描下载文件夹中的音乐文件"""
-        if not os.path.exists("downloads"):
-            os.makedirs("downloads")
-            return
-            
-        for file in os.listdir("downloads"):
-            if file.endswith(('.mp3', '.wav')):
-                file_path = os.path.join("downloads", file)
-                song_info = {
-                    'title': os.path.splitext(file)[0],
-                    'file': file_path,
-                    'duration': 0
-                }
-                if song_info not in self.playlist:
-                    self.playlist.append(song_info)
+        # 窗口第一帧画出后再载入音乐库索引，并在后台和文件系统核对；
+        # 窗口最小化或隐藏启动时不会收到 <Expose>，稍后也照常载入
+        self.library_started = False
+        self.expose_binding = self.root.bind('<Expose>', self._on_first_frame, add='+')
+        self.root.after(500, self._on_first_frame)
+        
+    def _on_first_frame(self, event=None):
+        if self.library_started:
+            return
+        self.library_started = True
+        # 只去掉自己的绑定；旧版本的 unbind(sequence, funcid) 会清除该事件的所有绑定
+        script = self.root.bind('<Expose>')
+        self.root.bind('<Expose>', '\n'.join(
+            line for line in script.split('\n') if self.expose_binding not in line))
+        self.root.deletecommand(self.expose_binding)
+        # 先画完所有控件，再开始载入音乐库
+        self.root.update_idletasks()
+        self.startup.mark("绘制首帧")
+        self.scan_downloads_folder(self._on_library_ready, True)
+        
+    def _on_library_ready(self):
+        self.startup.mark("核对音乐库文件")
+        self.startup.report()
+        # 音乐库加入索引后，再从歌词缓存中补充歌词
+        self.index_worker.submit(self._index_cached_lyrics)
+        if self.analyzer.available:
+            self._analyze_tracks([track.file for track in self.playlist])
+        else:
+            print("未安装NumPy，跳过响度归一化和波形分析")
+        
+    def show_stats(self):
+        """打开统计面板，显示各阶段的耗时和计数，打开期间每秒刷新"""
+        if self.stats_window is not None and self.stats_window.winfo_exists():
+            self.stats_window.lift()
+            return
+            
+        window = tk.Toplevel(self.root)
+        window.title("运行统计")
+        window.geometry("760x460")
+        window.configure(bg='#1e1e1e')
+        self.stats_window = window
+        
+        btn_frame = tk.Frame(window, bg='#1e1e1e')
+        btn_frame.pack(fill=tk.X, padx=10, pady=(10, 0))
+        tk.Button(btn_frame, text="💾 导出", command=self._save_metrics,
+                 bg='#2196F3', fg='white', font=('Arial', 9)).pack(side=tk.LEFT)
+        tk.Button(btn_frame, text="🧹 清零", command=metrics.reset,
+                 bg='#ff9800', fg='white', font=('Arial', 9)).pack(side=tk.LEFT, padx=5)
+        
+        text = scrolledtext.ScrolledText(window, bg='#2d2d2d', fg='white',
+                                         font=('Courier', 9), wrap=tk.NONE)
+        text.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        
+        def refresh():
+            if not window.winfo_exists():
+                return
+            top = text.yview()[0]
+            text.delete(1.0, tk.END)
+            text.insert(tk.END, metrics.summary())
+            text.yview_moveto(top)
+            window.after(1000, refresh)
+            
+        refresh()
+        
+    def _save_metrics(self):
+        path = filedialog.asksaveasfilename(
+            parent=self.stats_window, defaultextension='.json',
+            filetypes=[("JSON", "*.json"), ("Prometheus textfile", "*.prom")])
+        if not path:
+            return
+        try:
+            metrics.export(path)
+        except OSError as e:
+            messagebox.showerror("错误", f"导出统计失败: {e}", parent=self.stats_window)
+            
+    def _export_metrics(self):
+        """定期写入统计文件，供外部监控读取"""
+        try:
+            metrics.export(self.metrics_path)
+        except OSError as e:
+            print(f"写入统计文件失败: {e}")
+        self.root.after(10000, self._export_metrics)
+        
+    def _on_close(self):
+        self._cancel_stream()
+        if self.metrics_path:
+            try:
+                metrics.export(self.metrics_path)
+            except OSError as e:
+                print(f"写入统计文件失败: {e}")
+        # 未完成的索引任务不再需要；索引线程不是守护线程，退出时会等它，
+        # 清空索引让正在分批加入的任务在下一批之前停止
+        self.index_worker.shutdown(wait=False, cancel_futures=True)
+        self.search_index.clear()
+        self.lyric_requests.shutdown()
+        self.analyzer.shutdown()
+        self.root.destroy()
+        
+    def scan_downloads_folder(self, on_done=None, load_index=False):
+        """在后台线程中递归扫描下载文件夹，扫描完成后在主线程合并到播放列表
+        
+        load_index为True时先载入持久化的音乐库索引并立即显示，再和文件系统核对。
+        """
+        if self.scanning:
+            return
+        self.scanning = True
+        
+        def scan():
+            if load_index:
+                try:
+                    tracks = self.library_db.load()
+                    self.library.load(track.file for track in tracks)
+                    # 大音乐库逐首加入要占用界面线程不少时间，在后台建好播放列表再交给界面线程
+                    store = TrackStore()
+                    for track in tracks:
+                        store.append(track)
+                    self.root.after(0, self._show_index, store, tracks)
+                except Exception as e:
+                    print(f"读取音乐库索引失败: {e}")
                     
-        self.update_playlist()
+            try:
+                added, removed = self.library.scan()
+                if added:
+                    self.library_db.add_many(added)
+                if removed:
+                    self.library_db.remove_many(removed)
+                    # 已删除文件的响度和波形分析结果不再需要
+                    self.analyzer.store.remove_many(removed)
+                # 刷新时从索引补回播放列表中被删掉的歌曲，启动时只需要补充新文件
+                tracks = added if load_index else self.library_db.load()
+            except Exception as e:
+                print(f"扫描音乐库失败: {e}")
+                tracks, removed = [], []
+            self.root.after(0, self._apply_scan, tracks, removed, on_done)
+            self._index_content()
+            
+        threading.Thread(target=scan, daemon=True).start()
+        
+    def _index_content(self):
+        """在后台线程中为音乐库文件建立内容哈希索引，只有新增或修改过的文件需要读取"""
+        try:
+            hashed = self.downloader.index_library()
+        except Exception as e:
+            print(f"建立内容哈希索引失败: {e}")
+            return
+        if hashed:
+            print(f"已为{hashed}个文件建立内容哈希索引")
+            
+    def _toggle_hash_dedupe(self):
+        self.archive.hash_dedupe = self.hash_dedupe_var.get()
+        if self.archive.hash_dedupe:
+            threading.Thread(target=self._index_content, daemon=True).start()
+            
+    def _apply_scan(self, tracks, removed, on_done=None):
+        """扫描结束，在主线程合并结果"""
+        self.scanning = False
+        self._merge_library(tracks, removed)
+        if on_done:
+            on_done()
+        
+    def _show_index(self, store, tracks):
+        """显示持久化的音乐库索引，文件系统核对完成前就可以播放
+
+        store 是在后台按 tracks 建好的播放列表，tracks 中的歌曲已按 store 设置了id。
+        """
+        if self.playlist:
+            # 索引载入前已经有歌曲加入（例如下载很快完成），逐首合并
+            self._merge_library(tracks, [])
+        else:
+            self.playlist = store
+            self._index_tracks(tracks)
+            self._analyze_tracks([track.file for track in tracks])
+            self.playlist_box.reset()
+        self.startup.mark("载入音乐库索引")
+        
+    def _merge_library(self, tracks, removed):
+        """把音乐库合并到播放列表：移除已删除的文件，补充列表中没有的歌曲"""
+        removed_ids = set()
+        for file in removed:
+            track = self.playlist.remove_file(file)
+            if track is not None:
+                removed_ids.add(track.id)
+                # 与加入索引在同一线程中按顺序执行
+                self.index_worker.submit(self.search_index.remove, track.id)
+        if removed_ids and self.search_results is not None:
+            # 索引线程完成删除之前不重新搜索，先从当前结果中去掉
+            self.search_results = [track_id for track_id in self.search_results
+                                   if track_id not in removed_ids]
+            self.result_index = {track_id: i for i, track_id in enumerate(self.search_results)}
+            
+        # 已在列表中的文件会被跳过
+        added = [track for track in tracks if self.playlist.append(track)]
+        self._index_tracks(added)
+        self._analyze_tracks([track.file for track in added])
+        if removed_ids:
+            self._compact_playlist()
+                    
+        # 搜索结果由索引线程完成删除和加入后刷新
+        self.playlist_box.reset()
         
     def download_music(self):
         url = self.url_entry.get().strip()
@@ -228,76 +534,171 @@ class BilibiliMusicPlayer:
             messagebox.showerror("错误", "请输入有效的B站视频链接")
             return
             
-        threading.Thread(target=self._download_music, args=(url,), daemon=True).start()
+        quality = self.quality_var.get()
+        threading.Thread(target=self._download_music, args=(url, quality), daemon=True).start()
         
-    def _download_music(self, url):
+    def stream_play(self):
+        url = self.url_entry.get().strip()
+        if not url or "bilibili.com" not in url:
+            messagebox.showerror("错误", "请输入有效的B站视频链接")
+            return
+        if not self.engine.stream_available:
+            messagebox.showinfo("提示", "边下边播需要FFmpeg实时解码，请先安装FFmpeg或使用普通下载")
+            return
+            
+        quality = self.quality_var.get()
+        threading.Thread(target=self._stream_play, args=(url, quality, time.monotonic()),
+                         daemon=True).start()
+        
+    def _stream_play(self, url, quality, requested_at):
+        """边下边播：音频流写入临时文件的同时开始播放，下载完成后照常保存到音乐库"""
+        message = None
         try:
-            self.progress.start()
-            self.status_label.config(text="⏳ 正在获取视频信息...")
+            self._begin_download("⏳ 正在获取音频流...")
             
-            if not os.path.exists("downloads"):
-                os.makedirs("downloads")
-                
-            # 根据音质选择配置
-            quality = self.quality_var.get()
-            if quality == "high":
-                # 高音质配置 - 320k MP3
-                ydl_opts = {
-                    'format': 'bestaudio/best',
-                    'outtmpl': 'downloads/%(title)s.%(ext)s',
-                    'postprocessors': [{
-                        'key': 'FFmpegExtractAudio',
-                        'preferredcodec': 'mp3',
-                        'preferredquality': '320',
-                    }],
-                }
-            else:
-                # 标准音质 - 192k MP3
-                ydl_opts = {
-                    'format': 'bestaudio/best',
-                    'outtmpl': 'downloads/%(title)s.%(ext)s',
-                    'postprocessors': [{
-                        'key': 'FFmpegExtractAudio',
-                        'preferredcodec': 'mp3',
-                        'preferredquality': '192',
-                    }],
-                }
-            
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(url, download=True)
-                filename = ydl.prepare_filename(info)
-                
-                # 确保文件扩展名为mp3
-                final_file = filename.rsplit('.', 1)[0] + '.mp3'
+            existing = self.archive.find(url)
+            if existing is not None:
+                # 已经下载过，直接播放音乐库中的文件
+                self.root.after(0, self._play_existing, existing)
+                message = f"✅ 已在音乐库中: {existing.title}"
+                return
                 
-                # 检查文件是否实际存在
-                if not os.path.exists(final_file):
-                    # 如果转换失败，尝试直接使用下载的文件
-                    if os.path.exists(filename):
-                        final_file = filename
-                    else:
-                        raise FileNotFoundError(f"下载的文件不存在: {final_file}")
-                
-                song_info = {
-                    'title': info.get('title', '未知标题'),
-                    'file': final_file,
-                    'duration': info.get('duration', 0)
-                }
-                
-                self.playlist.append(song_info)
-                self.root.after(0, self.update_playlist)
-                
-                # 显示下载的音质信息
-                file_size = os.path.getsize(final_file) / (1024 * 1024)  # MB
-                quality_info = "高音质MP3 (320k)" if quality == "high" else "标准音质MP3 (192k)"
-                self.status_label.config(text=f"✅ 下载完成 ({quality_info}): {song_info['title']} ({file_size:.1f}MB)")
+            from progressive import DownloadCancelled, ProgressiveDownload
+            
+            info, filename = self.downloader.resolve_stream(url)
+            hook = self.download_progress.hooks(url, info.get('title'))['progress_hooks'][0]
+            download = ProgressiveDownload(info['url'], filename, info.get('http_headers'),
+                                           progress_hook=hook)
+            reader = download.open_reader()
+            download.start()
+            track = Track(info.get('title', '未知标题'), filename,
+                          info.get('duration', 0), info.get('webpage_url') or url)
+            self.root.after(0, self._play_stream, track, reader, requested_at, download)
+            
+            try:
+                download.wait()
+            except DownloadCancelled:
+                message = f"⏹️ 已停止边下边播: {track.title}"
+                return
+            sources = (url, info.get('webpage_url'), info.get('id'))
+            track = self.downloader.finish_download(track, quality, sources, task_id=url).result()
+            self.root.after(0, self._on_stream_saved, filename, track)
+            message = f"✅ 已保存到音乐库: {track.title}"
+            
+        except Exception as e:
+            message = f"❌ 边下边播失败: {str(e)}"
+            self.root.after(0, lambda: messagebox.showerror("错误", message))
+        finally:
+            self.download_progress.finish_task(url)
+            self.download_progress.end(message)
+            
+    def _play_existing(self, track):
+        """播放音乐库中已有的歌曲，不在播放列表中时先加入"""
+        self._add_song(track)
+        song = self.playlist.find_file(track.file)
+        self.current_id = song.id
+        self._select_in_view(song.id)
+        self.play_selected()
+        
+    def _play_stream(self, track, reader, requested_at, download):
+        """在界面线程中开始播放正在下载的音频流"""
+        self._cancel_stream()
+        try:
+            self._open_audio()
+            load = self.engine.play_stream(track.file, reader)
+        except Exception as e:
+            reader.close()
+            self._show_play_error(e)
+            return
+        load.add_done_callback(self._on_loaded)
+        
+        self.stream_download = download
+        self.current_song = track.file
+        self.current_id = None
+        self.queued_id = None
+        self.playlist_box.selection_clear(0, tk.END)
+        self.is_playing = True
+        self.play_btn.config(text="⏸️ 暂停")
+        self._show_current(track)
+        self.stream_requested_at = requested_at
+        self._schedule_progress()
+        
+    def _on_stream_saved(self, filename, track):
+        """边下边播的歌曲已保存，加入播放列表；仍在播放时改为按保存的文件继续"""
+        self._add_song(track)
+        song = self.playlist.find_file(track.file)
+        if self.stream_download is not None and self.stream_download.path == filename:
+            self.stream_download = None
+        if song and self.current_song == filename and self.current_id is None:
+            self.engine.stream_saved(song.file)
+            self.current_song = song.file
+            self.current_id = song.id
+            self._select_in_view(song.id)
+            self._preload_next()
+        
+    def _report_first_audio(self):
+        """边下边播的第一个音频块开始播放后，显示从点击到出声的时间"""
+        started = self.engine.stream_backend.first_chunk_at
+        if started is None:
+            return
+        latency = started - self.stream_requested_at
+        self.stream_requested_at = None
+        self.status_label.config(text=f"⚡ 边下边播，首个音频用时 {latency:.1f} 秒，下载完成后保存到音乐库")
+        
+    def _pipeline_status(self):
+        """转码流水线的状态文本，包括转码队列深度，空闲时返回空字符串"""
+        stats = self.transcoder.stats()
+        if not stats['queued'] and not stats['active']:
+            return ""
+        return (f" · 待转码 {stats['queued']}/{stats['max_queue']}"
+                f" · 转码中 {stats['active']} · 已转码 {stats['done']}")
+        
+    def _begin_download(self, message):
+        """在下载线程中调用，开始记录进度并通知界面线程开始刷新"""
+        self.download_progress.begin(message)
+        self.root.after(0, self._watch_downloads)
+        
+    def _watch_downloads(self):
+        """界面线程中定时刷新下载进度，不论回调多频繁，每秒最多刷新5次"""
+        if self.download_watch is not None:
+            self.root.after_cancel(self.download_watch)
+            self.download_watch = None
+            
+        state = self.download_progress.snapshot()
+        if state:
+            text, percent = state
+            if self.download_progress.active:
+                text += self._pipeline_status()
+            self.status_label.config(text=text)
+            self.progress['value'] = percent
+            
+        # 没有进行中的下载时停止刷新
+        if self.download_progress.active:
+            self.download_watch = self.root.after(200, self._watch_downloads)
+            
+    def _download_music(self, url, quality):
+        message = None
+        try:
+            self._begin_download("⏳ 正在获取视频信息...")
+            
+            track, skipped = self.downloader.download(url, quality)
+            self.root.after(0, self._add_song, track)
+            if skipped:
+                message = f"✅ 已在音乐库中，跳过下载: {track.title}"
+                return
+            
+            # 显示下载的音质信息
+            file_size = os.path.getsize(track.file) / (1024 * 1024)  # MB
+            message = (f"✅ 下载完成 ({quality_info(quality)}): {track.title} "
+                       f"({file_size:.1f}MB)")
+            if unconverted(track, quality):
+                message += " ⚠️ 转码失败，保留原始格式"
                 
         except Exception as e:
-            error_msg = f"❌ 下载失败: {str(e)}"
-            self.status_label.config(text=error_msg)
-            self.root.after(0, lambda: messagebox.showerror("错误", error_msg))
+            message = f"❌ 下载失败: {str(e)}"
+            self.root.after(0, lambda: messagebox.showerror("错误", message))
         finally:
-            self.progress.stop()
+            self.download_progress.end(message)
             
     def batch_download(self):
         url = self.url_entry.get().strip()
@@ -305,84 +706,165 @@ class BilibiliMusicPlayer:
             messagebox.showerror("错误", "请输入有效的B站合集链接")
             return
             
-        threading.Thread(target=self._batch_download, args=(url,), daemon=True).start()
+        quality = self.quality_var.get()
+        try:
+            concurrency = max(1, int(self.concurrency_var.get()))
+        except (tk.TclError, ValueError):
+            concurrency = 1
+        threading.Thread(target=self._batch_download, args=(url, quality, concurrency),
+                         daemon=True).start()
         
-    def _batch_download(self, url):
+    def _batch_download(self, url, quality, concurrency):
+        message = None
         try:
-            self.progress.start()
-            self.status_label.config(text="⏳ 正在获取合集信息...")
-            
-            quality = self.quality_var.get()
-            if quality == "high":
-                ydl_opts = {
-                    'format': 'bestaudio/best',
-                    'outtmpl': 'downloads/%(playlist_title)s/%(title)s.%(ext)s',
-                    'postprocessors': [{
-                        'key': 'FFmpegExtractAudio',
-                        'preferredcodec': 'mp3',
-                        'preferredquality': '320',
-                    }],
-                }
-            else:
-                ydl_opts = {
-                    'format': 'bestaudio/best',
-                    'outtmpl': 'downloads/%(playlist_title)s/%(title)s.%(ext)s',
-                    'postprocessors': [{
-                        'key': 'FFmpegExtractAudio',
-                        'preferredcodec': 'mp3',
-                        'preferredquality': '192',
-                    }],
-                }
-            
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(url, download=True)
-                downloaded_count = 0
+            self._begin_download("⏳ 正在获取合集信息...")
+            
+            def on_start(total, skipped):
+                self.download_progress.message(f"⏳ 合集共{total + skipped}首，{skipped}首已下载，"
+                                               f"正在以{concurrency}个并发下载{total}首新条目...")
                 
-                if 'entries' in info:
-                    for entry in info['entries']:
-                        if entry:
-                            filename = ydl.prepare_filename(entry)
-                            final_file = filename.rsplit('.', 1)[0] + '.mp3'
-                            
-                            # 检查文件是否实际存在
-                            if os.path.exists(final_file):
-                                song_info = {
-                                    'title': entry.get('title', '未知标题'),
-                                    'file': final_file,
-                                    'duration': entry.get('duration', 0)
-                                }
-                                
-                                self.playlist.append(song_info)
-                                downloaded_count += 1
+            # 转码完成一首就加入播放列表，已下载的条目直接加入
+            add_song = lambda track: self.root.after(0, self._add_song, track)
+            not_converted = []
+            
+            def on_track(track):
+                if unconverted(track, quality):
+                    not_converted.append(track)
+                add_song(track)
                 
-                self.root.after(0, self.update_playlist)
-                quality_info = "高音质MP3 (320k)" if quality == "high" else "标准音质MP3 (192k)"
-                self.status_label.config(text=f"✅ 合集下载完成 ({quality_info})，共{downloaded_count}首歌曲")
+            downloaded_count, skipped, failed = self.downloader.batch_download(
+                url, quality, concurrency, on_track=on_track, on_skip=add_song, on_start=on_start)
+            
+            message = (f"✅ 合集同步完成 ({quality_info(quality)})，新增{downloaded_count}首，"
+                       f"跳过{skipped}首已下载的歌曲")
+            if failed:
+                message += f"，{failed}首失败"
+            if not_converted:
+                message += f"，{len(not_converted)}首转码失败，保留原始格式"
                 
         except Exception as e:
-            error_msg = f"❌ 下载失败: {str(e)}"
-            self.status_label.config(text=error_msg)
-            self.root.after(0, lambda: messagebox.showerror("错误", error_msg))
+            message = f"❌ 下载失败: {str(e)}"
+            self.root.after(0, lambda: messagebox.showerror("错误", message))
         finally:
-            self.progress.stop()
+            self.download_progress.end(message)
             
+    def _add_song(self, track):
+        """在主线程中把下载完成的歌曲加入播放列表"""
+        if self.playlist.append(track):
+            self._index_tracks([track])
+            if self.search_results is None:
+                self.playlist_box.inserted(len(self.playlist) - 1)
+            self.lyric_prefetcher.prefetch([track.title], LyricPrefetcher.DOWNLOADED)
+            self.analyzer.submit([track.file], AudioAnalyzer.DOWNLOADED)
+        
     def refresh_playlist(self):
-        self.playlist.clear()
-        self.scan_downloads_folder()
-        self.status_label.config(text="🔄 播放列表已刷新")
+        # 增量扫描，只重新读取有变化的目录
+        self.status_label.config(text="🔄 正在刷新播放列表...")
+        self.scan_downloads_folder(
+            on_done=lambda: self.status_label.config(text="🔄 播放列表已刷新"))
         
     def update_playlist(self):
-        self.playlist_box.delete(0, tk.END)
-        for i, song in enumerate(self.playlist):
-            # 显示文件格式信息
-            file_ext = os.path.splitext(song['file'])[1].upper().replace('.', '')
-            display_name = f"{i+1}. {song['title']} [{file_ext}]"
-            self.playlist_box.insert(tk.END, display_name)
+        """播放列表整体变化后刷新，只重新渲染可见的行"""
+        if self.search_results is not None:
+            self._apply_search(keep_scroll=True)
+        else:
+            self.playlist_box.reset()
+        
+    def _index_tracks(self, tracks):
+        """在后台把歌曲加入搜索索引，正在搜索时完成后刷新结果"""
+        if not tracks:
+            return
+        generation = self.search_index.generation
+        
+        def index():
+            self.search_index.add_many(tracks, generation)
+            self._refresh_search_later()
+            
+        self.index_worker.submit(index)
+        
+    def _index_lyrics(self, titles):
+        """在后台从歌词缓存读取这些歌曲的歌词并加入搜索索引"""
+        self.index_worker.submit(self._index_cached_lyrics, titles)
+        
+    def _index_cached_lyrics(self, titles=None):
+        """在索引线程中执行，titles 为None时处理索引中的所有歌曲"""
+        try:
+            if titles is None:
+                titles = self.search_index.titles()
+            found = self.lyric_fetcher.cached_lyrics_many(titles)
+        except Exception as e:
+            print(f"读取缓存歌词失败: {e}")
+            return
+        for title, lyrics in found.items():
+            self.search_index.set_lyrics(title, lyrics)
+        if found:
+            self._refresh_search_later()
+            
+    def _refresh_search_later(self):
+        if self.search_results is not None:
+            self.root.after(0, self._apply_search, True)
+            
+    def _apply_search(self, keep_scroll=False):
+        """按搜索框的内容过滤播放列表视图，搜索框为空时显示整个列表"""
+        with metrics.timer('search_seconds'):
+            results = self.search_index.search(self.search_var.get())
+        if results is not None:
+            # 索引线程还没处理完的删除：歌曲已不在播放列表中
+            results = [track_id for track_id in results if self.playlist.get(track_id) is not None]
+        self.search_results = results
+        self.result_index = ({} if results is None
+                             else {track_id: i for i, track_id in enumerate(results)})
+        if not keep_scroll:
+            self.playlist_box.top = 0
+        self.playlist_box.selection_clear()
+        self.playlist_box.reset()
+        index = self._view_index(self.current_id)
+        if index is not None:
+            self.playlist_box.select_set(index)
+            
+    def _view_count(self):
+        if self.search_results is None:
+            return len(self.playlist)
+        return len(self.search_results)
+        
+    def _view_track(self, index):
+        """播放列表视图第index行的歌曲，搜索时视图中只有搜索结果"""
+        if self.search_results is None:
+            return self.playlist[index]
+        return self.playlist.get(self.search_results[index])
+        
+    def _view_index(self, track_id):
+        """歌曲在播放列表视图中的行号，不在视图中时返回None"""
+        if self.search_results is None:
+            return self.playlist.position(track_id)
+        return self.result_index.get(track_id)
+        
+    def _select_in_view(self, track_id):
+        """在视图中选中并显示该歌曲，搜索结果中没有时只清除选择"""
+        self.playlist_box.selection_clear(0, tk.END)
+        index = self._view_index(track_id)
+        if index is not None:
+            self.playlist_box.select_set(index)
+            self.playlist_box.see(index)
+        
+    def _playlist_label(self, index):
+        """播放列表第index行的显示文本，序号为歌曲在整个播放列表中的位置"""
+        track = self._view_track(index)
+        position = index if self.search_results is None else self.playlist.position(track.id)
+        # 显示文件格式信息
+        file_ext = os.path.splitext(track.file)[1].upper().replace('.', '')
+        return f"{position+1}. {track.title} [{file_ext}]"
             
     def on_playlist_select(self, event):
         selection = self.playlist_box.curselection()
         if selection:
-            self.current_index = selection[0]
+            self.current_id = self._view_track(selection[0]).id
+            
+    def _cancel_stream(self):
+        """不再播放边下边播的歌曲时取消它的下载"""
+        if self.stream_download is not None:
+            self.stream_download.cancel()
+            self.stream_download = None
             
     def on_double_click(self, event):
         self.play_selected()
@@ -391,147 +873,432 @@ class BilibiliMusicPlayer:
         if not self.playlist:
             return
             
-        song = self.playlist[self.current_index]
-        self.current_song = song['file']
+        self._cancel_stream()
+        song = self.playlist.get(self.current_id)
+        if song is None:
+            song = self.playlist[0]
+            self.current_id = song.id
+        self.current_song = song.file
         
         try:
-            # 检查文件格式，只支持MP3和WAV
-            file_ext = os.path.splitext(self.current_song)[1].lower()
-            if file_ext not in ['.mp3', '.wav']:
-                raise Exception(f"不支持的音频格式: {file_ext}。请下载MP3格式。")
-            
-            pygame.mixer.music.load(self.current_song)
-            pygame.mixer.music.play()
+            # 文件在播放引擎的后台线程中加载，加载失败时再回到主线程提示
+            self._open_audio()
+            load = self.engine.play(self.current_song)
+            load.add_done_callback(self._on_loaded)
                 
             self.is_playing = True
             self.play_btn.config(text="⏸️ 暂停")
-            self.current_song_label.config(text=f"正在播放: {song['title']}")
-            self.status_label.config(text=f"🎵 正在播放: {song['title']}")
-            
-            # 获取歌词
-            self.get_lyrics(song['title'])
+            self._show_current(song)
+            self._preload_next()
+            self._schedule_progress()
             
         except Exception as e:
-            error_msg = f"播放失败: {str(e)}"
-            if "ModPlug" in str(e):
-                error_msg += "\n\n💡 提示: 请选择'高音质MP3'或'标准音质'重新下载"
-            messagebox.showerror("错误", error_msg)
+            self._show_play_error(e)
+            
+    def _show_current(self, song):
+        """更新正在播放的歌曲信息并获取歌词"""
+        self.current_song_label.config(text=f"正在播放: {song.title}")
+        self.status_label.config(text=f"🎵 正在播放: {song.title}")
+        self.song_duration = song.duration
+        self.time_text = None
+        self._apply_analysis(song.file)
+        
+        # 获取歌词
+        self.get_lyrics(song.title)
+        self._prefetch_upcoming()
+        
+    def _apply_analysis(self, file):
+        """应用保存的响度增益并显示波形，还没有分析结果时优先分析这首歌曲"""
+        result = self.analyzer.get(file) if self.analyzer.available else None
+        if result is None:
+            self.engine.set_gain(1.0)
+            self.song_progress.set_peaks(None)
+            self.analyzer.submit([file], AudioAnalyzer.PLAYING)
+            return
+        self.engine.set_gain(result.gain)
+        self.song_progress.set_peaks(result.peaks)
+        if not self.song_duration:
+            # 扫描得到的歌曲没有时长，用分析时解码出的时长
+            self.song_duration = result.duration
+            
+    def _on_analyzed(self, file, result):
+        """分析完成的回调，正在播放这首歌曲时立即应用"""
+        if file != self.current_song or self.engine.streaming:
+            return
+        self.engine.set_gain(result.gain)
+        self.song_progress.set_peaks(result.peaks)
+        if not self.song_duration:
+            self.song_duration = result.duration
+            self.time_text = None
+            
+    def _analyze_tracks(self, files):
+        """在后台线程中找出还没有分析结果的文件，交给分析队列"""
+        if not files or not self.analyzer.available:
+            return
+        threading.Thread(
+            target=lambda: self.analyzer.submit(self.analyzer.store.missing(files)),
+            daemon=True).start()
+        
+    def _prefetch_upcoming(self):
+        """预取当前歌曲之后几首的歌词"""
+        position = self.playlist.position(self.current_id)
+        if position is None:
+            return
+        count = min(self.prefetch_ahead, len(self.playlist) - 1)
+        titles = [self.playlist[(position + i) % len(self.playlist)].title
+                  for i in range(1, count + 1)]
+        self.lyric_prefetcher.prefetch(titles)
+        
+    def _on_loaded(self, future):
+        """后台加载完成的回调，在播放引擎线程中执行"""
+        error = future.exception()
+        if error is not None:
+            self.root.after(0, self._on_load_failed, future, error)
+            
+    def _on_load_failed(self, future, error):
+        """加载失败时停止播放，不自动切到下一首，否则多首无法播放的歌曲会连续弹出错误"""
+        if self.engine.load_failed(future):
+            self.is_playing = False
+            self.queued_id = None
+            self.play_btn.config(text="▶️ 播放")
+            self._cancel_progress()
+        self._show_play_error(error)
+        
+    def _show_play_error(self, e):
+        error_msg = f"播放失败: {str(e)}"
+        if "ModPlug" in str(e):
+            error_msg += "\n\n💡 提示: 请选择'高音质MP3'或'标准音质'重新下载"
+        messagebox.showerror("错误", error_msg)
+        
+    def _preload_next(self):
+        """预加载播放列表中的下一首"""
+        self.queued_id = None
+        if len(self.playlist) < 2:
+            return
+        position = self.playlist.position(self.current_id)
+        if position is None:
+            return
+        track = self.playlist[(position + 1) % len(self.playlist)]
+        if self.engine.preload(track.file):
+            self.queued_id = track.id
+            
+    def _on_track_advanced(self):
+        """预加载的歌曲已无缝开始播放"""
+        song = self.playlist.get(self.queued_id)
+        self.current_song = self.engine.current
+        if song is None:
+            # 预加载后歌曲已从列表中删除，只更新文件路径
+            self.queued_id = None
+            return
+            
+        self.current_id = song.id
+        self._select_in_view(song.id)
+        self._show_current(song)
+        self._preload_next()
+        
+    def _on_track_ended(self):
+        """当前歌曲结束且没有无缝衔接的下一首"""
+        if len(self.playlist) > 1:
+            self.next_song()
+        else:
+            self.is_playing = False
+            self.play_btn.config(text="▶️ 播放")
+            self._set_progress(0)
             
     def toggle_play(self):
         if not self.current_song:
             if self.playlist:
-                self.current_index = 0
+                self.current_id = self.playlist[0].id
                 self.play_selected()
             else:
                 messagebox.showinfo("提示", "播放列表为空，请先下载音乐")
             return
             
         if self.is_playing:
-            pygame.mixer.music.pause()
+            self.engine.pause()
             self.is_playing = False
             self.play_btn.config(text="▶️ 播放")
+            self._cancel_progress()
+        elif not self.engine.playing:
+            # 加载失败或已播放完毕，没有可以恢复的播放，重新播放当前歌曲
+            self.play_selected()
         else:
-            pygame.mixer.music.unpause()
+            self.engine.unpause()
             self.is_playing = True
             self.play_btn.config(text="⏸️ 暂停")
+            self._schedule_progress()
             
     def previous_song(self):
         if len(self.playlist) > 1:
-            self.current_index = (self.current_index - 1) % len(self.playlist)
-            self.playlist_box.selection_clear(0, tk.END)
-            self.playlist_box.select_set(self.current_index)
+            self._select_relative(-1)
             self.play_selected()
             
     def next_song(self):
         if len(self.playlist) > 1:
-            self.current_index = (self.current_index + 1) % len(self.playlist)
-            self.playlist_box.selection_clear(0, tk.END)
-            self.playlist_box.select_set(self.current_index)
+            self._select_relative(1)
             self.play_selected()
             
+    def _select_relative(self, step):
+        """按当前歌曲的位置前后移动选择"""
+        position = self.playlist.position(self.current_id)
+        if position is None:
+            position = 0 if step > 0 else 1
+        position = (position + step) % len(self.playlist)
+        self.current_id = self.playlist[position].id
+        self._select_in_view(self.current_id)
+            
     def set_volume(self, value):
         volume = int(value) / 100.0
-        pygame.mixer.music.set_volume(volume)
+        self.engine.set_volume(volume)
         
     def seek_music(self, value):
-        # 进度跳转功能（基础实现）
-        pass
+        if self.updating_progress:
+            # 播放进度更新滑块时也会触发回调，忽略
+            return
+        if not self.current_song or not self.song_duration:
+            return
+        position = float(value) / 100 * self.song_duration
+        # 拖动滑块时会连续触发，停下来之后才真正跳转
+        if self.seek_job is not None:
+            self.root.after_cancel(self.seek_job)
+        self.seek_job = self.root.after(150, self._seek_to, position)
+        
+    def _seek_to(self, position):
+        self.seek_job = None
+        load = self.engine.seek(position)
+        if load is None:
+            return
+        load.add_done_callback(self._on_loaded)
+        self._preload_next()
+        self.time_text = None
+        if self.is_playing:
+            self._schedule_progress()
+        else:
+            self._set_progress(position)
+            self.sync_lyrics(position)
+        
+    def _schedule_progress(self, delay=0):
+        """安排下一次进度刷新，同一时间只保留一个待执行的刷新"""
+        self._cancel_progress()
+        self.progress_job = self.root.after(delay, self.update_progress)
+        
+    def _cancel_progress(self):
+        if self.progress_job is not None:
+            self.root.after_cancel(self.progress_job)
+            self.progress_job = None
+            
+    def _set_progress(self, position):
+        """更新时间标签和进度条，文本每秒才变化一次，没有变化时不重新配置控件"""
+        current_time = int(position)
+        time_text = f"{current_time // 60:02d}:{current_time % 60:02d}"
+        if self.song_duration:
+            total = int(self.song_duration)
+            time_text += f" / {total // 60:02d}:{total % 60:02d}"
+        if time_text == self.time_text:
+            return
+        self.time_label.config(text=time_text)
+        self.time_text = time_text
+        if self.seek_job is not None:
+            # 正在拖动滑块，不要把滑块拉回当前位置
+            return
+            
+        self.updating_progress = True
+        try:
+            percent = position / self.song_duration * 100 if self.song_duration else 0
+            self.song_progress.set(min(percent, 100))
+        finally:
+            self.updating_progress = False
+            
+    def _next_progress_delay(self, position):
+        """距离下一次需要刷新的毫秒数
+
+        在时间标签跳到下一秒或下一句歌词开始时刷新，
+        最长不超过250毫秒，以便及时处理歌曲结束事件。
+        """
+        delay = 1.0 - position % 1.0
+        if self.lrc:
+            next_time = self.lrc.next_time(position)
+            if next_time is not None:
+                delay = min(delay, next_time - position)
+        return max(10, min(int(delay * 1000) + 5, 250))
             
     def update_progress(self):
-        if self.is_playing:
-            # Pygame进度更新（简化版）
-            current_time = pygame.mixer.music.get_pos() // 1000
-            minutes = current_time // 60
-            seconds = current_time % 60
-            self.time_label.config(text=f"{minutes:02d}:{seconds:02d}")
+        self.progress_job = None
+        if not self.is_playing:
+            return
+            
+        event = self.engine.poll()
+        if event == 'advanced':
+            self._on_track_advanced()
+        elif event == 'ended':
+            self._on_track_ended()
+            # 切到下一首时已重新安排刷新
+            return
+            
+        if self.stream_requested_at is not None:
+            self._report_first_audio()
             
-        self.root.after(1000, self.update_progress)
+        position = self.engine.get_pos()
+        self._set_progress(position)
+        self.sync_lyrics(position)
+        self._schedule_progress(self._next_progress_delay(position))
+        
+    def sync_lyrics(self, position):
+        """根据播放位置（秒）高亮当前歌词行，只修改新旧两行的标签"""
+        if not self.lrc or not self.lrc.has_timestamps:
+            return
+            
+        line = self.lrc.line_at(position)
+        if line == self.lyric_line:
+            return
+            
+        if self.lyric_line >= 0:
+            self.lyric_text.tag_remove('current', f"{self.lyric_line + 1}.0",
+                                       f"{self.lyric_line + 1}.end")
+        if line >= 0:
+            self.lyric_text.tag_add('current', f"{line + 1}.0", f"{line + 1}.end")
+            self.lyric_text.see(f"{line + 1}.0")
+        self.lyric_line = line
         
     def get_lyrics(self, song_title):
+        self.lrc = None
+        self.lyric_line = -1
+        # 缓存中已有（例如已经预取过）的歌词直接显示，歌词获取器还没创建时交给后台线程
+        if self._lyric_fetcher is not None:
+            cached = self._lyric_fetcher.cached_lyrics(song_title)
+            if cached:
+                # 之前歌曲还没完成的请求不能再覆盖这里的歌词
+                self.lyric_requests.cancel()
+                self._display_lyrics(cached)
+                return
         try:
             self.lyric_text.delete(1.0, tk.END)
             self.lyric_text.insert(tk.END, f"🔍 正在为《{song_title}》查找歌词...\n\n请稍候...")
             
-            # 在新线程中获取歌词
-            threading.Thread(target=self._get_lyrics_thread, args=(song_title,), daemon=True).start()
+            # 在后台获取歌词，切到其他歌曲后这个请求过期
+            self.lyric_requests.request(
+                song_title, lambda token, lyrics, error: self._on_lyrics_fetched(song_title, token, lyrics, error))
             
         except Exception as e:
             self.lyric_text.delete(1.0, tk.END)
             self.lyric_text.insert(tk.END, f"❌ 获取歌词失败: {str(e)}")
     
-    def _get_lyrics_thread(self, song_title):
-        try:
-            lyrics = self.lyric_fetcher.get_lyrics(song_title)
-            self.root.after(0, lambda: self._display_lyrics(lyrics))
-        except Exception as e:
-            self.root.after(0, lambda: self._display_lyrics(f"❌ 获取歌词时出错: {str(e)}"))
+    def _on_lyrics_fetched(self, song_title, token, lyrics, error):
+        """歌词请求完成的回调，在歌词请求线程中执行"""
+        if error is None:
+            self.root.after(0, self._show_fetched_lyrics, token, lyrics)
+            self._index_lyrics([song_title])
+        else:
+            self.root.after(0, self._show_fetched_lyrics, token, f"❌ 获取歌词时出错: {str(error)}")
+            
+    def _show_fetched_lyrics(self, token, lyrics):
+        # 回调排队期间可能又切了歌
+        if self.lyric_requests.is_current(token):
+            self._display_lyrics(lyrics)
     
     def _display_lyrics(self, lyrics):
+        # 解析时间标签，带时间的歌词只显示文本，由sync_lyrics负责高亮
+        lrc = parse_lrc(lyrics)
+        self.lrc = lrc if lrc.has_timestamps else None
+        self.lyric_line = -1
+        
         self.lyric_text.delete(1.0, tk.END)
-        self.lyric_text.insert(tk.END, lyrics)
+        self.lyric_text.insert(tk.END, lrc.text() if self.lrc else lyrics)
         
     def remove_song(self):
         selection = self.playlist_box.curselection()
         if selection:
             index = selection[0]
-            song = self.playlist[index]
+            song = self._view_track(index)
             
             # 从播放列表移除
-            self.playlist.pop(index)
-            self.update_playlist()
+            self.playlist.remove(song.id)
+            self.index_worker.submit(self.search_index.remove, song.id)
+            if self.search_results is not None:
+                del self.search_results[index]
+                self.result_index = {track_id: i for i, track_id in enumerate(self.search_results)}
+            self.playlist_box.removed(index)
             
             # 如果删除的是当前播放的歌曲，停止播放
-            if self.current_song == song['file']:
-                pygame.mixer.music.stop()
+            if self.current_song == song.file:
+                self.engine.stop()
+                self._cancel_progress()
                 self.current_song = None
                 self.is_playing = False
                 self.play_btn.config(text="▶️ 播放")
                 self.current_song_label.config(text="当前未播放")
+            elif song.id == self.queued_id:
+                # 删除的是已预加载的下一首，重新预加载
+                self._preload_next()
                 
-            self.status_label.config(text=f"🗑️ 已删除: {song['title']}")
+            self._compact_playlist()
+            self.status_label.config(text=f"🗑️ 已删除: {song.title}")
+            
+    def _compact_playlist(self):
+        """删除留下的空位过多时压缩播放列表，并按新的id更新引用歌曲id的状态"""
+        if not self.playlist.needs_compact():
+            return
+        mapping = self.playlist.compact()
+        self.current_id = mapping.get(self.current_id)
+        self.queued_id = mapping.get(self.queued_id)
+        if self.search_results is not None:
+            # 播放顺序不变，视图中的行也不变
+            self.search_results = [mapping[track_id] for track_id in self.search_results
+                                   if track_id in mapping]
+            self.result_index = {track_id: i for i, track_id in enumerate(self.search_results)}
+        # 旧id在索引中必须立即失效，否则重建完成前的搜索会把旧id对应到其他歌曲；
+        # 清空后排队中的按旧id删除和加入的任务都不再起作用，在索引线程中按新id重建
+        self.search_index.clear()
+        generation = self.search_index.generation
+        tracks = list(self.playlist)
+        
+        def reindex():
+            self.search_index.add_many(tracks, generation)
+            self._index_cached_lyrics()
+            self._refresh_search_later()
+            
+        self.index_worker.submit(reindex)
             
     def clear_playlist(self):
         if not self.playlist:
             return
             
         if messagebox.askyesno("确认", "确定要清空整个播放列表吗？"):
-            # 停止播放
-            if self.is_playing:
-                pygame.mixer.music.stop()
-                self.current_song = None
+            # 停止播放（包括暂停中的歌曲）
+            self._cancel_stream()
+            if self.is_playing or self.engine.playing:
+                self.engine.stop()
+                self._cancel_progress()
                 self.is_playing = False
                 self.play_btn.config(text="▶️ 播放")
                 self.current_song_label.config(text="当前未播放")
                 
-            # 清空列表
+            # 清空后id从0重新编号，旧的id会指向重新扫描后的其他歌曲
+            self.current_song = None
+            self.current_id = None
+            self.queued_id = None
             self.playlist.clear()
+            self.search_index.clear()
             self.update_playlist()
             self.status_label.config(text="🧹 播放列表已清空")
 
 def main():
+    parser = argparse.ArgumentParser(description="B站音乐播放器")
+    parser.add_argument('--startup-timing', action='store_true', help="输出启动各阶段的耗时")
+    parser.add_argument('--metrics', metavar='PATH',
+                        help="每10秒和退出时把耗时统计写入文件，.prom 为Prometheus textfile格式，其他为JSON")
+    args = parser.parse_args()
+    startup = StartupTimer(_IMPORT_STARTED, enabled=args.startup_timing)
+    startup.mark("导入模块")
     root = tk.Tk()
-    app = BilibiliMusicPlayer(root)
+    startup.mark("创建Tk窗口")
+    app = BilibiliMusicPlayer(root, startup, args.metrics)
     root.mainloop()
 
 if __name__ == "__main__":
+    # 打包后的程序中，分析进程池启动的子进程也运行这个入口，
+    # freeze_support 让它们执行分析任务而不是再打开一个播放器
+    if getattr(sys, 'frozen', False):
+        import multiprocessing
+        multiprocessing.freeze_support()
     main()
@@ -0,0 +1,232 @@
+import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from library import MIXER_EXTENSIONS
+from metrics import metrics
+
+
+class PlaybackEngine:
+    """播放引擎
+
+    所有加载和控制操作都在一个专用的后台线程中按顺序执行，
+    界面线程不会因为读取文件或初始化解码器而卡顿。
+    当前歌曲开始后立即预加载下一首，同一后端的歌曲之间无缝切换；
+    不同后端之间无法无缝衔接，poll 会报告播放结束，由调用方切到下一首。
+    pygame和混音器在第一次播放时才导入和打开，不拖慢程序启动。
+    """
+
+    def __init__(self):
+        self.mixer_backend = None
+        self.stream_backend = None
+        self.backend = None
+        self.ffmpeg = shutil.which('ffmpeg')
+        self.volume = 1.0
+        # 当前歌曲的响度归一化增益，实际音量为两者之积
+        self.gain = 1.0
+        self._worker = ThreadPoolExecutor(max_workers=1, thread_name_prefix='playback')
+        self._pending = None
+        self.current = None
+        # 正在边下边播，当前歌曲还没有完整的文件，不能跳转
+        self.streaming = False
+        self.queued = None
+        self.playing = False
+        self.paused = False
+
+    @property
+    def ready(self):
+        return self.backend is not None
+
+    @property
+    def stream_available(self):
+        """是否可以用FFmpeg实时解码MP3/WAV以外的格式，不需要打开音频设备"""
+        return self.ffmpeg is not None
+
+    def open(self):
+        """导入pygame、打开混音器并创建播放后端，已打开时不做任何事
+
+        播放方法会自动调用；结束事件依赖的事件队列只能在主线程中初始化，
+        因此第一次播放必须在主线程中发起。
+        """
+        if self.backend is not None:
+            return
+        import pygame
+        from audio_stream import MixerMusicBackend, PCMStreamBackend
+
+        # 增加缓冲区大小以提高兼容性
+        pygame.mixer.init(frequency=44100, size=-16, channels=2, buffer=4096)
+        self.mixer_backend = MixerMusicBackend()
+        self.stream_backend = PCMStreamBackend(ffmpeg=self.ffmpeg)
+        self.backend = self.mixer_backend
+        self._apply_volume()
+
+    def backend_for(self, path):
+        """选择能播放该文件的后端，不支持时抛出异常"""
+        self.open()
+        file_ext = os.path.splitext(path)[1].lower()
+        # MP3和WAV直接播放，其他格式需要FFmpeg实时解码
+        if file_ext in MIXER_EXTENSIONS:
+            return self.mixer_backend
+        if self.stream_available:
+            return self.stream_backend
+        raise Exception(f"不支持的音频格式: {file_ext}。请安装FFmpeg或下载MP3格式。")
+
+    def play(self, path, start=0.0):
+        """在后台线程中加载并播放，返回Future，加载失败时带有异常"""
+        return self._start(self.backend_for(path), path, start)
+
+    def play_stream(self, path, stream):
+        """边下边播：从正在下载的数据流播放，path 是下载完成后保存的文件路径"""
+        if not self.stream_available:
+            raise Exception("边下边播需要FFmpeg，请先安装FFmpeg")
+        self.open()
+        future = self._start(self.stream_backend, path, 0.0, stream)
+        self.streaming = True
+        return future
+
+    def stream_saved(self, path):
+        """边下边播的歌曲已保存到音乐库，之后可以按保存的文件跳转"""
+        if self.streaming:
+            self.current = path
+            self.streaming = False
+
+    def _start(self, backend, path, start, stream=None):
+        previous = self.backend
+        self.backend = backend
+        self.current = path
+        self.queued = None
+        self.playing = True
+        self.paused = False
+        self.streaming = False
+        requested = time.perf_counter()
+        kind = 'mixer' if backend is self.mixer_backend else 'stream'
+
+        def load():
+            if previous is not backend:
+                previous.stop()
+            try:
+                if stream is None:
+                    backend.play(path, start)
+                else:
+                    backend.play(path, start, stream)
+            except Exception:
+                if stream is not None:
+                    stream.close()
+                metrics.inc('playback_load_errors', backend=kind)
+                raise
+            # 从发起播放到后端开始播放的时间，包括等待前一个播放操作的时间
+            metrics.observe('playback_load_seconds', time.perf_counter() - requested, backend=kind)
+
+        self._pending = self._worker.submit(load)
+        return self._pending
+
+    def seek(self, position):
+        """跳转到当前歌曲的position（秒），返回Future，没有在播放时返回None
+
+        跳转会清除已预加载的下一首，调用方需要重新预加载。
+        """
+        if not self.playing or self.current is None or self.streaming:
+            return None
+        path = self.current
+        backend = self.backend
+        paused = self.paused
+        self.queued = None
+
+        def load():
+            with metrics.timer('playback_seek_seconds'):
+                # 暂停状态由后端在开始播放时保持，不能播放后再从外面暂停
+                backend.play(path, position, paused=paused)
+
+        self._pending = self._worker.submit(load)
+        return self._pending
+
+    def load_failed(self, future):
+        """播放或跳转返回的Future带有异常时调用，在界面线程中执行
+
+        这是最近一次的加载时停止播放并返回True，这样 poll 不会把加载失败当成歌曲结束而切到下一首；
+        之后又发起了新的播放时不做任何事，返回False。
+        """
+        if future is not self._pending:
+            return False
+        self.playing = False
+        self.paused = False
+        self.streaming = False
+        self.queued = None
+        return True
+
+    def preload(self, path):
+        """预加载下一首，无法无缝衔接时返回False"""
+        if self.backend is None:
+            return False
+        try:
+            backend = self.backend_for(path)
+        except Exception:
+            return False
+        if backend is not self.backend:
+            return False
+        self.queued = path
+        self._worker.submit(backend.queue, path)
+        return True
+
+    def poll(self):
+        """在界面线程中调用，处理后端的歌曲结束事件
+
+        返回 'advanced' 表示已无缝切换到预加载的歌曲，
+        返回 'ended' 表示当前歌曲播放完毕且没有可以衔接的歌曲，其他情况返回None。
+        """
+        if not self.playing or self.paused:
+            return None
+        if self._pending is not None and not self._pending.done():
+            return None
+        event = self.backend.check_event()
+        if event == 'advanced':
+            self.current, self.queued = self.queued, None
+        elif event == 'ended':
+            self.playing = False
+        return event
+
+    def pause(self):
+        if self.backend is None:
+            return
+        self.paused = True
+        self._worker.submit(self.backend.pause)
+
+    def unpause(self):
+        if self.backend is None:
+            return
+        self.paused = False
+        self._worker.submit(self.backend.unpause)
+
+    def stop(self):
+        self.playing = False
+        self.paused = False
+        self.streaming = False
+        self.current = None
+        self.queued = None
+        if self.backend is not None:
+            self._worker.submit(self.backend.stop)
+
+    def set_volume(self, volume):
+        """设置音量，混音器还没打开时记下来，打开后再应用"""
+        self.volume = volume
+        self._apply_volume()
+
+    def set_gain(self, gain):
+        """设置当前歌曲的响度归一化增益（线性倍数）"""
+        self.gain = gain
+        self._apply_volume()
+
+    def _apply_volume(self):
+        if self.backend is None:
+            return
+        # 混音器的音量最大为1，增益大于1时只能提高到音量滑块允许的范围
+        volume = min(1.0, self.volume * self.gain)
+        self.mixer_backend.set_volume(volume)
+        self.stream_backend.set_volume(volume)
+
+    def get_pos(self):
+        """当前播放位置（秒）"""
+        if self.backend is None:
+            return 0.0
+        return self.backend.get_pos()
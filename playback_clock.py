@@ -0,0 +1,62 @@
+import threading
+import time
+
+
+class PlaybackClock:
+    """根据单调时钟推算播放位置
+
+    记录最近一次开始、跳转时的歌曲位置和对应的单调时钟时间，
+    暂停期间时钟冻结，恢复时把暂停的时长扣除，
+    因此暂停、跳转多少次位置都不会漂移，读取位置也不需要访问音频设备。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._offset = 0.0
+        self._started = None
+        self._paused_at = None
+
+    @property
+    def running(self):
+        return self._started is not None and self._paused_at is None
+
+    def start(self, position=0.0):
+        """从position（秒）开始计时"""
+        with self._lock:
+            self._offset = position
+            self._started = time.monotonic()
+            self._paused_at = None
+
+    def seek(self, position):
+        """跳转到position（秒），保持暂停状态不变"""
+        with self._lock:
+            now = time.monotonic()
+            self._offset = position
+            self._started = now
+            if self._paused_at is not None:
+                self._paused_at = now
+
+    def pause(self):
+        with self._lock:
+            if self._started is not None and self._paused_at is None:
+                self._paused_at = time.monotonic()
+
+    def resume(self):
+        with self._lock:
+            if self._paused_at is not None:
+                self._started += time.monotonic() - self._paused_at
+                self._paused_at = None
+
+    def stop(self):
+        with self._lock:
+            self._offset = 0.0
+            self._started = None
+            self._paused_at = None
+
+    def position(self):
+        """当前播放位置（秒）"""
+        with self._lock:
+            if self._started is None:
+                return self._offset
+            now = self._paused_at if self._paused_at is not None else time.monotonic()
+            return self._offset + max(now - self._started, 0.0)
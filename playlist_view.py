@@ -0,0 +1,190 @@
+import tkinter as tk
+import tkinter.font as tkfont
+
+from metrics import metrics
+
+
+class VirtualPlaylistView(tk.Frame):
+    """只渲染可见行的虚拟化播放列表
+
+    内部的Listbox只保存当前窗口内的几十行，滚动条按总行数计算位置。
+    数据由调用方持有，视图通过 count() 和 label(index) 按需读取，
+    插入、删除、更新操作只在影响到可见窗口时才重新渲染这几十行，
+    因此十万首歌曲的列表和十首歌曲的列表开销相同。
+
+    对外提供与Listbox相同的 curselection / select_set / selection_clear / see 接口，
+    下标均为数据中的下标。
+    """
+
+    def __init__(self, master, count, label, **listbox_options):
+        bg = listbox_options.get('bg', '#2d2d2d')
+        super().__init__(master, bg=bg)
+        self.count = count
+        self.label = label
+        self.top = 0
+        self.rows = 1
+        self.selected = None
+
+        self.listbox = tk.Listbox(self, activestyle='none', exportselection=False,
+                                  **listbox_options)
+        self.scrollbar = tk.Scrollbar(self, orient=tk.VERTICAL, command=self.yview)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+        self._line_height = tkfont.Font(font=self.listbox.cget('font')).metrics('linespace') + 1
+        self.listbox.bind('<Configure>', self._on_configure)
+        self.listbox.bind('<<ListboxSelect>>', self._on_select, add='+')
+        self.listbox.bind('<MouseWheel>', self._on_mousewheel)
+        self.listbox.bind('<Button-4>', lambda event: self._scroll_by(-3))
+        self.listbox.bind('<Button-5>', lambda event: self._scroll_by(3))
+        self.listbox.bind('<Up>', lambda event: self._move_selection(-1))
+        self.listbox.bind('<Down>', lambda event: self._move_selection(1))
+        self.listbox.bind('<Prior>', lambda event: self._move_selection(-self.rows))
+        self.listbox.bind('<Next>', lambda event: self._move_selection(self.rows))
+
+    def bind(self, sequence=None, func=None, add=None):
+        # 事件绑定转发给内部的Listbox，选择事件由本类先处理
+        return self.listbox.bind(sequence, func, add='+' if sequence == '<<ListboxSelect>>' else add)
+
+    # ---- 数据变化 ----
+
+    def reset(self):
+        """数据整体替换后调用"""
+        total = self.count()
+        if self.selected is not None and self.selected >= total:
+            self.selected = None
+        self.top = max(0, min(self.top, total - self.rows))
+        self.render()
+
+    def inserted(self, index, count=1):
+        """在index处插入了count行"""
+        if self.selected is not None and self.selected >= index:
+            self.selected += count
+        if index < self.top:
+            self.top += count
+        elif index < self.top + self.rows:
+            self.render()
+            return
+        self._update_scrollbar()
+
+    def removed(self, index, count=1):
+        """从index处删除了count行"""
+        if self.selected is not None:
+            if index <= self.selected < index + count:
+                self.selected = None
+            elif self.selected >= index + count:
+                self.selected -= count
+        if index < self.top:
+            self.top = max(index, self.top - count)
+        total = self.count()
+        self.top = max(0, min(self.top, total - self.rows))
+        if index < self.top + self.rows:
+            self.render()
+        else:
+            self._update_scrollbar()
+
+    def updated(self, index):
+        """第index行的内容发生变化"""
+        row = index - self.top
+        if 0 <= row < self.listbox.size():
+            self.listbox.delete(row)
+            self.listbox.insert(row, self.label(index))
+            if index == self.selected:
+                self.listbox.selection_set(row)
+
+    # ---- 渲染 ----
+
+    def render(self):
+        """重新渲染可见窗口"""
+        with metrics.timer('playlist_render_seconds'):
+            self._render()
+
+    def _render(self):
+        total = self.count()
+        end = min(total, self.top + self.rows)
+        self.listbox.delete(0, tk.END)
+        if end > self.top:
+            self.listbox.insert(tk.END, *[self.label(i) for i in range(self.top, end)])
+        if self.selected is not None and self.top <= self.selected < end:
+            self.listbox.selection_set(self.selected - self.top)
+        self._update_scrollbar()
+
+    def _update_scrollbar(self):
+        total = self.count()
+        if total <= 0:
+            self.scrollbar.set(0, 1)
+        else:
+            self.scrollbar.set(self.top / total, min(1.0, (self.top + self.rows) / total))
+
+    def _on_configure(self, event):
+        rows = max(1, event.height // self._line_height)
+        if rows != self.rows:
+            self.rows = rows
+            self.reset()
+
+    # ---- 滚动 ----
+
+    def yview(self, *args):
+        """滚动条回调"""
+        total = self.count()
+        if not args:
+            return
+        if args[0] == 'moveto':
+            top = int(float(args[1]) * total)
+        elif args[0] == 'scroll':
+            amount = int(args[1])
+            top = self.top + (amount * self.rows if args[2] == 'pages' else amount)
+        else:
+            return
+        self._scroll_to(top)
+
+    def _scroll_to(self, top):
+        top = max(0, min(top, self.count() - self.rows))
+        if top != self.top:
+            self.top = top
+            self.render()
+
+    def _scroll_by(self, amount):
+        self._scroll_to(self.top + amount)
+        return 'break'
+
+    def _on_mousewheel(self, event):
+        return self._scroll_by(-3 if event.delta > 0 else 3)
+
+    def see(self, index):
+        """滚动使第index行可见"""
+        if index < self.top:
+            self._scroll_to(index)
+        elif index >= self.top + self.rows:
+            self._scroll_to(index - self.rows + 1)
+
+    # ---- 选择 ----
+
+    def _on_select(self, event):
+        selection = self.listbox.curselection()
+        if selection:
+            self.selected = self.top + selection[0]
+
+    def _move_selection(self, step):
+        total = self.count()
+        if total == 0:
+            return 'break'
+        current = self.selected if self.selected is not None else self.top - step
+        self.select_set(max(0, min(current + step, total - 1)))
+        self.see(self.selected)
+        self.listbox.event_generate('<<ListboxSelect>>')
+        return 'break'
+
+    def curselection(self):
+        return () if self.selected is None else (self.selected,)
+
+    def selection_clear(self, first=0, last=None):
+        self.selected = None
+        self.listbox.selection_clear(0, tk.END)
+
+    def select_set(self, index):
+        self.listbox.selection_clear(0, tk.END)
+        self.selected = index
+        row = index - self.top
+        if 0 <= row < self.listbox.size():
+            self.listbox.selection_set(row)
@@ -0,0 +1,13 @@
+import os
+import subprocess
+
+
+def hidden_window():
+    """启动FFmpeg等命令行子进程时使用的参数
+
+    打包成无控制台窗口的程序后，Windows会为每个控制台子进程弹出一个黑色窗口，
+    CREATE_NO_WINDOW 可以避免窗口闪现；其他系统不需要额外参数。
+    """
+    if os.name == 'nt':
+        return {'creationflags': subprocess.CREATE_NO_WINDOW}
+    return {}
@@ -0,0 +1,170 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+import requests
+
+from metrics import metrics
+
+
+class DownloadCancelled(Exception):
+    """边下边播的下载被取消，例如用户切到了其他歌曲"""
+
+
+class ProgressiveDownload:
+    """边下边播的下载任务
+
+    后台线程把音频流逐块写入临时文件，读取方可以同时从头读取已经写入的部分，
+    数据还没到达时阻塞等待。下载完成后把临时文件复制到音乐库中的 path，
+    所有读取方关闭后再删除临时文件（Windows上不能删除仍被打开的文件）。
+    progress_hook 与yt-dlp的 progress_hooks 接收相同格式的进度字典。
+    """
+
+    def __init__(self, url, path, headers=None, temp_dir="cache/stream", chunk_size=64 * 1024,
+                 progress_hook=None):
+        self.url = url
+        self.path = path
+        self.headers = headers or {}
+        self.chunk_size = chunk_size
+        self.progress_hook = progress_hook
+        self.size = 0
+        self.total = None
+        self.done = False
+        self.error = None
+        self._cancelled = False
+        self._readers = 0
+        self._cond = threading.Condition()
+
+        os.makedirs(temp_dir, exist_ok=True)
+        fd, self.temp_path = tempfile.mkstemp(suffix=os.path.splitext(path)[1], dir=temp_dir)
+        os.close(fd)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def _run(self):
+        try:
+            with requests.get(self.url, headers=self.headers, stream=True, timeout=15) as response:
+                response.raise_for_status()
+                length = response.headers.get('Content-Length')
+                self.total = int(length) if length else None
+                started = time.monotonic()
+                with open(self.temp_path, 'wb') as f:
+                    for chunk in response.iter_content(self.chunk_size):
+                        if self._cancelled:
+                            raise DownloadCancelled("下载已取消")
+                        f.write(chunk)
+                        # 先落盘再通知读取方，保证读到的都是完整写入的数据
+                        f.flush()
+                        with self._cond:
+                            self.size += len(chunk)
+                            self._cond.notify_all()
+                        self._report(started)
+            if self._cancelled:
+                raise DownloadCancelled("下载已取消")
+            shutil.copyfile(self.temp_path, self.path)
+            elapsed = time.monotonic() - started
+            metrics.inc('download_bytes', self.size, source='stream')
+            metrics.observe('download_seconds', elapsed, source='stream')
+            if self.progress_hook:
+                self.progress_hook({'status': 'finished', 'downloaded_bytes': self.size,
+                                    'total_bytes': self.size, 'elapsed': elapsed})
+        except Exception as e:
+            self.error = e
+            if self.progress_hook:
+                self.progress_hook({'status': 'error'})
+        finally:
+            with self._cond:
+                self.done = True
+                self._cond.notify_all()
+            self._release()
+
+    def _report(self, started):
+        if not self.progress_hook:
+            return
+        elapsed = time.monotonic() - started
+        speed = self.size / elapsed if elapsed > 0 else None
+        eta = None
+        if speed and self.total:
+            eta = (self.total - self.size) / speed
+        self.progress_hook({'status': 'downloading', 'downloaded_bytes': self.size,
+                            'total_bytes': self.total, 'speed': speed, 'eta': eta})
+
+    def wait(self):
+        """等待下载完成，失败时抛出异常"""
+        self._thread.join()
+        if self.error:
+            raise self.error
+        return self.path
+
+    def cancel(self):
+        """停止下载，不再保存到音乐库；已经完成的下载不受影响"""
+        self._cancelled = True
+
+    def open_reader(self):
+        """打开一个从头读取的流，可以在下载过程中使用
+
+        需要在 start 之前打开，否则下载很快完成时临时文件可能已被删除。
+        """
+        with self._cond:
+            self._readers += 1
+        return _GrowingFileReader(self)
+
+    def _wait_data(self, position, closed):
+        """等待position之后有数据可读，返回可读的字节数，没有更多数据时返回0"""
+        with self._cond:
+            while self.size <= position and not self.done and not closed():
+                self._cond.wait()
+            return max(self.size - position, 0)
+
+    def _reader_closed(self):
+        with self._cond:
+            self._readers -= 1
+        self._release()
+
+    def _release(self):
+        with self._cond:
+            if not self.done or self._readers > 0:
+                return
+        try:
+            os.remove(self.temp_path)
+        except OSError:
+            pass
+
+    def _wake(self):
+        with self._cond:
+            self._cond.notify_all()
+
+
+class _GrowingFileReader:
+    """读取正在下载的临时文件，read 在数据到达前阻塞"""
+
+    def __init__(self, download):
+        self._download = download
+        self._file = open(download.temp_path, 'rb')
+        self._position = 0
+        self._closed = False
+
+    def read(self, size):
+        available = self._download._wait_data(self._position, lambda: self._closed)
+        if self._closed or available == 0:
+            return b''
+        try:
+            data = self._file.read(min(size, available))
+        except ValueError:
+            # 读取过程中被其他线程关闭
+            return b''
+        self._position += len(data)
+        return data
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        # 唤醒阻塞在read中的线程
+        self._download._wake()
+        self._file.close()
+        self._download._reader_closed()
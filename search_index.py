@@ -0,0 +1,184 @@
+import os
+import threading
+import unicodedata
+from array import array
+
+
+def normalize(text):
+    """统一全角半角和大小写，搜索词和被搜索的文本都先经过这一步"""
+    return unicodedata.normalize('NFKC', text).casefold()
+
+
+def _grams(text):
+    """文本中所有的单字和相邻两字，不跨越空白
+
+    中文标题不需要分词，任何连续子串都由这些片段组成。
+    """
+    grams = set()
+    for word in text.split():
+        grams.update(word)
+        grams.update(word[i:i + 2] for i in range(len(word) - 1))
+    return grams
+
+
+class SearchIndex:
+    """歌曲标题、所在文件夹和已缓存歌词的内存搜索索引
+
+    以单字和两字片段建立倒排表（片段 -> 歌曲id数组），歌曲加入时增量更新。
+    查询时对每个搜索词取其片段中倒排表最短的一个作为候选，
+    再用子串匹配逐个确认，因此结果与直接做子串搜索相同，
+    但只需要检查少量候选，十万首歌曲时单次查询也只需几毫秒。
+    多个以空格分隔的搜索词需要同时匹配。
+
+    删除歌曲只移除文本，倒排表中留下的失效id在确认时跳过，
+    失效id过多时重建倒排表。可以在多个线程中使用，
+    大量歌曲用 add_many 在后台线程中分批加入，每批之间释放锁，不会长时间阻塞查询。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.generation = 0
+        self.clear()
+
+    def clear(self):
+        """清空索引，之前开始的 add_many 不再继续加入"""
+        with self._lock:
+            self.generation += 1
+            # id -> [标题和文件夹, 歌词]，均已规范化
+            self._docs = {}
+            self._titles = {}
+            self._by_title = {}
+            self._lyrics = {}
+            self._postings = {}
+            self._stale = 0
+
+    def __len__(self):
+        return len(self._docs)
+
+    def _post(self, track_id, grams):
+        postings = self._postings
+        for gram in grams:
+            ids = postings.get(gram)
+            if ids is None:
+                ids = postings[gram] = array('i')
+            ids.append(track_id)
+
+    def add(self, track):
+        """加入一首歌曲，同一标题已有缓存的歌词时一起索引"""
+        self.add_many([track])
+
+    def add_many(self, tracks, generation=None, batch_size=500):
+        """分批加入歌曲，generation 与当前不同（索引已被清空）时停止"""
+        tracks = list(tracks)
+        for start in range(0, len(tracks), batch_size):
+            batch = []
+            for track in tracks[start:start + batch_size]:
+                folder = os.path.basename(os.path.dirname(track.file))
+                text = normalize(f"{track.title}\n{folder}")
+                batch.append((track, text, _grams(text)))
+            with self._lock:
+                if generation is not None and generation != self.generation:
+                    return
+                for track, text, grams in batch:
+                    if track.id in self._docs:
+                        continue
+                    lyrics = self._lyrics.get(track.title, '')
+                    self._docs[track.id] = [text, lyrics]
+                    self._titles[track.id] = track.title
+                    self._by_title.setdefault(track.title, set()).add(track.id)
+                    self._post(track.id, grams | _grams(lyrics) if lyrics else grams)
+
+    def remove(self, track_id):
+        with self._lock:
+            if self._docs.pop(track_id, None) is None:
+                return
+            title = self._titles.pop(track_id)
+            ids = self._by_title.get(title)
+            ids.discard(track_id)
+            if not ids:
+                del self._by_title[title]
+            self._stale += 1
+            if self._stale > max(1000, len(self._docs)):
+                self._rebuild()
+
+    def _rebuild(self):
+        """去掉倒排表中的失效id，调用方需持有锁"""
+        self._postings = {}
+        for track_id, (text, lyrics) in self._docs.items():
+            self._post(track_id, _grams(text) | _grams(lyrics))
+        self._stale = 0
+
+    def set_lyrics(self, title, lyrics):
+        """为该标题的所有歌曲索引歌词，只补充新出现的片段"""
+        lyrics = normalize(lyrics or '')
+        with self._lock:
+            if self._lyrics.get(title) == lyrics:
+                return
+            self._lyrics[title] = lyrics
+            grams = _grams(lyrics)
+            for track_id in self._by_title.get(title, ()):
+                doc = self._docs[track_id]
+                new = grams - _grams(doc[0]) - _grams(doc[1])
+                doc[1] = lyrics
+                self._post(track_id, new)
+
+    def titles(self):
+        """索引中所有不同的歌曲标题"""
+        with self._lock:
+            return list(self._by_title)
+
+    def search(self, query):
+        """返回匹配的歌曲id列表，标题或文件夹匹配的排在只有歌词匹配的前面
+
+        两组内部按id（即加入顺序）排列。搜索词为空时返回None。
+        """
+        terms = normalize(query).split()
+        if not terms:
+            return None
+        with self._lock:
+            # 每个搜索词取最短的倒排表，多个搜索词时再求交集
+            shortest = []
+            for term in terms:
+                grams = [term[i:i + 2] for i in range(len(term) - 1)] or [term]
+                best = None
+                for gram in grams:
+                    ids = self._postings.get(gram)
+                    if ids is None:
+                        return []
+                    if best is None or len(ids) < len(best):
+                        best = ids
+                shortest.append(best)
+            shortest.sort(key=len)
+            candidates = shortest[0]
+            if len(shortest) > 1:
+                candidates = set(candidates)
+                for ids in shortest[1:]:
+                    candidates.intersection_update(ids)
+
+            # 同一首歌曲在一个倒排表中只出现一次，不需要去重
+            title_matches = []
+            lyric_matches = []
+            docs = self._docs
+            if len(terms) == 1:
+                term = terms[0]
+                for track_id in candidates:
+                    doc = docs.get(track_id)
+                    if doc is None:
+                        continue
+                    if term in doc[0]:
+                        title_matches.append(track_id)
+                    elif term in doc[1]:
+                        lyric_matches.append(track_id)
+            else:
+                for track_id in candidates:
+                    doc = docs.get(track_id)
+                    if doc is None:
+                        continue
+                    text, lyrics = doc
+                    if all(term in text for term in terms):
+                        title_matches.append(track_id)
+                    elif all(term in text or term in lyrics for term in terms):
+                        lyric_matches.append(track_id)
+        title_matches.sort()
+        lyric_matches.sort()
+        return title_matches + lyric_matches
@@ -0,0 +1,157 @@
+import json
+import os
+import threading
+import time
+
+
+class SourceStats:
+    """歌词源的滚动统计与熔断器
+
+    为每个歌词源记录滑动平均的成功率和耗时，用于动态调整请求顺序。
+    连续失败达到阈值后熔断该源，冷却时间结束后进入半开状态，
+    只放行一次试探请求：成功则恢复，失败则以加倍的冷却时间再次熔断。
+    统计数据保存在JSON文件中，重启后继续生效。
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, path="cache/lyric_sources.json", alpha=0.2,
+                 failure_threshold=3, open_seconds=60, max_open_seconds=600,
+                 save_interval=5):
+        self.path = path
+        self.alpha = alpha
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self.max_open_seconds = max_open_seconds
+        self.save_interval = save_interval
+        self._lock = threading.Lock()
+        self._stats = {}
+        self._probing = set()
+        self._last_save = 0
+        self._load()
+
+    def _entry(self, name):
+        entry = self._stats.get(name)
+        if entry is None:
+            entry = {
+                'calls': 0,
+                'success_rate': 1.0,
+                'latency': None,
+                'failures': 0,
+                'open_until': 0,
+                'cooldown': self.open_seconds,
+            }
+            self._stats[name] = entry
+        return entry
+
+    def state(self, name):
+        """返回熔断器状态"""
+        with self._lock:
+            return self._state(self._entry(name), time.time())
+
+    def _state(self, entry, now):
+        if entry['failures'] < self.failure_threshold:
+            return self.CLOSED
+        if now < entry['open_until']:
+            return self.OPEN
+        return self.HALF_OPEN
+
+    def available(self, name):
+        """熔断器未打开时返回True，不占用半开状态的试探名额"""
+        with self._lock:
+            entry = self._entry(name)
+            state = self._state(entry, time.time())
+            if state == self.HALF_OPEN:
+                return name not in self._probing
+            return state == self.CLOSED
+
+    def acquire(self, name):
+        """请求前调用，半开状态下只有第一个调用者获得试探名额"""
+        with self._lock:
+            entry = self._entry(name)
+            state = self._state(entry, time.time())
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and name not in self._probing:
+                self._probing.add(name)
+                return True
+            return False
+
+    def record(self, name, ok, latency):
+        """记录一次请求结果，ok表示歌词源本身工作正常（即使没有找到歌词）"""
+        now = time.time()
+        with self._lock:
+            entry = self._entry(name)
+            self._probing.discard(name)
+            entry['calls'] += 1
+            entry['success_rate'] += self.alpha * ((1.0 if ok else 0.0) - entry['success_rate'])
+            if entry['latency'] is None:
+                entry['latency'] = latency
+            else:
+                entry['latency'] += self.alpha * (latency - entry['latency'])
+
+            if ok:
+                entry['failures'] = 0
+                entry['cooldown'] = self.open_seconds
+            else:
+                was_half_open = self._state(entry, now) == self.HALF_OPEN
+                entry['failures'] += 1
+                if entry['failures'] >= self.failure_threshold:
+                    if was_half_open:
+                        # 试探失败，延长冷却时间
+                        entry['cooldown'] = min(entry['cooldown'] * 2, self.max_open_seconds)
+                    entry['open_until'] = now + entry['cooldown']
+
+            if now - self._last_save >= self.save_interval:
+                self._save()
+
+    def rank(self, names):
+        """按预期代价（平均耗时 / 成功率）排序
+
+        没有数据的源排在有数据的源之后，彼此之间保持原有顺序（排序是稳定的）。
+        """
+        with self._lock:
+            def cost(name):
+                entry = self._entry(name)
+                if entry['latency'] is None:
+                    return float('inf')
+                return entry['latency'] / max(entry['success_rate'], 0.05)
+            return sorted(names, key=cost)
+
+    def snapshot(self):
+        """返回所有歌词源统计数据的副本"""
+        now = time.time()
+        with self._lock:
+            return {name: dict(entry, state=self._state(entry, now))
+                    for name, entry in self._stats.items()}
+
+    def save(self):
+        with self._lock:
+            self._save()
+
+    def _save(self):
+        """原子写入统计文件，调用方需持有锁"""
+        self._last_save = time.time()
+        try:
+            data_dir = os.path.dirname(self.path)
+            if data_dir and not os.path.exists(data_dir):
+                os.makedirs(data_dir)
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._stats, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"保存歌词源统计失败: {e}")
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            for name, entry in data.items():
+                self._entry(name).update(entry)
+        except (OSError, ValueError) as e:
+            print(f"读取歌词源统计失败: {e}")
@@ -0,0 +1,38 @@
+import sys
+import time
+
+
+class StartupTimer:
+    """记录启动各阶段的耗时
+
+    每次 mark 记录从上一阶段结束到现在的耗时，以及从 started 开始的累计耗时。
+    启用时 report 按 python -X importtime 的格式输出到标准错误，
+    report 之后再记录的阶段（例如首次播放时打开音频设备）会立即输出。
+    """
+
+    def __init__(self, started=None, enabled=False):
+        self.started = time.perf_counter() if started is None else started
+        self.enabled = enabled
+        self.phases = []
+        self.reported = False
+        self._last = self.started
+
+    def mark(self, phase):
+        now = time.perf_counter()
+        self.phases.append((phase, now - self._last, now - self.started))
+        self._last = now
+        if self.reported:
+            self._print(*self.phases[-1])
+
+    def report(self):
+        if not self.enabled or self.reported:
+            return
+        self.reported = True
+        print("startup time: self [ms] | cumulative | phase", file=sys.stderr)
+        for phase in self.phases:
+            self._print(*phase)
+
+    def _print(self, phase, elapsed, cumulative):
+        if self.enabled:
+            print(f"startup time: {elapsed * 1000:9.1f} | {cumulative * 1000:10.1f} | {phase}",
+                  file=sys.stderr)
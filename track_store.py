@@ -0,0 +1,217 @@
+from array import array
+
+
+class Track:
+    """一首歌曲的记录
+
+    使用 __slots__ 代替字典。加入 TrackStore 之前 id 为None，
+    从 TrackStore 中取出的 Track 是按列数据生成的快照，修改它不会影响列表。
+    """
+
+    __slots__ = ('id', 'title', 'file', 'duration', 'url')
+
+    def __init__(self, title, file, duration=0, url=None, id=None):
+        self.id = id
+        self.title = title
+        self.file = file
+        self.duration = duration or 0
+        self.url = url
+
+    def __repr__(self):
+        return f"Track({self.id}, {self.title!r}, {self.file!r})"
+
+
+class TrackStore:
+    """按id索引、列式存储的播放列表
+
+    歌曲的各个字段分别保存在按id下标的列中，id 就是列下标，
+    删除歌曲只留下空位，其他歌曲的 id 不变；空位过多时由调用方用 compact 压缩，
+    此时所有 id 重新编号。
+    播放顺序保存在若干个有序的id块中（每块几百个），
+    另外记录每个id所在的块，因此按id查位置、按位置取歌曲、
+    删除都只需要遍历块列表和单个块，不需要扫描整个列表。
+    """
+
+    BLOCK_SIZE = 512
+    # 空位超过存活歌曲数的这个比例（且不少于 COMPACT_MIN 个）时需要压缩
+    COMPACT_FRACTION = 0.5
+    COMPACT_MIN = 1024
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self._titles = []
+        self._files = []
+        self._durations = array('d')
+        self._urls = []
+        self._by_file = {}
+        # 播放顺序：有序的id块，以及 id -> 块编号、块编号 -> 块下标
+        self._blocks = [array('l')]
+        self._block_ids = [0]
+        self._block_of = array('l')
+        self._block_index = {0: 0}
+        self._next_block_id = 1
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def __bool__(self):
+        return self._count > 0
+
+    def __iter__(self):
+        for block in self._blocks:
+            for track_id in block:
+                yield self._make_track(track_id)
+
+    def __getitem__(self, position):
+        """按位置取歌曲"""
+        if position < 0:
+            position += self._count
+        if not 0 <= position < self._count:
+            raise IndexError(position)
+        for block in self._blocks:
+            if position < len(block):
+                return self._make_track(block[position])
+            position -= len(block)
+
+    def __contains__(self, file):
+        """按文件路径判断歌曲是否在列表中"""
+        return file in self._by_file
+
+    def _make_track(self, track_id):
+        return Track(self._titles[track_id], self._files[track_id],
+                     self._durations[track_id], self._urls[track_id], track_id)
+
+    def _alive(self, track_id):
+        return (track_id is not None and 0 <= track_id < len(self._titles)
+                and self._titles[track_id] is not None)
+
+    def get(self, track_id):
+        """按id取歌曲，已删除时返回None"""
+        if not self._alive(track_id):
+            return None
+        return self._make_track(track_id)
+
+    def find_file(self, file):
+        """按文件路径查找歌曲，不存在时返回None"""
+        track_id = self._by_file.get(file)
+        return None if track_id is None else self._make_track(track_id)
+
+    def position(self, track_id):
+        """返回歌曲当前的位置，不在列表中时返回None"""
+        if not self._alive(track_id):
+            return None
+        block_index = self._block_index[self._block_of[track_id]]
+        offset = sum(len(block) for block in self._blocks[:block_index])
+        return offset + self._blocks[block_index].index(track_id)
+
+    def append(self, track):
+        """追加歌曲，同一文件已存在时返回False，成功时为track设置id"""
+        if track.file in self._by_file:
+            return False
+        track_id = len(self._titles)
+        self._titles.append(track.title)
+        self._files.append(track.file)
+        self._durations.append(track.duration or 0)
+        self._urls.append(track.url)
+        self._by_file[track.file] = track_id
+        self._block_of.append(0)
+        self._insert_id(self._count, track_id)
+        track.id = track_id
+        return True
+
+    def remove(self, track_id):
+        """按id删除歌曲，返回被删除的歌曲"""
+        if not self._alive(track_id):
+            return None
+        track = self._make_track(track_id)
+        self._remove_id(track_id)
+        del self._by_file[track.file]
+        # 留下空位，保证其他歌曲的id不变
+        self._titles[track_id] = None
+        self._files[track_id] = None
+        self._urls[track_id] = None
+        return track
+
+    @property
+    def tombstones(self):
+        """删除歌曲后留下的空位数"""
+        return len(self._titles) - self._count
+
+    def needs_compact(self):
+        return self.tombstones > max(self.COMPACT_MIN, self._count * self.COMPACT_FRACTION)
+
+    def compact(self):
+        """去掉空位，按播放顺序重新编号，返回 {旧id: 新id}
+
+        之前取得的 id 全部失效，调用方需要按返回的对应关系更新。
+        """
+        order = [track_id for block in self._blocks for track_id in block]
+        titles = [self._titles[i] for i in order]
+        files = [self._files[i] for i in order]
+        durations = array('d', (self._durations[i] for i in order))
+        urls = [self._urls[i] for i in order]
+        self.clear()
+        count = len(order)
+        self._titles = titles
+        self._files = files
+        self._durations = durations
+        self._urls = urls
+        self._by_file = {file: track_id for track_id, file in enumerate(files)}
+        size = self.BLOCK_SIZE
+        if count:
+            self._blocks = [array('l', range(start, min(start + size, count)))
+                            for start in range(0, count, size)]
+            self._block_ids = list(range(len(self._blocks)))
+            self._block_of = array('l', (track_id // size for track_id in range(count)))
+            self._reindex_blocks()
+            self._next_block_id = len(self._blocks)
+        self._count = count
+        return {old: new for new, old in enumerate(order)}
+
+    def remove_file(self, file):
+        """按文件路径删除歌曲"""
+        track_id = self._by_file.get(file)
+        return None if track_id is None else self.remove(track_id)
+
+    def _insert_id(self, position, track_id):
+        """把id插入到播放顺序的指定位置"""
+        for block_index, block in enumerate(self._blocks):
+            if position <= len(block):
+                break
+            position -= len(block)
+        block.insert(position, track_id)
+        self._block_of[track_id] = self._block_ids[block_index]
+        self._count += 1
+        if len(block) > self.BLOCK_SIZE * 2:
+            self._split(block_index)
+
+    def _remove_id(self, track_id):
+        """从播放顺序中删除id"""
+        block_index = self._block_index[self._block_of[track_id]]
+        block = self._blocks[block_index]
+        block.remove(track_id)
+        self._count -= 1
+        if not block and len(self._blocks) > 1:
+            del self._blocks[block_index]
+            del self._block_ids[block_index]
+            self._reindex_blocks()
+
+    def _split(self, block_index):
+        """把过大的块拆成两半"""
+        block = self._blocks[block_index]
+        half = len(block) // 2
+        new_block = block[half:]
+        del block[half:]
+        new_block_id = self._next_block_id
+        self._next_block_id += 1
+        for track_id in new_block:
+            self._block_of[track_id] = new_block_id
+        self._blocks.insert(block_index + 1, new_block)
+        self._block_ids.insert(block_index + 1, new_block_id)
+        self._reindex_blocks()
+
+    def _reindex_blocks(self):
+        self._block_index = {block_id: i for i, block_id in enumerate(self._block_ids)}
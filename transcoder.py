@@ -0,0 +1,108 @@
+import os
+import queue
+import shutil
+import subprocess
+import threading
+from concurrent.futures import Future
+
+from metrics import metrics
+from processes import hidden_window
+
+
+class TranscodePipeline:
+    """下载与转码分离的转码流水线
+
+    下载线程只负责获取原始音频流，把文件放入有界队列后立即去下载下一首；
+    转码工作线程从队列中取出文件，各自驱动一个独立的FFmpeg进程编码为MP3。
+    队列满时submit会阻塞下载线程，形成反压，避免磁盘上堆积大量未转码的文件。
+    """
+
+    def __init__(self, workers=None, max_queue=None, ffmpeg=None):
+        self.workers = workers or os.cpu_count() or 2
+        self.max_queue = max_queue or self.workers * 2
+        self.ffmpeg = ffmpeg or shutil.which('ffmpeg')
+        self._queue = queue.Queue(maxsize=self.max_queue)
+        self._lock = threading.Lock()
+        self._threads = []
+        self.active = 0
+        self.done = 0
+        self.failed = 0
+
+    def _start(self):
+        """首次提交任务时启动工作线程"""
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._worker, name=f"transcode-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, src, dst, bitrate='320k', on_start=None):
+        """提交转码任务，返回Future，结果为输出文件路径
+
+        队列已满时阻塞，直到有转码线程空闲出来。
+        on_start 在转码线程真正开始这个任务时调用。
+        """
+        self._start()
+        future = Future()
+        self._queue.put((src, dst, bitrate, on_start, future))
+        return future
+
+    def stats(self):
+        """返回队列深度和转码进度"""
+        with self._lock:
+            return {
+                'queued': self._queue.qsize(),
+                'max_queue': self.max_queue,
+                'active': self.active,
+                'done': self.done,
+                'failed': self.failed,
+            }
+
+    def _worker(self):
+        while True:
+            src, dst, bitrate, on_start, future = self._queue.get()
+            if not future.set_running_or_notify_cancel():
+                continue
+
+            with self._lock:
+                self.active += 1
+            try:
+                if on_start is not None:
+                    on_start()
+                with metrics.timer('transcode_seconds', bitrate=bitrate):
+                    self._transcode(src, dst, bitrate)
+            except Exception as e:
+                with self._lock:
+                    self.failed += 1
+                future.set_exception(e)
+            else:
+                with self._lock:
+                    self.done += 1
+                future.set_result(dst)
+            finally:
+                with self._lock:
+                    self.active -= 1
+
+    def _transcode(self, src, dst, bitrate):
+        """调用FFmpeg把原始音频编码为MP3，成功后删除原始文件"""
+        if not self.ffmpeg:
+            raise RuntimeError("未找到FFmpeg，无法转码为MP3")
+
+        # 先写入临时文件，避免中断时留下不完整的MP3；
+        # 扩展名不是音频格式，扫描音乐库时不会被当成歌曲，因此需要用 -f 指定输出格式
+        tmp_dst = dst + '.part'
+        result = subprocess.run(
+            [self.ffmpeg, '-nostdin', '-y', '-loglevel', 'error',
+             '-i', src, '-vn', '-codec:a', 'libmp3lame', '-b:a', bitrate, '-f', 'mp3', tmp_dst],
+            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, **hidden_window())
+        if result.returncode != 0:
+            if os.path.exists(tmp_dst):
+                os.remove(tmp_dst)
+            error = result.stderr.decode('utf-8', 'replace').strip()
+            raise RuntimeError(f"FFmpeg转码失败: {error or result.returncode}")
+
+        os.replace(tmp_dst, dst)
+        if os.path.abspath(src) != os.path.abspath(dst):
+            os.remove(src)
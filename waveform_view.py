@@ -0,0 +1,97 @@
+import tkinter as tk
+
+
+class WaveformBar(tk.Canvas):
+    """显示歌曲波形的播放进度条
+
+    波形来自音频分析保存的峰值（每个字节一个点），按控件宽度合并成竖条，
+    已播放的部分用另一种颜色显示。没有分析结果时显示为一条平的进度条。
+    进度变化时只重新着色跨过的竖条，不重新绘制整个波形。
+
+    与 ttk.Scale 一样用 set(百分比) 设置进度，点击或拖动时以百分比调用 command；
+    set 不会触发 command。
+    """
+
+    BAR_WIDTH = 2
+    BAR_GAP = 1
+
+    def __init__(self, master, command=None, height=36, bg='#1e1e1e',
+                 played='#4CAF50', unplayed='#555555'):
+        super().__init__(master, height=height, bg=bg, highlightthickness=0, cursor='hand2')
+        self.command = command
+        self.played_color = played
+        self.unplayed_color = unplayed
+        self.peaks = None
+        self.percent = 0.0
+        self._bars = []
+        self._played = 0
+        self.bind('<Configure>', lambda event: self._draw())
+        self.bind('<Button-1>', self._on_drag)
+        self.bind('<B1-Motion>', self._on_drag)
+
+    def set_peaks(self, peaks):
+        """设置波形数据（字节串），None表示没有波形"""
+        if peaks == self.peaks:
+            return
+        self.peaks = peaks
+        self._draw()
+
+    def set(self, percent):
+        self.percent = max(0.0, min(float(percent), 100.0))
+        self._color_played()
+
+    def get(self):
+        return self.percent
+
+    def _levels(self, count):
+        """把峰值合并成count个竖条的高度（0到1），每个竖条取所含点中的最大值"""
+        if not self.peaks:
+            return [0.15] * count
+        peaks = self.peaks
+        levels = []
+        for i in range(count):
+            start = i * len(peaks) // count
+            end = max(start + 1, (i + 1) * len(peaks) // count)
+            levels.append(max(peaks[start:end]) / 255)
+        return levels
+
+    def _draw(self):
+        self.delete('all')
+        width = self.winfo_width()
+        height = self.winfo_height()
+        if width <= 1 or height <= 1:
+            self._bars = []
+            return
+        step = self.BAR_WIDTH + self.BAR_GAP
+        count = max(1, width // step)
+        if self.peaks:
+            count = min(count, len(self.peaks))
+            step = width / count
+        middle = height / 2
+        self._bars = []
+        for i, level in enumerate(self._levels(count)):
+            half = max(1, level * (height - 2) / 2)
+            x = i * step
+            self._bars.append(self.create_rectangle(
+                x, middle - half, x + self.BAR_WIDTH, middle + half,
+                fill=self.unplayed_color, width=0))
+        self._played = 0
+        self._color_played()
+
+    def _color_played(self):
+        played = round(len(self._bars) * self.percent / 100)
+        if played == self._played:
+            return
+        low, high = sorted((played, self._played))
+        color = self.played_color if played > self._played else self.unplayed_color
+        for bar in self._bars[low:high]:
+            self.itemconfig(bar, fill=color)
+        self._played = played
+
+    def _on_drag(self, event):
+        width = self.winfo_width()
+        if width <= 1:
+            return
+        self.set(event.x / width * 100)
+        if self.command is not None:
+            self.command(self.percent)